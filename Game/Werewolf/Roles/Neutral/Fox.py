@@ -3,17 +3,17 @@ from ...role import Role
 
 
 class Fox(Role):
-    def __init__(self):
-        super().__init__()
-        self.is_neutral = True
-
-        self.name = self.__class__.__name__
-        self.team = "TeamFox"
-        self.fortune_result = "TeamNeutral"
-        self.description = "FoxDescription"
-        self.win_condition = "FoxWinCondition"
+    __slots__ = ()
 
-        self.is_kill_protected = True
+    def __init__(self):
+        super().__init__(
+            team="TeamFox",
+            fortune_result="TeamNeutral",
+            description="FoxDescription",
+            win_condition="FoxWinCondition",
+            is_neutral=True,
+            is_kill_protected=True,
+        )
 
     async def seer_ability(self, game_id: int, player: Player):
         """
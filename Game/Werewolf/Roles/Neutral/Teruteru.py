@@ -3,15 +3,16 @@ from ...role import Role
 
 
 class Teruteru(Role):
-    def __init__(self):
-        super().__init__()
-        self.is_neutral = True
+    __slots__ = ()
 
-        self.name = self.__class__.__name__
-        self.team = "TeamTeruteru"
-        self.fortune_result = "TeamNeutral"
-        self.description = "TeruteruDescription"
-        self.win_condition = "TeruteruWinCondition"
+    def __init__(self):
+        super().__init__(
+            team="TeamTeruteru",
+            fortune_result="TeamNeutral",
+            description="TeruteruDescription",
+            win_condition="TeruteruWinCondition",
+            is_neutral=True,
+        )
 
     async def executed_ability(self, game_id: int, player):
         """
@@ -2,12 +2,13 @@ from ...role import Role
 
 
 class Bakery(Role):
-    def __init__(self):
-        super().__init__()
-        self.is_villager = True
+    __slots__ = ()
 
-        self.name = self.__class__.__name__
-        self.team = "TeamVillager"
-        self.fortune_result = "TeamVillager"
-        self.description = "BakeryDescription"
-        self.win_condition = "VillagerWinCondition"
+    def __init__(self):
+        super().__init__(
+            team="TeamVillager",
+            fortune_result="TeamVillager",
+            description="BakeryDescription",
+            win_condition="VillagerWinCondition",
+            is_villager=True,
+        )
@@ -6,15 +6,16 @@ from ...role import Role
 
 
 class BlackCat(Role):
-    def __init__(self):
-        super().__init__()
-        self.is_villager = True
+    __slots__ = ()
 
-        self.name = self.__class__.__name__
-        self.team = "TeamWerewolf"
-        self.fortune_result = "TeamVillager"
-        self.description = "BlackCatDescription"
-        self.win_condition = "MadmateWinCondition"
+    def __init__(self):
+        super().__init__(
+            team="TeamWerewolf",
+            fortune_result="TeamVillager",
+            description="BlackCatDescription",
+            win_condition="MadmateWinCondition",
+            is_villager=True,
+        )
 
     async def executed_ability(self, game_id: int, player):
         """
@@ -33,7 +34,8 @@ class BlackCat(Role):
 
         if game is not None:
             filtered_players = [p for p in game.alive_players if p.id != player.id]
+            if not filtered_players:
+                return
 
             revenge_target = random.choice(filtered_players)
             await revenge_target.execute("Revenged")
-            game.refresh_alive_players()
@@ -1,26 +1,24 @@
-import discord
-
 import Modules.global_value as g
 
 from ...player import Player
-from ...role import Role
-from ...view import PlayerChoiceView
+from ...role import NightAction, Role
 
 
 class Hunter(Role):
-    def __init__(self):
-        super().__init__()
-        self.is_villager = True
+    __slots__ = ()
 
-        self.name = self.__class__.__name__
-        self.team = "TeamVillager"
-        self.fortune_result = "TeamVillager"
-        self.description = "HunterDescription"
-        self.win_condition = "VillagerWinCondition"
+    def __init__(self):
+        super().__init__(
+            team="TeamVillager",
+            fortune_result="TeamVillager",
+            description="HunterDescription",
+            win_condition="VillagerWinCondition",
+            is_villager=True,
+        )
 
-    async def night_ability(self, game_id: int, player: Player):
+    async def night_ability(self, game_id: int, player: Player) -> NightAction | None:
         """
-        護衛対象を選ぶ。
+        護衛対象を選ぶ。護衛は襲撃より先に適用される。
 
         Parameters
         ----------
@@ -34,21 +32,35 @@ class Hunter(Role):
         game = g.werewolf_games.get(game_id)
 
         if game is not None:
-            self.t = game.translator
-
-            embed = discord.Embed(title="護衛", description="護衛対象を選んでください")
-            view = PlayerChoiceView(
+            target_id = await game.transport.choose(
+                player,
+                "Guard",
                 choices=game.last_alive_players,
-                process="Ability",
-                allow_skip=False,
-                game_id=game_id,
+                deadline=game.deadlines.night_ability,
             )
-            await player.message(embed=embed, view=view)
-            await view.wait()
-
-            target_id = list(view.votes.values())[0]
-            target = next((p for p in game.players if p.id == target_id), None)
+            target = game.roster.get(target_id)
 
             if target is not None:
-                target.is_kill_protected = True
-                await player.message(f"{target.name}を守ります。")
+                return NightAction("Guard", player, target)
+
+        return None
+
+    async def resolve_night_action(self, game_id: int, action: NightAction):
+        """
+        護衛対象を襲撃から守る。
+
+        Parameters
+        ----------
+        game_id : int
+            ゲームのID
+        action : NightAction
+            選んだ護衛
+        """
+
+        game = g.werewolf_games.get(game_id)
+
+        if game is not None and action.actor is not None:
+            action.target.is_kill_protected = True
+            await game.transport.notify(
+                action.actor, "GuardResult", target=action.target
+            )
@@ -2,12 +2,13 @@ from ...role import Role
 
 
 class Madmate(Role):
-    def __init__(self):
-        super().__init__()
-        self.is_villager = True
+    __slots__ = ()
 
-        self.name = self.__class__.__name__
-        self.team = "TeamWerewolf"
-        self.fortune_result = "TeamVillager"
-        self.description = "MadmateDescription"
-        self.win_condition = "MadmateWinCondition"
+    def __init__(self):
+        super().__init__(
+            team="TeamWerewolf",
+            fortune_result="TeamVillager",
+            description="MadmateDescription",
+            win_condition="MadmateWinCondition",
+            is_villager=True,
+        )
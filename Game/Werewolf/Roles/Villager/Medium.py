@@ -1,20 +1,21 @@
 import Modules.global_value as g
 
-from ...role import Role
+from ...role import NightAction, Role
 
 
 class Medium(Role):
-    def __init__(self):
-        super().__init__()
-        self.is_villager = True
-
-        self.name = self.__class__.__name__
-        self.team = "TeamVillager"
-        self.fortune_result = "TeamVillager"
-        self.description = "MediumDescription"
-        self.win_condition = "VillagerWinCondition"
+    __slots__ = ()
 
-    async def night_ability(self, game_id: int, player):
+    def __init__(self):
+        super().__init__(
+            team="TeamVillager",
+            fortune_result="TeamVillager",
+            description="MediumDescription",
+            win_condition="VillagerWinCondition",
+            is_villager=True,
+        )
+
+    async def night_ability(self, game_id: int, player) -> NightAction | None:
         """
         前回処刑されたプレイヤーの陣営を確認する。
 
@@ -29,10 +30,31 @@ class Medium(Role):
         game = g.werewolf_games.get(game_id)
 
         if game is not None:
-            t = game.translator
             target = game.last_executed_player
 
             if target is not None:
-                await player.message(
-                    f"{target.name}は{t.getstring(target.role.fortune_result)}でした。"
-                )
+                return NightAction("Medium", player, target)
+
+        return None
+
+    async def resolve_night_action(self, game_id: int, action: NightAction):
+        """
+        前回処刑されたプレイヤーの陣営を通知する。
+
+        Parameters
+        ----------
+        game_id : int
+            ゲームのID
+        action : NightAction
+            霊媒の対象
+        """
+
+        game = g.werewolf_games.get(game_id)
+
+        if game is not None and action.actor is not None:
+            await game.transport.notify(
+                action.actor,
+                "MediumResult",
+                target=action.target,
+                result=action.target.role.fortune_result,
+            )
@@ -6,15 +6,16 @@ from ...role import Role
 
 
 class Nekomata(Role):
-    def __init__(self):
-        super().__init__()
-        self.is_villager = True
+    __slots__ = ()
 
-        self.name = self.__class__.__name__
-        self.team = "TeamVillager"
-        self.fortune_result = "TeamVillager"
-        self.description = "NekomataDescription"
-        self.win_condition = "VillagerWinCondition"
+    def __init__(self):
+        super().__init__(
+            team="TeamVillager",
+            fortune_result="TeamVillager",
+            description="NekomataDescription",
+            win_condition="VillagerWinCondition",
+            is_villager=True,
+        )
 
     async def executed_ability(self, game_id: int, player):
         """
@@ -32,7 +33,8 @@ class Nekomata(Role):
 
         if game is not None:
             filtered_players = [p for p in game.alive_players if p.id != player.id]
+            if not filtered_players:
+                return
 
             revenge_target = random.choice(filtered_players)
             await revenge_target.execute("Revenged")
-            game.refresh_alive_players()
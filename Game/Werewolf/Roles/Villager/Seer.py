@@ -1,26 +1,24 @@
-import discord
-
 import Modules.global_value as g
 
 from ...player import Player
-from ...role import Role
-from ...view import PlayerChoiceView
+from ...role import NightAction, Role
 
 
 class Seer(Role):
-    def __init__(self):
-        super().__init__()
-        self.is_villager = True
+    __slots__ = ()
 
-        self.name = self.__class__.__name__
-        self.team = "TeamVillager"
-        self.fortune_result = "TeamVillager"
-        self.description = "SeerDescription"
-        self.win_condition = "VillagerWinCondition"
+    def __init__(self):
+        super().__init__(
+            team="TeamVillager",
+            fortune_result="TeamVillager",
+            description="SeerDescription",
+            win_condition="VillagerWinCondition",
+            is_villager=True,
+        )
 
-    async def night_ability(self, game_id: int, player: Player):
+    async def night_ability(self, game_id: int, player: Player) -> NightAction | None:
         """
-        占い対象を選ぶ。
+        占い対象を選ぶ。結果は襲撃の後に通知される。
 
         Parameters
         ----------
@@ -33,24 +31,40 @@ class Seer(Role):
         game = g.werewolf_games.get(game_id)
 
         if game is not None:
-            self.t = game.translator
-
-            embed = discord.Embed(title="占い", description="占い対象を選んでください")
-            view = PlayerChoiceView(
+            target_id = await game.transport.choose(
+                player,
+                "Divination",
                 choices=game.last_alive_players,
-                process="Ability",
-                allow_skip=False,
-                game_id=game_id,
+                deadline=game.deadlines.night_ability,
             )
-            await player.message(embed=embed, view=view)
-            await view.wait()
-
-            target_id = list(view.votes.values())[0]
-            target = next((p for p in game.players if p.id == target_id), None)
+            target = game.roster.get(target_id)
 
             if target is not None:
-                await player.message(
-                    f"{target.name}は{self.t.getstring(target.role.fortune_result)}です。"
-                )
+                return NightAction("Divination", player, target)
+
+        return None
+
+    async def resolve_night_action(self, game_id: int, action: NightAction):
+        """
+        占いの結果を通知し、占われた役職の能力(呪殺など)を発動する。
+
+        Parameters
+        ----------
+        game_id : int
+            ゲームのID
+        action : NightAction
+            選んだ占い
+        """
+
+        game = g.werewolf_games.get(game_id)
+
+        if game is not None and action.actor is not None:
+            target = action.target
+            await game.transport.notify(
+                action.actor,
+                "DivinationResult",
+                target=target,
+                result=target.role.fortune_result,
+            )
 
-                await target.role.seer_ability(game_id, target)
+            await target.role.seer_ability(game_id, target)
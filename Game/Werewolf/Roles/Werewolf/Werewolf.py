@@ -3,12 +3,13 @@ from ...role import Role
 
 # 人狼陣営
 class Werewolf(Role):
-    def __init__(self):
-        super().__init__()
-        self.is_werewolf = True
+    __slots__ = ()
 
-        self.name = self.__class__.__name__
-        self.team = "TeamWerewolf"
-        self.fortune_result = "TeamWerewolf"
-        self.description = "WerewolfDescription"
-        self.win_condition = "WerewolfWinCondition"
+    def __init__(self):
+        super().__init__(
+            team="TeamWerewolf",
+            fortune_result="TeamWerewolf",
+            description="WerewolfDescription",
+            win_condition="WerewolfWinCondition",
+            is_werewolf=True,
+        )
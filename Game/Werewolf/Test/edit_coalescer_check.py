@@ -0,0 +1,108 @@
+"""
+EditCoalescerが編集要求を取りこぼさないことを確かめるスクリプト。
+
+編集に時間のかかるメッセージを相手に、次の場合に最後の内容が反映されるかを確かめる。
+
+- 一定時間内の要求が1回の編集にまとまる
+- 編集の途中に来た要求が、その編集の後に反映される
+- 内容が変わっていない要求は編集しない
+
+    python -m Game.Werewolf.Test.edit_coalescer_check
+
+終了コードは成功で0、失敗で1。
+"""
+
+import asyncio
+import logging
+import sys
+from typing import Any
+
+from Modules.edit_coalescer import EditCoalescer
+
+WINDOW = 0.01
+EDIT_DELAY = 0.05
+
+
+class SlowMessage:
+    """
+    編集にEDIT_DELAY秒かかるメッセージ。反映した内容を順に記録する。
+    """
+
+    id = 0
+
+    def __init__(self) -> None:
+        self.contents: list[Any] = []
+
+    async def edit(self, **kwargs: Any) -> None:
+        await asyncio.sleep(EDIT_DELAY)
+        self.contents.append(kwargs["content"])
+
+
+async def coalesced() -> list[str]:
+    message = SlowMessage()
+    editor = EditCoalescer(message, WINDOW)  # type: ignore[arg-type]
+    state = 0
+    waiters = []
+    for state in range(1, 4):
+        waiters.append(editor.request(lambda: {"content": state}))
+    await asyncio.gather(*waiters)
+
+    errors = []
+    if message.contents != [3]:
+        errors.append(f"coalesced: expected [3], got {message.contents}")
+    return errors
+
+
+async def mid_edit() -> list[str]:
+    message = SlowMessage()
+    editor = EditCoalescer(message, WINDOW)  # type: ignore[arg-type]
+    state = 1
+    first = editor.request(lambda: {"content": state})
+    # 1回目の編集が始まり、まだ終わっていない時点で内容を変える
+    await asyncio.sleep(WINDOW + EDIT_DELAY / 2)
+    state = 2
+    second = editor.request(lambda: {"content": state})
+    await asyncio.gather(first, second)
+
+    errors = []
+    if message.contents != [1, 2]:
+        errors.append(f"mid-edit: expected [1, 2], got {message.contents}")
+    if editor.edits != 2:
+        errors.append(f"mid-edit: expected 2 edits, got {editor.edits}")
+    return errors
+
+
+async def unchanged() -> list[str]:
+    message = SlowMessage()
+    editor = EditCoalescer(message, WINDOW)  # type: ignore[arg-type]
+    await editor.request(lambda: {"content": 1})
+    await editor.request(lambda: {"content": 1})
+
+    errors = []
+    if message.contents != [1] or editor.skipped != 1:
+        errors.append(
+            f"unchanged: expected [1] with 1 skipped, "
+            f"got {message.contents} with {editor.skipped} skipped"
+        )
+    return errors
+
+
+async def run() -> bool:
+    errors = []
+    for check in (coalesced, mid_edit, unchanged):
+        errors += await asyncio.wait_for(check(), 5)
+    for error in errors:
+        print(f"FAIL: {error}")
+    if not errors:
+        print("ok")
+    return not errors
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    if not asyncio.run(run()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
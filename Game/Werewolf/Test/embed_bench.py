@@ -0,0 +1,165 @@
+"""
+Embedのテンプレートを使う前後で、1回の操作あたりの時間と確保するメモリを比べるスクリプト。
+
+「前」はテンプレート導入前と同じ処理(参加者を走査して役職を探し、毎回Embedを作り直す)、
+「後」は役職の表とテンプレートを使う処理。
+
+    python -m Game.Werewolf.Test.embed_bench --players 15 --iterations 20000
+"""
+
+import argparse
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+import discord
+
+from Game.Werewolf.embeds import embed_templates
+from Game.Werewolf.player import Player
+from Game.Werewolf.Roles.Villager import Bakery, Seer, Villager
+from Game.Werewolf.Roles.Werewolf import Werewolf
+from Game.Werewolf.roster import Roster
+from Modules.translator import Translator
+
+
+def build_roster(count: int) -> Roster:
+    roles = [
+        Werewolf.Werewolf.shared(),
+        Seer.Seer.shared(),
+        Bakery.Bakery.shared(),
+        Villager.Villager.shared(),
+    ]
+    roster = Roster()
+    for i in range(count):
+        player = Player(10**17 + i, 0, f"player{i}")
+        player.assign_role(roles[i % len(roles)])
+        roster.add(player)
+    return roster
+
+
+def role_info_before(players: list[Player], t: Translator, user_id: int) -> Any:
+    player_role = [p.role for p in players if user_id == p.id][0]
+
+    embed = discord.Embed(
+        title=t.getstring(player_role.name),
+        color=discord.Color.green(),
+    )
+    embed.add_field(name="陣営", value=t.getstring(player_role.team), inline=False)
+    embed.add_field(
+        name="勝利条件", value=t.getstring(player_role.win_condition), inline=False
+    )
+    embed.add_field(
+        name="説明", value=t.getstring(player_role.description), inline=False
+    )
+    return embed.to_dict()
+
+
+def role_info_after(roster: Roster, t: Translator, user_id: int) -> Any:
+    player_role = roster.role_of(user_id)
+    assert player_role is not None
+    return embed_templates.role_info(t, player_role).to_dict()
+
+
+def results_before(players: list[Player], t: Translator) -> Any:
+    embed = discord.Embed(
+        title="人狼ゲーム",
+        description=f"{t.getstring('TeamVillager')}勝利",
+        color=0xFFD700,
+    )
+    embed.add_field(
+        name="勝者",
+        value="\n".join([f"<@!{p.id}>" for p in players]),
+        inline=False,
+    )
+    day = discord.Embed(
+        title="人狼ゲーム",
+        description="朝になりました。議論を行い、誰を追放するか決めてください。",
+        color=0xFFFACD,
+    )
+    day.add_field(
+        name="本日の死亡者",
+        value="\n".join([f"<@!{p.id}>" for p in players[:1]]) or "なし",
+        inline=False,
+    )
+    bakery = discord.Embed(
+        title="人狼ゲーム",
+        description=t.getstring("BakeryNormalMessage"),
+        color=0xE59F5C,
+    )
+    return embed.to_dict(), day.to_dict(), bakery.to_dict()
+
+
+def results_after(players: list[Player], t: Translator) -> Any:
+    embed = embed_templates.get(t, "Result", "TeamVillager").render(
+        "\n".join([f"<@!{p.id}>" for p in players])
+    )
+    day = embed_templates.get(t, "DayStart").render(
+        "\n".join([f"<@!{p.id}>" for p in players[:1]]) or "なし"
+    )
+    bakery = embed_templates.get(t, "Bakery", "BakeryNormalMessage").render()
+    return embed.to_dict(), day.to_dict(), bakery.to_dict()
+
+
+def measure(func: Callable[[int], Any], iterations: int) -> tuple[float, float]:
+    """
+    Returns
+    -------
+    tuple[float, float]
+        1回あたりのマイクロ秒と、確保したバイト数
+    """
+
+    func(0)  # キャッシュを温める
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    elapsed = time.perf_counter() - start
+
+    # 確保量は1回分の呼び出しで測る。結果を保持している間のピークを見る
+    samples = min(iterations, 1000)
+    tracemalloc.start()
+    for i in range(samples):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func(i)
+        peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    return elapsed / iterations * 1e6, peak
+
+
+def main(players: int, iterations: int) -> None:
+    t = Translator("ja")
+    roster = build_roster(players)
+    player_list = roster.players
+    ids = [p.id for p in player_list]
+
+    cases: dict[str, tuple[Callable[[int], Any], Callable[[int], Any]]] = {
+        "role info": (
+            lambda i: role_info_before(player_list, t, ids[i % len(ids)]),
+            lambda i: role_info_after(roster, t, ids[i % len(ids)]),
+        ),
+        "phase embeds": (
+            lambda i: results_before(player_list, t),
+            lambda i: results_after(player_list, t),
+        ),
+    }
+
+    print(f"{players} players, {iterations} iterations")
+    for name, (before, after) in cases.items():
+        before_us, before_bytes = measure(before, iterations)
+        after_us, after_bytes = measure(after, iterations)
+        print(
+            f"{name:>12}: {before_us:6.2f}us {before_bytes:6.0f}B"
+            f" -> {after_us:6.2f}us {after_bytes:6.0f}B"
+            f" ({before_us / after_us:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedのテンプレートのベンチマーク")
+    parser.add_argument("--players", type=int, default=15)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.players, args.iterations)
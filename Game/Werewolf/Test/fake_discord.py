@@ -0,0 +1,595 @@
+"""
+負荷試験のための、プロセス内で動くDiscordの代わり。
+
+RESTはaiohttpのサーバーとして実装し、discord.pyの送信先をこのサーバーに向ける。
+ゲートウェイは接続せず、ギルドの作成やインタラクションのイベントを
+discord.pyの状態管理(ConnectionState)に直接渡す。
+そのため、ボット側はViewやコマンドツリーを含めて本番と同じ処理を通る。
+
+応答の遅延と、一定の割合で429を返すことによるレート制限を設定できる。
+"""
+
+import asyncio
+import datetime
+import itertools
+import json
+import random
+import time
+from collections import Counter, deque
+from collections.abc import Callable
+from typing import Any
+
+import discord
+import discord.http
+import discord.webhook.async_
+from aiohttp import web
+
+from Modules.metrics import route_of
+
+DISCORD_EPOCH = 1420070400000
+
+MessageListener = Callable[[dict[str, Any]], None]
+
+
+def _json_response(data: Any, status: int = 200, headers: Any = None) -> web.Response:
+    # discord.pyはContent-Typeが文字コードなしのapplication/jsonのときだけJSONとして読む
+    return web.Response(
+        body=json.dumps(data).encode(),
+        status=status,
+        headers=headers,
+        content_type="application/json",
+    )
+
+
+class FakeDiscord:
+    """
+    Discordの代わりにRESTのリクエストを受け付け、メッセージやDMを保持するクラス。
+
+    Parameters
+    ----------
+    latency : float
+        RESTの応答にかける秒数
+    jitter : float
+        応答の遅延に加える乱数の最大値(秒)
+    rate_limit_ratio : float
+        429を返すリクエストの割合。インタラクションへの応答は対象外。
+    retry_after : float
+        429を返すときに待たせる秒数
+    global_rate_limit : float
+        1秒あたりに受け付けるリクエストの数。超えた分にはグローバルな429を返す。0なら制限しない。
+    seed : int | None
+        乱数のシード
+
+    Attributes
+    ----------
+    requests : Counter[tuple[str, str]]
+        (メソッド, ルート)ごとのリクエスト数
+    rate_limited : int
+        429を返した回数
+    interaction_latencies : list[float]
+        インタラクションを送ってから応答を受け取るまでの秒数
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit_ratio: float = 0.0,
+        retry_after: float = 0.05,
+        global_rate_limit: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.global_rate_limit = global_rate_limit
+        # 直近1秒に受け付けたリクエストの時刻
+        self._sent: deque[float] = deque()
+        self.rng = random.Random(seed)
+        self._counter = itertools.count()
+
+        self.requests: Counter[tuple[str, str]] = Counter()
+        self.rate_limited = 0
+        self.interaction_latencies: list[float] = []
+
+        self.application_id = self.snowflake()
+        self.bot_user = self.user_payload(self.application_id, "werewolf-bot", bot=True)
+
+        self.users: dict[int, dict[str, Any]] = {}
+        self.channels: dict[int, dict[str, Any]] = {}
+        self.messages: dict[int, dict[str, Any]] = {}
+        # DMチャンネルのID -> ユーザーID
+        self.dm_recipients: dict[int, int] = {}
+        # インタラクションのトークン -> (インタラクションID, チャンネルID, 元のメッセージID)
+        self._interactions: dict[str, tuple[int, int, int | None]] = {}
+        self._original_messages: dict[str, int] = {}
+        self._interaction_users: dict[int, int] = {}
+        self._pending: dict[int, tuple[float, asyncio.Future[None]]] = {}
+        # forget()のための、チャンネルごとのメッセージとインタラクション、ユーザーごとのDMチャンネル
+        self._channel_messages: dict[int, list[int]] = {}
+        self._channel_tokens: dict[int, list[str]] = {}
+        self._user_dm_channels: dict[int, list[int]] = {}
+
+        self.listeners: list[MessageListener] = []
+        self.client: discord.Client | None = None
+
+        self._runner: web.AppRunner | None = None
+        self.port = 0
+
+    # ID・ペイロード
+
+    def snowflake(self) -> int:
+        timestamp = int(time.time() * 1000) - DISCORD_EPOCH
+        return (timestamp << 22) | (next(self._counter) & 0x3FFFFF)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    @staticmethod
+    def user_payload(user_id: int, name: str, bot: bool = False) -> dict[str, Any]:
+        return {
+            "id": str(user_id),
+            "username": name,
+            "global_name": name,
+            "discriminator": "0",
+            "avatar": None,
+            "bot": bot,
+        }
+
+    def member_payload(self, user_id: int) -> dict[str, Any]:
+        return {
+            "user": self.users[user_id],
+            "roles": [],
+            "joined_at": self._now(),
+            "deaf": False,
+            "mute": False,
+            "flags": 0,
+            "permissions": "0",
+        }
+
+    def create_user(self, name: str) -> int:
+        user_id = self.snowflake()
+        self.users[user_id] = self.user_payload(user_id, name)
+        return user_id
+
+    def _channel_payload(self, guild_id: int) -> dict[str, Any]:
+        return {
+            "id": str(self.snowflake()),
+            "type": 0,
+            "guild_id": str(guild_id),
+            "name": "werewolf",
+            "position": 0,
+            "permission_overwrites": [],
+            "nsfw": False,
+            "parent_id": None,
+        }
+
+    def create_guild(self, name: str) -> tuple[int, int]:
+        """
+        テキストチャンネルを1つ持つギルドを作り、ボットに参加させる。
+
+        Returns
+        -------
+        tuple[int, int]
+            ギルドIDとチャンネルID
+        """
+
+        guild_id = self.snowflake()
+        channel = self._channel_payload(guild_id)
+        self.channels[int(channel["id"])] = channel
+
+        if self.client is not None:
+            self.client._connection.parse_guild_create(
+                {
+                    "id": str(guild_id),
+                    "name": name,
+                    "owner_id": str(self.application_id),
+                    "channels": [channel],
+                    "roles": [
+                        {
+                            "id": str(guild_id),
+                            "name": "@everyone",
+                            "permissions": str(discord.Permissions.all().value),
+                            "position": 0,
+                            "color": 0,
+                            "hoist": False,
+                            "managed": False,
+                            "mentionable": False,
+                        }
+                    ],
+                    "members": [],
+                    "member_count": 1,
+                    "features": [],
+                    "emojis": [],
+                    "stickers": [],
+                }  # type: ignore[arg-type]
+            )
+        return guild_id, int(channel["id"])
+
+    def create_channel(self, guild_id: int) -> int:
+        """
+        ギルドにテキストチャンネルを追加する。
+        """
+
+        channel = self._channel_payload(guild_id)
+        self.channels[int(channel["id"])] = channel
+        if self.client is not None:
+            self.client._connection.parse_channel_create(channel)  # type: ignore[arg-type]
+        return int(channel["id"])
+
+    def _message_payload(
+        self,
+        channel_id: int,
+        body: dict[str, Any],
+        interaction: tuple[int, int] | None = None,
+    ) -> dict[str, Any]:
+        channel = self.channels.get(channel_id, {})
+        message: dict[str, Any] = {
+            "id": str(self.snowflake()),
+            "channel_id": str(channel_id),
+            "type": 0,
+            "author": self.bot_user,
+            "content": body.get("content") or "",
+            "embeds": body.get("embeds") or [],
+            "components": body.get("components") or [],
+            "attachments": [],
+            "mentions": [],
+            "mention_roles": [],
+            "mention_everyone": False,
+            "pinned": False,
+            "tts": False,
+            "timestamp": self._now(),
+            "edited_timestamp": None,
+            "flags": body.get("flags", 0),
+        }
+        if "guild_id" in channel:
+            message["guild_id"] = channel["guild_id"]
+        if interaction is not None:
+            # インタラクションの応答で作られたメッセージは、Viewを元のインタラクションIDで探す
+            interaction_id, user_id = interaction
+            message["interaction_metadata"] = {
+                "id": str(interaction_id),
+                "type": 2,
+                "user": self.users.get(user_id, self.bot_user),
+                "authorizing_integration_owners": {},
+            }
+        return message
+
+    def _store_message(self, message: dict[str, Any]) -> dict[str, Any]:
+        self.messages[int(message["id"])] = message
+        self._channel_messages.setdefault(int(message["channel_id"]), []).append(
+            int(message["id"])
+        )
+        for listener in self.listeners:
+            listener(message)
+        return message
+
+    def _edit_message(self, message_id: int, body: dict[str, Any]) -> dict[str, Any]:
+        message = self.messages[message_id]
+        for key in ("content", "embeds", "components"):
+            if key in body:
+                message[key] = body[key] if body[key] is not None else message[key]
+        message["edited_timestamp"] = self._now()
+        return message
+
+    # REST
+
+    def _rate_limited(
+        self, route: str, retry_after: float, is_global: bool
+    ) -> web.Response:
+        self.rate_limited += 1
+        return _json_response(
+            {
+                "message": "You are being rate limited.",
+                "retry_after": retry_after,
+                "global": is_global,
+            },
+            status=429,
+            headers={
+                "X-RateLimit-Limit": "5",
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset-After": f"{retry_after:.3f}",
+                "X-RateLimit-Bucket": route,
+                "X-RateLimit-Scope": "global" if is_global else "user",
+                **({"X-RateLimit-Global": "true"} if is_global else {}),
+                # Viaがない429はCloudflareによる遮断として扱われ、再試行されない
+                "Via": "1.1 google",
+            },
+        )
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        route = route_of(request.path)
+        self.requests[(request.method, route)] += 1
+
+        delay = self.latency + (self.rng.random() * self.jitter if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        # インタラクションへの応答はレート制限の対象外
+        if not request.path.startswith("/api/v10/interactions/"):
+            now = time.monotonic()
+            sent = self._sent
+            while sent and sent[0] <= now - 1.0:
+                sent.popleft()
+            if self.global_rate_limit and len(sent) >= self.global_rate_limit:
+                return self._rate_limited(route, sent[0] + 1.0 - now, is_global=True)
+            if self.rate_limit_ratio and self.rng.random() < self.rate_limit_ratio:
+                return self._rate_limited(route, self.retry_after, is_global=False)
+            sent.append(now)
+
+        body: dict[str, Any] = {}
+        if request.can_read_body:
+            if request.content_type == "application/json":
+                body = await request.json()
+            elif request.content_type.startswith("multipart/"):
+                form = await request.post()
+                body = discord.utils._from_json(str(form.get("payload_json", "{}")))
+
+        try:
+            return await self._route(request, body)
+        except KeyError:
+            return _json_response({"message": "Unknown", "code": 10000}, status=404)
+
+    async def _route(
+        self, request: web.Request, body: dict[str, Any]
+    ) -> web.StreamResponse:
+        method = request.method
+        parts = request.path.split("/")[3:]  # /api/v10/以降
+
+        match (method, parts):
+            case ("GET", ["users", "@me"]):
+                return _json_response(self.bot_user)
+            case ("GET", ["oauth2", "applications", "@me"]):
+                return _json_response(
+                    {
+                        "id": str(self.application_id),
+                        "name": "werewolf-bot",
+                        "description": "",
+                        "icon": None,
+                        "bot_public": True,
+                        "bot_require_code_grant": False,
+                        "owner": self.bot_user,
+                        "verify_key": "0",
+                        "flags": 0,
+                    }
+                )
+            case ("GET", ["users", user_id]):
+                return _json_response(self.users[int(user_id)])
+            case ("GET", ["guilds", _, "members", user_id]):
+                return _json_response(self.member_payload(int(user_id)))
+            case ("POST", ["users", "@me", "channels"]):
+                user_id = int(body["recipient_id"])
+                channel_id = self.snowflake()
+                self.channels[channel_id] = {"id": str(channel_id), "type": 1}
+                self.dm_recipients[channel_id] = user_id
+                self._user_dm_channels.setdefault(user_id, []).append(channel_id)
+                return _json_response(
+                    {
+                        "id": str(channel_id),
+                        "type": 1,
+                        "recipients": [self.users[user_id]],
+                        "last_message_id": None,
+                    }
+                )
+            case ("POST", ["channels", channel_id, "messages"]):
+                message = self._message_payload(int(channel_id), body)
+                return _json_response(self._store_message(message))
+            case ("GET", ["channels", _, "messages", message_id]):
+                return _json_response(self.messages[int(message_id)])
+            case ("PATCH", ["channels", _, "messages", message_id]):
+                return _json_response(self._edit_message(int(message_id), body))
+            case ("POST", ["interactions", _, token, "callback"]):
+                return self._interaction_callback(token, body)
+            case ("GET", ["webhooks", _, token, "messages", "@original"]):
+                return _json_response(self.messages[self._original_messages[token]])
+            case ("PATCH", ["webhooks", _, token, "messages", "@original"]):
+                message_id = self._original_messages[token]
+                return _json_response(self._edit_message(message_id, body))
+            case ("POST", ["webhooks", _, token]):
+                _, channel_id, _ = self._interactions[token]
+                message = self._message_payload(channel_id, body)
+                return _json_response(self._store_message(message))
+            case ("PUT", ["applications", _, "commands"]):
+                return _json_response(body)
+
+        raise KeyError(request.path)
+
+    def _interaction_callback(self, token: str, body: dict[str, Any]) -> web.Response:
+        interaction_id, channel_id, message_id = self._interactions[token]
+        pending = self._pending.pop(interaction_id, None)
+        if pending is not None:
+            sent_at, future = pending
+            self.interaction_latencies.append(time.perf_counter() - sent_at)
+            if not future.done():
+                future.set_result(None)
+
+        kind = body["type"]
+        data = body.get("data") or {}
+        if kind == 4:
+            # エフェメラルなメッセージはチャンネルに残らないため保持しない
+            if not data.get("flags", 0) & 64:
+                user_id = self._interaction_users.get(interaction_id, 0)
+                message = self._message_payload(
+                    channel_id, data, interaction=(interaction_id, user_id)
+                )
+                self._original_messages[token] = int(message["id"])
+                self._store_message(message)
+        elif kind == 7 and message_id is not None:
+            self._edit_message(message_id, data)
+            self._original_messages[token] = message_id
+        return web.Response(status=204)
+
+    async def start(self) -> None:
+        """
+        RESTのサーバーを起動し、discord.pyの送信先をこのサーバーに向ける。
+        """
+
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+
+        base = f"http://127.0.0.1:{self.port}/api/v10"
+        discord.http.Route.BASE = base
+        discord.webhook.async_.Route.BASE = base
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def connect(self, client: discord.Client) -> None:
+        """
+        クライアントをログインさせる。ゲートウェイには接続しない。
+        """
+
+        self.client = client
+        await client.login("fake-token")
+
+    # ゲートウェイ
+
+    def _dispatch(
+        self,
+        kind: int,
+        user_id: int,
+        channel_id: int,
+        data: dict[str, Any],
+        message: dict[str, Any] | None = None,
+    ) -> asyncio.Future[None]:
+        assert self.client is not None
+
+        interaction_id = self.snowflake()
+        token = f"token-{interaction_id}"
+        message_id = int(message["id"]) if message is not None else None
+        self._interactions[token] = (interaction_id, channel_id, message_id)
+        self._channel_tokens.setdefault(channel_id, []).append(token)
+        self._interaction_users[interaction_id] = user_id
+
+        channel = self.channels[channel_id]
+        payload: dict[str, Any] = {
+            "id": str(interaction_id),
+            "application_id": str(self.application_id),
+            "type": kind,
+            "token": token,
+            "version": 1,
+            "channel_id": str(channel_id),
+            "channel": channel,
+            "data": data,
+            "locale": "ja",
+            "app_permissions": "0",
+            "entitlements": [],
+            "authorizing_integration_owners": {},
+        }
+        if "guild_id" in channel:
+            payload["guild_id"] = channel["guild_id"]
+            payload["guild_locale"] = "ja"
+            payload["member"] = self.member_payload(user_id)
+        else:
+            payload["user"] = self.users[user_id]
+        if message is not None:
+            payload["message"] = message
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._pending[interaction_id] = (time.perf_counter(), future)
+        self.client._connection.parse_interaction_create(payload)  # type: ignore[arg-type]
+        return future
+
+    def slash_command(
+        self,
+        user_id: int,
+        channel_id: int,
+        name: str,
+        options: list[dict[str, Any]] | None = None,
+    ) -> asyncio.Future[None]:
+        """
+        スラッシュコマンドを実行する。
+
+        Returns
+        -------
+        asyncio.Future[None]
+            ボットが応答したときに完了するFuture
+        """
+
+        return self._dispatch(
+            2,
+            user_id,
+            channel_id,
+            {
+                "id": str(self.application_id),
+                "name": name,
+                "type": 1,
+                "options": options or [],
+            },
+        )
+
+    def click(
+        self,
+        user_id: int,
+        message: dict[str, Any],
+        custom_id: str,
+        values: list[str] | None = None,
+    ) -> asyncio.Future[None]:
+        """
+        メッセージのボタンを押すか、セレクトメニューで選ぶ。
+        """
+
+        data: dict[str, Any] = {"custom_id": custom_id, "component_type": 2}
+        if values is not None:
+            data = {"custom_id": custom_id, "component_type": 3, "values": values}
+        return self._dispatch(
+            3, user_id, int(message["channel_id"]), data, message=message
+        )
+
+    def forget(self, channel_ids: list[int], user_ids: list[int]) -> None:
+        """
+        終わったゲームのチャンネル・ユーザー・DM・メッセージを捨てる。
+        ギルドのチャンネルはクライアントからも削除する。
+        長く動かす負荷試験で、この偽物のメモリが増え続けないようにする。
+        """
+
+        channel_ids = list(channel_ids)
+        for user_id in user_ids:
+            channel_ids.extend(self._user_dm_channels.pop(user_id, []))
+            self.users.pop(user_id, None)
+
+        for channel_id in channel_ids:
+            for message_id in self._channel_messages.pop(channel_id, []):
+                self.messages.pop(message_id, None)
+            for token in self._channel_tokens.pop(channel_id, []):
+                interaction_id, _, _ = self._interactions.pop(token)
+                self._interaction_users.pop(interaction_id, None)
+                self._original_messages.pop(token, None)
+                self._pending.pop(interaction_id, None)
+            self.dm_recipients.pop(channel_id, None)
+
+            channel = self.channels.pop(channel_id, None)
+            if (
+                channel is not None
+                and "guild_id" in channel
+                and self.client is not None
+            ):
+                self.client._connection.parse_channel_delete(channel)  # type: ignore[arg-type]
+
+    def is_tracked(self, message_id: int) -> bool:
+        """
+        ボットがメッセージのViewを登録していればTrue。
+        """
+
+        assert self.client is not None
+        return self.client._connection._view_store.is_message_tracked(message_id)
+
+    @staticmethod
+    def components(message: dict[str, Any]) -> list[dict[str, Any]]:
+        """
+        メッセージのコンポーネント(ボタンやセレクトメニュー)を平らにして返す。
+        """
+
+        return [
+            component
+            for row in message.get("components", [])
+            for component in row.get("components", [])
+        ]
@@ -0,0 +1,315 @@
+"""
+FakeDiscordを相手に、/werewolfのゲームを同時にいくつも最初から最後まで進める負荷試験。
+
+ボットはmain.pyのクライアントとコマンドツリーをそのまま使い、
+募集(JoinView)・役職の自動設定・開始・夜の能力とキル投票(DM)・処刑投票(PlayerChoiceView)を
+すべてインタラクションとして送る。プレイヤーは選択肢が届くと、考える時間の後にランダムに選ぶ。
+
+    python -m Game.Werewolf.Test.load_test --games 50 --concurrency 10 --players 8
+    python -m Game.Werewolf.Test.load_test --games 20 --latency 0.05 --rate-limit 0.02
+    python -m Game.Werewolf.Test.load_test --games 60 --concurrency 60 --global-limit 50
+
+結果として、1分あたりのゲーム数・インタラクションへの応答時間(p50/p99)・1ゲームあたりのREST呼び出し数を出す。
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+from typing import Any
+
+import Modules.global_value as g
+from Game.Werewolf.balance import balance_table
+from Game.Werewolf.Test.fake_discord import FakeDiscord
+from Modules.admission import admission
+
+# インタラクションの応答を待つ上限(秒)。締め切られたViewへの操作には応答がない
+RESPONSE_TIMEOUT = 5.0
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+class LoadTest:
+    """
+    ゲームを同時に進め、プレイヤーの操作を代わりに行うクラス。
+
+    Parameters
+    ----------
+    fake : FakeDiscord
+        Discordの代わり
+    players : int
+        1ゲームあたりの人数(募集者を含む)
+    think : float
+        プレイヤーが選択肢を受け取ってから選ぶまでの最大の秒数
+    seed : int | None
+        乱数のシード
+    guilds : int
+        ゲームを置くギルドの数。0ならゲームごとにギルドを作る。
+    """
+
+    def __init__(
+        self,
+        fake: FakeDiscord,
+        players: int,
+        think: float,
+        seed: int | None,
+        guilds: int = 0,
+    ):
+        self.fake = fake
+        self.players = players
+        self.think = think
+        self.rng = random.Random(seed)
+        # ギルドを共有する場合は、ゲームごとにチャンネルだけを作る
+        self.guild_ids = [fake.create_guild(f"load-test-{i}")[0] for i in range(guilds)]
+
+        # チャンネルID -> ゲームID
+        self.channel_games: dict[int, int] = {}
+        self.unanswered = 0
+        self.durations: list[float] = []
+        self.failed = 0
+        self._tasks: set[asyncio.Task] = set()
+
+        fake.listeners.append(self.on_message)
+
+    def _spawn(self, coro: Any) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _respond(self, future: asyncio.Future[None]) -> None:
+        try:
+            await asyncio.wait_for(future, RESPONSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.unanswered += 1
+
+    # プレイヤーの操作
+
+    def on_message(self, message: dict[str, Any]) -> None:
+        """
+        セレクトメニューの付いたメッセージが届いたら、選ぶ人ごとに操作を予約する。
+        """
+
+        select = next(
+            (c for c in self.fake.components(message) if c["type"] == 3), None
+        )
+        if select is None:
+            return
+
+        channel_id = int(message["channel_id"])
+        recipient = self.fake.dm_recipients.get(channel_id)
+        if recipient is not None:
+            # 夜の能力やキル投票はDMで本人だけが選ぶ
+            self._spawn(self._choose(recipient, message, select))
+            return
+
+        game = g.werewolf_games.get(self.channel_games.get(channel_id, 0))
+        if game is None:
+            return
+        # 処刑投票は生存しているプレイヤー全員が選ぶ
+        for player in game.roster.alive_players:
+            self._spawn(self._choose(player.id, message, select))
+
+    async def _choose(
+        self, user_id: int, message: dict[str, Any], select: dict[str, Any]
+    ) -> None:
+        if self.think:
+            await asyncio.sleep(self.rng.random() * self.think)
+
+        # ボットが送信の応答を受け取ってViewを登録するまで待つ
+        message_id = int(message["id"])
+        while not self.fake.is_tracked(message_id):
+            await asyncio.sleep(0.01)
+            # 締め切られて選択肢が消えたか、ゲームが終わっていれば何もしない
+            current = self.fake.messages.get(message_id)
+            if current is None or not self.fake.components(current):
+                return
+
+        options = [o["value"] for o in select["options"] if o["value"] != str(user_id)]
+        value = self.rng.choice(options or [o["value"] for o in select["options"]])
+        await self._respond(
+            self.fake.click(user_id, message, select["custom_id"], [value])
+        )
+
+    # ゲームの進行
+
+    async def run_game(self, index: int) -> None:
+        fake = self.fake
+        if self.guild_ids:
+            channel_id = fake.create_channel(
+                self.guild_ids[index % len(self.guild_ids)]
+            )
+        else:
+            _, channel_id = fake.create_guild(f"load-test-{index}")
+        host_id = fake.create_user(f"host{index}")
+        player_ids = [
+            fake.create_user(f"player{index}-{i}") for i in range(self.players - 1)
+        ]
+
+        start = time.perf_counter()
+        await self._respond(
+            fake.slash_command(
+                host_id,
+                channel_id,
+                "werewolf",
+                [{"name": "limit", "type": 4, "value": 15}],
+            )
+        )
+        # 応答の後でゲームが登録されるため、登録されるまで待つ
+        game = None
+        deadline = time.perf_counter() + RESPONSE_TIMEOUT
+        while game is None and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+            game = g.werewolf_games.find_recruiting(channel_id, host_id)
+        if game is None:
+            self.failed += 1
+            return
+        self.channel_games[channel_id] = game.id
+
+        buttons = {
+            c["label"]: c["custom_id"]
+            for c in fake.components(fake.messages[game.message.id])
+            if c["type"] == 2
+        }
+        for player_id in player_ids:
+            await self._respond(
+                fake.click(player_id, fake.messages[game.message.id], buttons["参加"])
+            )
+
+        await self._respond(
+            fake.slash_command(
+                host_id,
+                channel_id,
+                "role",
+                [{"name": "autobalance", "type": 1, "options": []}],
+            )
+        )
+        await self._respond(
+            fake.click(host_id, fake.messages[game.message.id], buttons["開始"])
+        )
+
+        # ゲームは終了時に削除される
+        while game.id in g.werewolf_games:
+            await asyncio.sleep(0.05)
+        self.durations.append(time.perf_counter() - start)
+        del self.channel_games[channel_id]
+        fake.forget([channel_id], [host_id, *player_ids])
+
+
+async def run(args: argparse.Namespace) -> None:
+    # on_readyは呼ばないため、チェックポイントの保存・放置されたゲームの削除・コマンドの同期は行わない
+    import main
+
+    fake = FakeDiscord(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit_ratio=args.rate_limit,
+        global_rate_limit=args.global_limit,
+        seed=args.seed,
+    )
+    await fake.start()
+    await fake.connect(main.client)
+    await balance_table.load_async()
+
+    test = LoadTest(fake, args.players, args.think, args.seed, args.guilds)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(index: int) -> None:
+        async with semaphore:
+            try:
+                await asyncio.wait_for(test.run_game(index), args.game_timeout)
+            except Exception:
+                logging.getLogger("LoadTest").exception(f"Game {index} failed")
+                test.failed += 1
+
+    peak_running = peak_queued = 0
+
+    async def sample_admission() -> None:
+        nonlocal peak_running, peak_queued
+        while True:
+            peak_running = max(peak_running, admission.running)
+            peak_queued = max(peak_queued, admission.queued)
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample_admission())
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(args.games)))
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+
+    await main.client.close()
+    await fake.stop()
+
+    completed = len(test.durations)
+    rest_calls = sum(fake.requests.values())
+    latencies = fake.interaction_latencies
+    print(f"games: {completed} completed, {test.failed} failed in {elapsed:.1f}s")
+    print(f"games/minute: {completed / elapsed * 60:.1f}")
+    if test.durations:
+        print(
+            f"game duration: p50 {percentile(test.durations, 0.5):.2f}s, "
+            f"p99 {percentile(test.durations, 0.99):.2f}s"
+        )
+    print(
+        f"interaction latency: p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms, "
+        f"mean {statistics.fmean(latencies) * 1000 if latencies else 0:.1f}ms "
+        f"({len(latencies)} interactions, {test.unanswered} unanswered)"
+    )
+    print(
+        f"REST calls: {rest_calls} total, {rest_calls / max(completed, 1):.1f}/game, "
+        f"{fake.rate_limited} rate limited"
+    )
+    print(f"admission: peak {peak_running} running, peak {peak_queued} queued")
+    for (method, route), count in fake.requests.most_common(args.top_routes):
+        print(f"  {count / max(completed, 1):7.1f}/game  {method:6} {route}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=20, help="ゲームの数")
+    parser.add_argument(
+        "--concurrency", type=int, default=10, help="同時に進めるゲームの数"
+    )
+    parser.add_argument("--players", type=int, default=8, help="1ゲームあたりの人数")
+    parser.add_argument(
+        "--think", type=float, default=0.2, help="プレイヤーが選ぶまでの最大の秒数"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="RESTの応答にかける秒数"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="応答の遅延に加える乱数の最大値"
+    )
+    parser.add_argument(
+        "--rate-limit", type=float, default=0.0, help="429を返すリクエストの割合"
+    )
+    parser.add_argument(
+        "--global-limit",
+        type=float,
+        default=0.0,
+        help="1秒あたりに受け付けるリクエストの数",
+    )
+    parser.add_argument(
+        "--guilds", type=int, default=0, help="ゲームを置くギルドの数(0ならゲームごと)"
+    )
+    parser.add_argument(
+        "--game-timeout", type=float, default=600, help="1ゲームの上限の秒数"
+    )
+    parser.add_argument("--top-routes", type=int, default=10, help="表示するルートの数")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    args = parser.parse_args()
+
+    # ゲームごとのログは量が多いため、警告以上だけを出す
+    logging.disable(logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
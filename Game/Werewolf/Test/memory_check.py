@@ -0,0 +1,210 @@
+"""
+ゲームが終わった後にメモリが残らないことを、tracemallocで確かめるスクリプト。
+
+FakeDiscordを相手にゲームを最後まで進め、準備運動の後と本番の後でメモリを比べる。
+終わったゲーム・View・プレイヤーが残っているか、1ゲームあたりの増加が上限を超えた場合は失敗する。
+同時に進行できるゲームの数を同時に進めるゲームの数より小さくし、開始待ちになったゲームも確かめる。
+
+    python -m Game.Werewolf.Test.memory_check --games 1000
+
+終了コードは成功で0、失敗で1。
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import sys
+import tracemalloc
+from typing import Any
+
+from Game.Werewolf.balance import balance_table
+from Game.Werewolf.game import WerewolfGame
+from Game.Werewolf.player import Player
+from Game.Werewolf.Test.fake_discord import FakeDiscord
+from Game.Werewolf.Test.load_test import LoadTest
+from Modules.admission import admission
+from Modules.user_cache import user_cache
+from Modules.Views.TrackedView import TrackedView
+
+# 1ゲームの上限の秒数
+GAME_TIMEOUT = 120.0
+# 接続のプールなど同時に進むゲームの数だけ増えるものが埋まるよう、準備運動はこの倍数以上にする
+WARMUP_PER_CONCURRENCY = 4
+
+
+def live_objects() -> dict[str, int]:
+    counts = {"WerewolfGame": 0, "Player": 0, "TrackedView": 0}
+    for obj in gc.get_objects():
+        if isinstance(obj, WerewolfGame):
+            counts["WerewolfGame"] += 1
+        elif isinstance(obj, Player):
+            counts["Player"] += 1
+        elif isinstance(obj, TrackedView):
+            counts["TrackedView"] += 1
+    return counts
+
+
+async def run_games(test: LoadTest, start: int, count: int, concurrency: int) -> int:
+    """
+    ゲームを進め、開始待ちになったゲームの数の最大を返す。
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+    peak_queued = 0
+
+    async def sample_queued() -> None:
+        nonlocal peak_queued
+        while True:
+            peak_queued = max(peak_queued, admission.queued)
+            await asyncio.sleep(0.01)
+
+    async def limited(index: int) -> None:
+        async with semaphore:
+            try:
+                await asyncio.wait_for(test.run_game(index), GAME_TIMEOUT)
+            except Exception:
+                logging.getLogger("MemoryCheck").exception(f"Game {index} failed")
+                test.failed += 1
+
+    sampler = asyncio.create_task(sample_queued())
+    await asyncio.gather(*(limited(i) for i in range(start, start + count)))
+    sampler.cancel()
+    # 選び終わったプレイヤーの操作や、送信待ちのメッセージが片付くのを待つ
+    while test._tasks:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.5)
+    return peak_queued
+
+
+def settle(fake: FakeDiscord, test: LoadTest, http: Any) -> tracemalloc.Snapshot:
+    # 計測結果として溜めている値は、ボットのメモリではないため捨てる
+    fake.interaction_latencies.clear()
+    test.durations.clear()
+    # 上限や有効期限のあるキャッシュは、ゲームの数ではなく時間や件数で頭打ちになるため空にする
+    # (ユーザーのキャッシュと、discord.pyが最後の送信から5分間残すレート制限のバケット)
+    user_cache._entries.clear()
+    http._buckets.clear()
+    gc.collect()
+    return tracemalloc.take_snapshot()
+
+
+async def run(args: argparse.Namespace) -> bool:
+    import main
+
+    fake = FakeDiscord(seed=args.seed)
+    await fake.start()
+    await fake.connect(main.client)
+    await balance_table.load_async()
+    test = LoadTest(fake, args.players, args.think, args.seed, guilds=args.guilds)
+    # 送信量を見た開始の間隔は、メモリの確認には不要なため無効にする
+    admission.rest_budget = float("inf")
+    # 開始待ちのゲームが中止ボタンだけの表示に変わった後も、Viewが残らないことを確かめる
+    admission.max_running = args.max_running or max(1, args.concurrency // 2)
+
+    tracemalloc.start(args.frames)
+
+    # discord.pyのメッセージキャッシュなど、上限まで増えるものを先に埋める
+    warmup = max(args.warmup, args.concurrency * WARMUP_PER_CONCURRENCY)
+    await run_games(test, 0, warmup, args.concurrency)
+    before = settle(fake, test, main.client.http)
+
+    peak_queued = await run_games(test, warmup, args.games, args.concurrency)
+    after = settle(fake, test, main.client.http)
+
+    objects = live_objects()
+    await main.client.close()
+    await fake.stop()
+
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        # Discordの代わりとその試験用サーバーのメモリは数えない
+        tracemalloc.Filter(False, "*/Test/*"),
+        tracemalloc.Filter(False, "*/aiohttp/web*"),
+    ]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+    diff = after.compare_to(before, "lineno")
+    growth = sum(stat.size_diff for stat in diff)
+    per_game = growth / args.games
+
+    print(f"games: {warmup} warmup + {args.games} measured")
+    print(f"memory growth: {growth / 1024:.1f}KB total, {per_game:.1f}B/game")
+    print(
+        f"admission: {admission.max_running} running at most, "
+        f"peak {peak_queued} queued"
+    )
+    print(f"live objects: {objects}")
+    print("top growth:")
+    for stat in diff[: args.top]:
+        frame = stat.traceback[0]
+        print(
+            f"  {stat.size_diff / 1024:8.1f}KB {stat.count_diff:+7d}  "
+            f"{frame.filename}:{frame.lineno}"
+        )
+
+    ok = True
+    if test.failed:
+        print(f"FAIL: {test.failed} games did not finish")
+        ok = False
+    if not peak_queued:
+        print("FAIL: no game waited for a start slot")
+        ok = False
+    if any(objects.values()):
+        print("FAIL: finished games are still reachable")
+        ok = False
+    # GameRegistryの辞書などは削除と追加を繰り返すうちに作り直されることがあり、
+    # その分はゲームの数によらないため、上限に一定の余裕を加える
+    if growth > args.max_per_game * args.games + args.slack:
+        print(
+            f"FAIL: memory grew more than {args.max_per_game}B per game "
+            f"plus {args.slack}B"
+        )
+        ok = False
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=1000, help="計測するゲームの数")
+    parser.add_argument(
+        "--warmup", type=int, default=200, help="計測前に進めるゲームの数"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=50, help="同時に進めるゲームの数"
+    )
+    parser.add_argument(
+        "--max-running",
+        type=int,
+        default=0,
+        help="同時に進行できるゲームの数(0で同時に進めるゲームの数の半分)",
+    )
+    parser.add_argument("--players", type=int, default=6, help="1ゲームあたりの人数")
+    parser.add_argument(
+        "--think", type=float, default=0.01, help="プレイヤーが選ぶまでの最大の秒数"
+    )
+    parser.add_argument("--guilds", type=int, default=10, help="ゲームを置くギルドの数")
+    parser.add_argument(
+        "--max-per-game",
+        type=float,
+        default=512,
+        help="1ゲームあたりに許す増加(バイト)",
+    )
+    parser.add_argument(
+        "--slack", type=int, default=16384, help="ゲームの数によらず許す増加(バイト)"
+    )
+    parser.add_argument(
+        "--frames", type=int, default=1, help="tracemallocが記録するフレームの数"
+    )
+    parser.add_argument("--top", type=int, default=10, help="表示する増加の多い行の数")
+    parser.add_argument("--seed", type=int, default=1, help="乱数のシード")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Discordに接続せずにシャーディングを確認するためのスクリプト。
+
+コーディネーターがワーカープロセスを起動し、各ワーカーはゲートウェイの代わりとなる
+StandInGatewayから自分の担当するギルドのイベントだけを受け取る。
+同じユーザーが複数のギルドに現れるため、シャードをまたいだ二重参加の確認が行われる。
+
+    python -m Game.Werewolf.Test.shard_gateway --workers 3 --shards 6 --crash-worker 1
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from Modules.sharding import (
+    WORKER_ID,
+    Coordinator,
+    coordinator_client,
+    shard_id_of,
+    worker_shard_ids,
+)
+
+EventKind = Literal["create", "join", "leave", "end"]
+
+
+@dataclass(frozen=True, slots=True)
+class GatewayEvent:
+    seq: int
+    guild_id: int
+    user_id: int
+    kind: EventKind
+
+
+class StandInGateway:
+    """
+    ゲートウェイの代わりにギルドのイベントを生成するクラス。
+    シードが同じなら、どのプロセスでも同じ順序で同じイベントを生成する。
+
+    Parameters
+    ----------
+    shard_count : int
+        シャードの総数
+    guilds : int
+        ギルドの数
+    users : int
+        ユーザーの数
+    seed : int
+        乱数のシード
+    """
+
+    def __init__(self, shard_count: int, guilds: int, users: int, seed: int = 0):
+        self.shard_count = shard_count
+        rng = random.Random(seed)
+        # ギルドIDはスノーフレークと同じく、上位ビットでシャードが決まる
+        self.guild_ids = [rng.getrandbits(40) << 22 for _ in range(guilds)]
+        self.users = users
+        self.seed = seed
+
+    def events(self, count: int) -> Iterator[GatewayEvent]:
+        rng = random.Random(self.seed + 1)
+        kinds: list[EventKind] = ["create", "join", "leave", "end"]
+        for seq in range(count):
+            yield GatewayEvent(
+                seq=seq,
+                guild_id=rng.choice(self.guild_ids),
+                user_id=rng.randrange(self.users),
+                kind=rng.choices(kinds, weights=(2, 10, 2, 1))[0],
+            )
+
+    def events_for(self, shard_ids: list[int], count: int) -> Iterator[GatewayEvent]:
+        """
+        指定したシャードが担当するギルドのイベントだけを返す。
+        """
+
+        owned = set(shard_ids)
+        for event in self.events(count):
+            if shard_id_of(event.guild_id, self.shard_count) in owned:
+                yield event
+
+
+class GatewayTestCoordinator(Coordinator):
+    """
+    ワーカーからの結果報告を受け取り、二重参加が起きていないかを確認するコーディネーター。
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.reports: dict[int, dict[str, int]] = {}
+        self.max_games_per_user = 0
+
+    def _op_claim(self, worker_id: int, user_id: int, game_id: int) -> dict[str, Any]:
+        reply = super()._op_claim(worker_id, user_id, game_id)
+        self.max_games_per_user = max(
+            self.max_games_per_user, len(self._users.get(user_id, ()))
+        )
+        return reply
+
+    def _op_report(self, worker_id: int, stats: dict[str, int]) -> dict[str, Any]:
+        self.reports[worker_id] = stats
+        return {}
+
+
+async def run_worker(args: argparse.Namespace) -> None:
+    shard_ids = worker_shard_ids()
+    assert shard_ids is not None and WORKER_ID is not None
+    worker_id = int(WORKER_ID)
+
+    await coordinator_client.connect(worker_id)
+    gateway = StandInGateway(args.shards, args.guilds, args.users, args.seed)
+
+    stats: Counter[str] = Counter()
+    # ギルドID -> (ゲームID, 参加者)
+    lobbies: dict[int, tuple[int, set[int]]] = {}
+
+    for event in gateway.events_for(shard_ids, args.events):
+        stats["events"] += 1
+
+        # 1回だけ途中で落ちて、再起動後に最初からやり直す
+        if (
+            worker_id == args.crash_worker
+            and stats["events"] == 50
+            and not os.path.exists(args.crash_marker)
+        ):
+            open(args.crash_marker, "w").close()
+            os._exit(1)
+
+        lobby = lobbies.get(event.guild_id)
+        if event.kind == "create" and lobby is None:
+            game_id = event.seq
+            if await coordinator_client.claim(event.user_id, game_id) is None:
+                lobbies[event.guild_id] = (game_id, {event.user_id})
+                stats["created"] += 1
+            else:
+                stats["refused"] += 1
+        elif event.kind == "join" and lobby is not None:
+            game_id, members = lobby
+            if event.user_id in members:
+                continue
+            if await coordinator_client.claim(event.user_id, game_id) is None:
+                members.add(event.user_id)
+                stats["joined"] += 1
+            else:
+                stats["refused"] += 1
+        elif event.kind == "leave" and lobby is not None:
+            game_id, members = lobby
+            if event.user_id in members:
+                members.discard(event.user_id)
+                coordinator_client.release(event.user_id, game_id)
+                stats["left"] += 1
+        elif event.kind == "end" and lobby is not None:
+            coordinator_client.release_game(lobby[0])
+            del lobbies[event.guild_id]
+            stats["ended"] += 1
+
+    for game_id, _ in lobbies.values():
+        coordinator_client.release_game(game_id)
+
+    await coordinator_client.request("report", stats=dict(stats))
+    await coordinator_client.close()
+
+
+async def run_coordinator(args: argparse.Namespace) -> bool:
+    crash_marker = os.path.join(tempfile.mkdtemp(), "crashed")
+    command = [
+        sys.executable,
+        "-m",
+        "Game.Werewolf.Test.shard_gateway",
+        f"--shards={args.shards}",
+        f"--guilds={args.guilds}",
+        f"--users={args.users}",
+        f"--events={args.events}",
+        f"--seed={args.seed}",
+        f"--crash-worker={args.crash_worker}",
+        f"--crash-marker={crash_marker}",
+    ]
+    coordinator = GatewayTestCoordinator(
+        command, workers=args.workers, shard_count=args.shards, port=0
+    )
+    await coordinator.run()
+
+    handled = sum(r.get("events", 0) for r in coordinator.reports.values())
+    refused = sum(r.get("refused", 0) for r in coordinator.reports.values())
+    for worker_id, report in sorted(coordinator.reports.items()):
+        print(f"worker {worker_id}: {report}")
+    print(
+        f"events {handled}/{args.events}, refused {refused},"
+        f" restarts {sum(coordinator.restarts.values())},"
+        f" max games per user {coordinator.max_games_per_user},"
+        f" games left {coordinator.game_count}"
+    )
+
+    checks = {
+        "every event handled by exactly one shard": handled == args.events,
+        "all workers reported": len(coordinator.reports) == args.workers,
+        "no user in two games": coordinator.max_games_per_user <= 1,
+        "cross-shard conflicts detected": refused > 0,
+        "all games released": coordinator.game_count == 0,
+    }
+    if args.crash_worker >= 0:
+        checks["crashed worker restarted"] = (
+            coordinator.restarts[args.crash_worker] == 1
+        )
+    for name, ok in checks.items():
+        print(f"{'ok' if ok else 'NG'}: {name}")
+    return all(checks.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="シャーディングの動作確認")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--shards", type=int, default=6)
+    parser.add_argument("--guilds", type=int, default=40)
+    parser.add_argument("--users", type=int, default=150)
+    parser.add_argument("--events", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--crash-worker", type=int, default=-1)
+    parser.add_argument("--crash-marker", default="")
+    args = parser.parse_args()
+
+    if WORKER_ID is not None:
+        asyncio.run(run_worker(args))
+    else:
+        sys.exit(0 if asyncio.run(run_coordinator(args)) else 1)
@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import csv
+import itertools
+import logging
+import math
+import os
+import random
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from typing import Final
+
+from Modules.logger import make_logger
+
+BALANCE_FILE: Final = "Resources/Balance.csv"
+
+# テーブル内の役職の並び順。構成は各役職の人数を1桁ずつ並べた文字列で表す
+ROLE_ORDER: Final = (
+    "Werewolf",
+    "Seer",
+    "Medium",
+    "Hunter",
+    "Bakery",
+    "Nekomata",
+    "Madmate",
+    "BlackCat",
+    "Teruteru",
+    "Fox",
+)
+TEAMS: Final = ("TeamVillager", "TeamWerewolf", "TeamFox", "TeamTeruteru")
+# 構成にいる場合だけ勝つことのある第三陣営と、その役職
+THIRD_PARTY_TEAMS: Final = {"Fox": "TeamFox", "Teruteru": "TeamTeruteru"}
+
+MIN_PLAYERS: Final = 3
+MAX_PLAYERS: Final = 15
+# 候補の上位からランダムに選ぶことで、毎回同じ構成になるのを避ける
+PICK_FROM_TOP: Final = 5
+# 1構成あたりのゲーム数。勝率の標準誤差が2%を下回る数(50%のとき約1.9%)
+SWEEP_GAMES: Final = 700
+# これより小さい勝率の差はシミュレーションの誤差とみなし、同じ釣り合いとして扱う
+BALANCE_RESOLUTION: Final = 0.02
+# 勝率の標準誤差がBALANCE_RESOLUTIONに収まるのに必要なゲーム数(勝率50%のとき最大)
+MIN_TABLE_GAMES: Final = math.ceil(0.25 / BALANCE_RESOLUTION**2)
+# 釣り合いが同じ構成は、人狼の割合がこの値に近いものを優先する
+USUAL_WEREWOLF_RATIO: Final = 0.25
+
+logger = make_logger("Balance")
+
+
+def max_werewolves(players: int) -> int:
+    """
+    その人数で扱う人狼の最大数。初日から人狼が半数を超えない範囲にする。
+    """
+
+    return max(1, (players - 1) // 3)
+
+
+def compositions(players: int) -> Iterator[str]:
+    """
+    その人数で対応している役職構成をすべて列挙する。
+    人狼は1人以上、その他の役職は0人か1人で、合計がプレイヤー数以下のもの。
+
+    Yields
+    ------
+    str
+        ROLE_ORDERの順に人数を並べた構成の文字列
+    """
+
+    others = len(ROLE_ORDER) - 1
+    for werewolves in range(1, max_werewolves(players) + 1):
+        for flags in itertools.product((0, 1), repeat=others):
+            if werewolves + sum(flags) <= players:
+                yield str(werewolves) + "".join(map(str, flags))
+
+
+def decode(composition: str) -> dict[str, int]:
+    """
+    構成の文字列を役職名と人数の辞書に戻す。
+    """
+
+    return {
+        name: int(count)
+        for name, count in zip(ROLE_ORDER, composition)
+        if int(count) > 0
+    }
+
+
+def team_spread(composition: str, rates: dict[str, float]) -> float:
+    """
+    構成にいる陣営の勝率の最大と最小の差。小さいほど釣り合っている。
+    村人陣営と人狼陣営に加え、妖狐やてるてるがいる場合はその陣営も比べる。
+    """
+
+    roles = decode(composition)
+    teams = ["TeamVillager", "TeamWerewolf"]
+    teams += [team for role, team in THIRD_PARTY_TEAMS.items() if role in roles]
+    team_rates = [rates.get(team, 0.0) for team in teams]
+    return max(team_rates) - min(team_rates)
+
+
+def balance_key(players: int, composition: str, rates: dict[str, float]) -> tuple:
+    """
+    候補を並べるときのキー。陣営の勝率の差を誤差の幅で区切って比べ、
+    同じ区切りの中では人狼の割合がよくある値に近いもの、最後に構成の文字列の順にする。
+    """
+
+    werewolves = decode(composition).get("Werewolf", 0)
+    return (
+        int(team_spread(composition, rates) / BALANCE_RESOLUTION),
+        abs(werewolves - players * USUAL_WEREWOLF_RATIO),
+        composition,
+    )
+
+
+class BalanceTable:
+    """
+    事前に計算した役職構成ごとの陣営勝率のテーブル。
+    読み込み時に人数ごとの候補を並べておき、選ぶときは計算しない。
+
+    Parameters
+    ----------
+    file_path : str
+        テーブルのCSVファイルのパス
+    """
+
+    def __init__(self, file_path: str = BALANCE_FILE):
+        self.file_path = file_path
+        self.rates: dict[tuple[int, str], dict[str, float]] = {}
+        self._candidates: dict[int, list[str]] = {}
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(self._candidates)
+
+    def load(self) -> None:
+        """
+        CSVを読み込み、人数ごとに釣り合っている順で候補を並べる。
+        ゲーム数がMIN_TABLE_GAMESに満たない構成は読み込まない。
+        """
+
+        if not os.path.exists(self.file_path):
+            logger.warning(f"Balance table not found: {self.file_path}")
+            return
+
+        rates: dict[tuple[int, str], dict[str, float]] = {}
+        with open(self.file_path, mode="r", encoding="utf-8") as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader)
+            teams = header[3:]
+
+            skipped = 0
+            for row in reader:
+                players, composition, games = int(row[0]), row[1], int(row[2])
+                # ゲーム数が少ない構成は、誤差で釣り合って見えることがあるため使わない
+                if games < MIN_TABLE_GAMES:
+                    skipped += 1
+                    continue
+                rates[(players, composition)] = {
+                    team: int(wins) / games for team, wins in zip(teams, row[3:])
+                }
+
+        if skipped:
+            logger.warning(
+                f"Skipped {skipped} compositions simulated with fewer than "
+                f"{MIN_TABLE_GAMES} games in {self.file_path}"
+            )
+
+        candidates: dict[int, list[str]] = {}
+        for (players, composition), team_rates in rates.items():
+            candidates.setdefault(players, []).append(composition)
+        for players, comps in candidates.items():
+            comps.sort(key=lambda c: balance_key(players, c, rates[(players, c)]))
+            del comps[PICK_FROM_TOP:]
+
+        self.rates = rates
+        self._candidates = candidates
+        logger.info(f"Loaded {len(rates)} compositions from {self.file_path}")
+
+    async def load_async(self) -> None:
+        """
+        イベントループを止めずにテーブルを読み込む。
+        """
+
+        if not self.is_loaded:
+            await asyncio.to_thread(self.load)
+
+    def pick(self, players: int) -> dict[str, int] | None:
+        """
+        人数に合った釣り合いのよい構成を選ぶ。
+
+        Parameters
+        ----------
+        players : int
+            プレイヤー数
+
+        Returns
+        -------
+        dict[str, int] | None
+            役職名と人数の辞書。テーブルにない人数の場合はNone。
+        """
+
+        candidates = self._candidates.get(players)
+        if not candidates:
+            return None
+        return decode(random.choice(candidates))
+
+
+balance_table = BalanceTable()
+
+
+def _simulate_composition(args: tuple[int, str, int, int]) -> tuple[int, str, dict]:
+    # ワーカープロセスで実行される
+    players, composition, games, seed = args
+
+    import Modules.global_value  # noqa: F401  循環importを避けるため先に読み込む
+    from Game.Werewolf.headless import simulate
+    from Game.Werewolf.role import Role
+
+    roles = {Role.by_name(name): count for name, count in decode(composition).items()}
+
+    logging.disable(logging.INFO)
+    wins = simulate(roles, players, games, seed)
+    return players, composition, dict(wins)
+
+
+def sweep(
+    games: int,
+    workers: int | None = None,
+    min_players: int = MIN_PLAYERS,
+    max_players: int = MAX_PLAYERS,
+    output: str = BALANCE_FILE,
+    seed: int = 0,
+) -> None:
+    """
+    対応しているすべての役職構成をプロセスプールでシミュレーションし、
+    陣営ごとの勝利数をCSVに書き出す。
+
+    Parameters
+    ----------
+    games : int
+        1構成あたりのゲーム数
+    workers : int | None
+        ワーカープロセスの数。Noneの場合はCPU数。
+    min_players : int
+        最小のプレイヤー数
+    max_players : int
+        最大のプレイヤー数
+    output : str
+        出力先のCSVファイルのパス
+    seed : int
+        乱数のシード
+    """
+
+    tasks = [
+        (players, composition, games, seed + i)
+        for i, (players, composition) in enumerate(
+            (players, composition)
+            for players in range(min_players, max_players + 1)
+            for composition in compositions(players)
+        )
+    ]
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for i, result in enumerate(
+            executor.map(_simulate_composition, tasks, chunksize=16), 1
+        ):
+            results.append(result)
+            if i % 500 == 0:
+                print(
+                    f"{i}/{len(tasks)} compositions ({time.perf_counter() - start:.0f}s)"
+                )
+
+    with open(output, mode="w", encoding="utf-8", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["players", "composition", "games", *TEAMS])
+        for players, composition, wins in results:
+            writer.writerow(
+                [players, composition, games, *(wins.get(team, 0) for team in TEAMS)]
+            )
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Simulated {len(tasks)} compositions x {games} games in {elapsed:.0f}s -> {output}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="役職構成ごとの勝率テーブルを作成する")
+    parser.add_argument(
+        "--games", type=int, default=SWEEP_GAMES, help="1構成あたりのゲーム数"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--min-players", type=int, default=MIN_PLAYERS)
+    parser.add_argument("--max-players", type=int, default=MAX_PLAYERS)
+    parser.add_argument("--output", default=BALANCE_FILE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sweep(
+        games=args.games,
+        workers=args.workers,
+        min_players=args.min_players,
+        max_players=args.max_players,
+        output=args.output,
+        seed=args.seed,
+    )
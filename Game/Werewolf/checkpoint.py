@@ -0,0 +1,137 @@
+import asyncio
+from typing import Any
+
+import discord
+
+import Modules.global_value as g
+from Game.Werewolf.game import WerewolfGame
+from Game.Werewolf.main import Phase
+from Game.Werewolf.player import Player
+from Game.Werewolf.role import Role
+from Modules.checkpoint import checkpoint_store
+from Modules.logger import make_logger
+from Modules.sharding import coordinator_client, owns_guild
+from Modules.translator import Translator
+
+logger = make_logger("Werewolf.Checkpoint")
+
+# 再開したゲームのタスク。実行中に破棄されないよう参照を持っておく
+_resumed_tasks: set[asyncio.Task] = set()
+
+
+async def restore(
+    client: discord.Client, game_id: int, state: dict[str, Any]
+) -> WerewolfGame:
+    """
+    スナップショットからゲームを復元し、レジストリに登録する。
+
+    Parameters
+    ----------
+    client : discord.Client
+        Discordのクライアント
+    game_id : int
+        ゲームのID
+    state : dict[str, Any]
+        WerewolfGame.snapshotで作ったスナップショット
+
+    Returns
+    -------
+    WerewolfGame
+        復元したゲーム
+    """
+
+    channel = client.get_channel(state["channel_id"]) or await client.fetch_channel(
+        state["channel_id"]
+    )
+
+    game = WerewolfGame(
+        id=game_id,
+        host_id=state["host_id"],
+        limit=state["limit"],
+        message=None,
+        channel=channel,  # type: ignore[arg-type]
+        client=client,
+        joinview=None,
+        logger=make_logger("Game", game_id),
+        translator=Translator(state["lang"]),
+        participant_ids=set(state["participant_ids"]),
+        turns=state["turns"],
+        last_night_turn_time=state["last_night_turn_time"],
+        roles={Role.by_name(name): count for name, count in state["roles"].items()},
+        is_started=True,
+    )
+
+    players = []
+    for data in state["players"]:
+        p = Player(data["id"], game_id, data["name"])
+        if data["role"] is not None:
+            p.assign_role(Role.by_name(data["role"]))
+        p.status = data["status"]
+        p.is_alive = data["is_alive"]
+        p.is_kill_protected = data["is_kill_protected"]
+        game.roster.add(p)
+        players.append(p)
+
+    game.assigned_roles = [p.role for p in players if p.role is not None]
+    game.last_alive_players = [game.roster.by_id[id] for id in state["last_alive_ids"]]
+    game.last_executed_player = game.roster.get(state["last_executed_id"])
+
+    g.werewolf_games.add(game)
+    try:
+        await game.transport.prepare_players(players)
+    except Exception:
+        del g.werewolf_games[game_id]
+        raise
+
+    return game
+
+
+async def resume_games(client: discord.Client) -> int:
+    """
+    保存されている未終了のゲームをすべて復元し、保存したフェーズから再開する。
+    復元できなかったゲームのスナップショットは削除する。
+
+    Parameters
+    ----------
+    client : discord.Client
+        Discordのクライアント
+
+    Returns
+    -------
+    int
+        再開したゲームの数
+    """
+
+    resumed = 0
+    for game_id, phase, state in await checkpoint_store.load_all():
+        # 他のワーカーが担当するギルドのゲームはそちらで再開する
+        if game_id in g.werewolf_games or not owns_guild(client, state.get("guild_id")):
+            continue
+
+        try:
+            game = await restore(client, game_id, state)
+        except Exception:
+            logger.warning(f"Failed to restore game {game_id}", exc_info=True)
+            checkpoint_store.discard(game_id)
+            continue
+
+        for user_id in (game.host_id, *game.participant_ids):
+            coordinator_client.add(user_id, game.id)
+
+        task = asyncio.create_task(_run_resumed(game, phase))  # type: ignore[arg-type]
+        _resumed_tasks.add(task)
+        task.add_done_callback(_resumed_tasks.discard)
+        resumed += 1
+
+    if resumed:
+        logger.info(f"Resumed {resumed} games from checkpoints")
+    return resumed
+
+
+async def _run_resumed(game: WerewolfGame, phase: Phase) -> None:
+    try:
+        await game.resume(phase)
+    except Exception:
+        game.logger.error("Resumed game failed", exc_info=True)
+        if game.id in g.werewolf_games:
+            game.delete()
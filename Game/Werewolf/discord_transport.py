@@ -0,0 +1,288 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any
+
+import discord
+
+import Modules.global_value as g
+from Game.Werewolf.embeds import embed_templates
+from Game.Werewolf.tally import VoteTally
+from Game.Werewolf.transport import (
+    AnnounceEvent,
+    ChooseEvent,
+    NotifyEvent,
+    Transport,
+)
+from Game.Werewolf.view import PlayerChoiceView, RoleInfoView
+from Modules.dispatcher import dispatcher
+from Modules.logger import make_logger
+from Modules.metrics import send_latency
+from Modules.outbound import OutboundQueue
+from Modules.timer_wheel import timer_wheel
+from Modules.user_cache import user_cache
+
+if TYPE_CHECKING:
+    from Game.Werewolf.game import WerewolfGame
+    from Game.Werewolf.player import Player
+
+CHOOSE_EMBEDS = {
+    "Divination": ("占い", "占い対象を選んでください"),
+    "Guard": ("護衛", "護衛対象を選んでください"),
+    "Kill": ("キル投票", "襲撃対象を選んでください"),
+}
+
+
+class DiscordTransport(Transport):
+    """
+    ゲームの入出力をDiscordのメッセージとViewで行うクラス。
+    送信は宛先ごとのOutboundQueueを通し、続けて送るメッセージを1回の送信にまとめる。
+
+    Parameters
+    ----------
+    game_id : int
+        ゲームのID
+    """
+
+    def __init__(self, game_id: int) -> None:
+        self.game_id = game_id
+        self.logger = make_logger("DiscordTransport", game_id)
+        self._game: WerewolfGame | None = None
+
+        self.channel_outbox = OutboundQueue(self._send_channel, "channel")
+        self._dm_outboxes: dict[int, OutboundQueue] = {}
+
+    @property
+    def game(self) -> "WerewolfGame":
+        if self._game is None:
+            self._game = g.werewolf_games[self.game_id]
+        return self._game
+
+    async def prepare_players(self, players: list["Player"]) -> None:
+        game = self.game
+
+        # キャッシュにないユーザーはギルドメンバーとしてまとめて取得する
+        members = await user_cache.resolve(
+            game.client, [p.id for p in players], guild=game.channel.guild
+        )
+        for p in players:
+            await p.initialize(game.client, members.get(p.id))
+
+    async def _send_channel(self, **kwargs: Any) -> discord.Message:
+        start = time.perf_counter()
+        message = await self.game.channel.send(**kwargs)
+        send_latency.observe(time.perf_counter() - start, "channel")
+        return message
+
+    def outbox(self, player: "Player") -> OutboundQueue:
+        """
+        プレイヤーへのDMの送信キューを返す。
+        """
+
+        outbox = self._dm_outboxes.get(player.id)
+        if outbox is None:
+            outbox = self._dm_outboxes[player.id] = OutboundQueue(player.message, "dm")
+        return outbox
+
+    async def drain(self) -> None:
+        """
+        送信待ちのメッセージをすべて送信する。
+        """
+
+        await asyncio.gather(
+            self.channel_outbox.drain(),
+            *(outbox.drain() for outbox in self._dm_outboxes.values()),
+        )
+
+    # 全体への通知
+
+    def _render_announce(self, event: AnnounceEvent, **data: Any) -> dict[str, Any]:
+        game = self.game
+        t = game.translator
+
+        if event == "NightStart":
+            embed = embed_templates.get(t, "NightStart").render(
+                application_id=str(game.client.application_id)
+            )
+            return {"embed": embed}
+
+        if event == "DayStart":
+            embed = embed_templates.get(t, "DayStart").render(
+                "\n".join([f"<@!{player.id}>" for player in data["killed"]]) or "なし"
+            )
+            return {"embed": embed}
+
+        if event == "Bakery":
+            embed = embed_templates.get(t, "Bakery", data["message"]).render()
+            return {"embed": embed}
+
+        if event == "Executed":
+            return {"content": f"<@!{data['target'].id}> が処刑されました。"}
+
+        if event == "NoExecution":
+            return {"content": "誰も処刑されませんでした。"}
+
+        if event == "NotifyFailed":
+            return {
+                "content": "\n".join(f"<@!{p.id}>" for p in data["players"])
+                + "\nDMを送信できませんでした。DMの受信設定を確認してください。"
+            }
+
+        if event == "Resumed":
+            return {"content": "ボットが再起動したため、ゲームを再開します。"}
+
+        raise ValueError(f"Unknown announce event: {event}")
+
+    async def announce(self, event: AnnounceEvent, **data: Any) -> None:
+        if event == "Result":
+            self._send_result(**data)
+            return
+
+        self.channel_outbox.put(**self._render_announce(event, **data))
+
+    def _send_result(
+        self, win_team: str | None, winners: list["Player"], players: list["Player"]
+    ) -> None:
+        t = self.game.translator
+
+        embed = embed_templates.get(t, "Result", win_team or "").render(
+            "\n".join([f"<@!{player.id}>" for player in winners])
+        )
+        self.channel_outbox.put(embed=embed)
+
+        result_embed = embed_templates.get(t, "FinalResult").render(
+            "\n".join(
+                f"<@!{p.id}> {t.getstring(p.status)} - {t.getstring(p.role.name)}"
+                for p in players
+            )
+        )
+        self.channel_outbox.put(embed=result_embed)
+
+    # 個別の通知
+
+    def _render_notify(
+        self, player: "Player", event: NotifyEvent, **data: Any
+    ) -> dict[str, Any]:
+        game = self.game
+        t = game.translator
+
+        if event == "RoleAssigned":
+            return {
+                "content": f"あなたの役職は{t.getstring(player.role.name)}です",
+                "view": data["view"],
+            }
+
+        if event == "KillTarget":
+            return {"content": f"<@!{data['target'].id}>を襲撃します"}
+
+        if event == "ReturnToChannel":
+            return {"content": f"<#{game.channel.id}>に戻ってください"}
+
+        if event == "DivinationResult":
+            return {
+                "content": f"{data['target'].name}は{t.getstring(data['result'])}です。"
+            }
+
+        if event == "GuardResult":
+            return {"content": f"{data['target'].name}を守ります。"}
+
+        if event == "MediumResult":
+            return {
+                "content": f"{data['target'].name}は{t.getstring(data['result'])}でした。"
+            }
+
+        raise ValueError(f"Unknown notify event: {event}")
+
+    async def notify(self, player: "Player", event: NotifyEvent, **data: Any) -> None:
+        if event == "RoleAssigned":
+            data.setdefault("view", RoleInfoView(self.game_id))
+
+        self.outbox(player).put(**self._render_notify(player, event, **data))
+
+    async def notify_all(
+        self, players: list["Player"], event: NotifyEvent, **data: Any
+    ) -> list["Player"]:
+        if event == "RoleAssigned":
+            # 全員で1つのViewを共有する
+            data.setdefault("view", RoleInfoView(self.game_id))
+
+        result = await dispatcher.send_all(
+            players,
+            lambda p: self.outbox(p).send(**self._render_notify(p, event, **data)),
+        )
+        if result.failed:
+            self.logger.warning(
+                f"Failed to send {event} to {[p.id for p in result.failed_targets]}"
+            )
+        return result.failed_targets
+
+    # 選択・投票
+
+    async def _wait_view(
+        self, view: PlayerChoiceView, message: discord.Message, deadline: float | None
+    ) -> None:
+        """
+        Viewの操作が終わるか期限になるまで待つ。期限になった場合は選択肢を消す。
+        """
+
+        timer = timer_wheel.schedule(deadline, view.stop) if deadline else None
+        try:
+            await view.wait()
+        finally:
+            # ゲームが途中で止められた場合も、Viewをクライアントに残さない
+            view.stop()
+            if timer is not None:
+                timer.cancel()
+
+        if timer is not None and timer.fired:
+            self.logger.info(f"{view.process} timed out after {deadline}s")
+            try:
+                await message.edit(view=None)
+            except discord.HTTPException:
+                self.logger.warning("Failed to remove expired view", exc_info=True)
+
+    async def choose(
+        self,
+        player: "Player",
+        event: ChooseEvent,
+        choices: list["Player"],
+        allow_skip: bool = False,
+        deadline: float | None = None,
+    ) -> int | None:
+        title, description = CHOOSE_EMBEDS[event]
+        embed = discord.Embed(title=title, description=description)
+        view = PlayerChoiceView(
+            choices=choices,
+            process="Ability",
+            allow_skip=allow_skip,
+            game_id=self.game_id,
+        )
+
+        message = await self.outbox(player).send(embed=embed, view=view)
+        await self._wait_view(view, message, deadline)
+
+        # 期限までに選ばなかった場合は選択なしとして扱う
+        return view.votes.get(player.id)
+
+    async def vote(
+        self,
+        voters: list["Player"],
+        choices: list["Player"],
+        allow_skip: bool = True,
+        deadline: float | None = None,
+    ) -> VoteTally:
+        embed = discord.Embed(title="処刑投票", description="処刑対象を選んでください")
+        view = PlayerChoiceView(
+            choices=choices,
+            process="Execute",
+            allow_skip=allow_skip,
+            game_id=self.game_id,
+            voters=voters,
+        )
+        tally = view.tally
+        assert tally is not None
+
+        # チャンネルに投票用のメッセージとビューを送信
+        message = await self.channel_outbox.send(embed=embed, view=view)
+        await self._wait_view(view, message, deadline)
+
+        return tally
@@ -0,0 +1,226 @@
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any, Literal
+
+import discord
+
+from Game.Werewolf.role import Role
+from Modules.translator import Translator, translation_catalog
+
+EmbedKind = Literal["NightStart", "DayStart", "Bakery", "Result", "FinalResult"]
+
+
+class TemplateEmbed(discord.Embed):
+    """
+    テンプレートから作ったEmbed。
+    送信時のto_dict()では、変わらない部分は作っておいた辞書を使い、説明とフィールドだけを加える。
+    作成後に変更してよいのは説明とフィールドだけ。
+
+    Parameters
+    ----------
+    base : dict[str, Any]
+        変わらない部分(種類・タイトル・色)の辞書
+    fields : list[dict[str, Any]]
+        フィールドの辞書のリスト
+    """
+
+    __slots__ = ("_base",)
+
+    def __init__(
+        self,
+        base: dict[str, Any],
+        *,
+        title: str,
+        description: str | None,
+        color: int | discord.Color | None,
+        fields: list[dict[str, Any]],
+    ):
+        super().__init__(title=title, description=description, color=color)
+        self._base = base
+        self._fields = fields
+
+    def to_dict(self) -> Any:
+        data = dict(self._base)
+        if self.description:
+            data["description"] = self.description
+        if self._fields:
+            data["fields"] = self._fields
+        return data
+
+
+def _base_dict(title: str, color: int | discord.Color | None) -> dict[str, Any]:
+    base: dict[str, Any] = {"type": "rich", "title": title}
+    if color is not None:
+        base["color"] = color if isinstance(color, int) else color.value
+    return base
+
+
+@dataclass(frozen=True, slots=True)
+class EmbedTemplate:
+    """
+    Embedのうち、ゲームや場面によって変わらない部分。
+    翻訳済みの文字列を持ち、render()では変わる部分だけを埋める。
+
+    Parameters
+    ----------
+    title : str
+        タイトル
+    description : str | None
+        説明。{}を含む場合はrender()の引数で埋める。
+    color : int | None
+        色
+    fields : tuple[str, ...]
+        フィールドの名前。値はrender()で渡す。
+    """
+
+    title: str
+    description: str | None = None
+    color: int | None = None
+    fields: tuple[str, ...] = ()
+    _base: dict[str, Any] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "_base", _base_dict(self.title, self.color))
+
+    def render(self, *values: str, **description_args: str) -> TemplateEmbed:
+        """
+        Embedを作る。
+
+        Parameters
+        ----------
+        *values : str
+            フィールドの値。fieldsと同じ順番で渡す。
+        **description_args : str
+            説明に埋め込む値
+        """
+
+        description = self.description
+        if description_args and description is not None:
+            description = description.format(**description_args)
+
+        return TemplateEmbed(
+            self._base,
+            title=self.title,
+            description=description,
+            color=self.color,
+            fields=[
+                {"name": name, "value": value, "inline": False}
+                for name, value in zip(self.fields, values)
+            ],
+        )
+
+
+def _night_start(t: Translator, variant: str) -> EmbedTemplate:
+    return EmbedTemplate(
+        title="人狼ゲーム",
+        description="夜になりました。プレイヤーは<@!{application_id}>のDMに移動してください。",
+    )
+
+
+def _day_start(t: Translator, variant: str) -> EmbedTemplate:
+    return EmbedTemplate(
+        title="人狼ゲーム",
+        description="朝になりました。議論を行い、誰を追放するか決めてください。",
+        color=0xFFFACD,
+        fields=("本日の死亡者",),
+    )
+
+
+def _bakery(t: Translator, variant: str) -> EmbedTemplate:
+    # variantはパンの焼き上がりのメッセージのキー
+    return EmbedTemplate(
+        title="人狼ゲーム", description=t.getstring(variant), color=0xE59F5C
+    )
+
+
+def _result(t: Translator, variant: str) -> EmbedTemplate:
+    # variantは勝利した陣営
+    return EmbedTemplate(
+        title="人狼ゲーム",
+        description=f"{t.getstring(variant)}勝利",
+        color=0xFFD700,
+        fields=("勝者",),
+    )
+
+
+def _final_result(t: Translator, variant: str) -> EmbedTemplate:
+    return EmbedTemplate(title="人狼ゲーム", color=0xFFD700, fields=("最終結果",))
+
+
+_BUILDERS: dict[EmbedKind, Callable[[Translator, str], EmbedTemplate]] = {
+    "NightStart": _night_start,
+    "DayStart": _day_start,
+    "Bakery": _bakery,
+    "Result": _result,
+    "FinalResult": _final_result,
+}
+
+
+class EmbedTemplates:
+    """
+    言語と種類ごとにEmbedTemplateを1度だけ作って使い回すキャッシュ。
+    役職の説明のように変わる部分がないEmbedは、Embedそのものを共有する。
+    翻訳が再読み込みされたら作り直す。
+    """
+
+    def __init__(self) -> None:
+        self._templates: dict[tuple[str, EmbedKind, str], EmbedTemplate] = {}
+        self._role_info: dict[tuple[str, str], TemplateEmbed] = {}
+        self._version = translation_catalog.version
+
+    def __len__(self) -> int:
+        return len(self._templates) + len(self._role_info)
+
+    def _check_version(self) -> None:
+        if self._version != translation_catalog.version:
+            self.clear()
+            self._version = translation_catalog.version
+
+    def clear(self) -> None:
+        self._templates.clear()
+        self._role_info.clear()
+
+    def get(self, t: Translator, kind: EmbedKind, variant: str = "") -> EmbedTemplate:
+        """
+        テンプレートを取得する。
+
+        Parameters
+        ----------
+        t : Translator
+            ゲームの翻訳
+        kind : EmbedKind
+            Embedの種類
+        variant : str
+            同じ種類で内容が変わる場合のキー(勝利陣営など)
+        """
+
+        self._check_version()
+        key = (t.lang, kind, variant)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = _BUILDERS[kind](t, variant)
+        return template
+
+    def role_info(self, t: Translator, role: Role) -> TemplateEmbed:
+        """
+        役職の説明のEmbedを取得する。変わる部分がないため、同じものを返す。
+        """
+
+        self._check_version()
+        key = (t.lang, role.name)
+        embed = self._role_info.get(key)
+        if embed is None:
+            template = EmbedTemplate(
+                title=t.getstring(role.name),
+                color=discord.Color.green().value,
+                fields=("陣営", "勝利条件", "説明"),
+            )
+            embed = self._role_info[key] = template.render(
+                t.getstring(role.team),
+                t.getstring(role.win_condition),
+                t.getstring(role.description),
+            )
+        return embed
+
+
+embed_templates = EmbedTemplates()
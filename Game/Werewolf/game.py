@@ -1,12 +1,53 @@
+import asyncio
 import logging
+import os
+import time
+import weakref
 from dataclasses import dataclass, field
+from typing import Any, Final
 
 import discord
 
 import Modules.global_value as g
 from Game.Werewolf import main, player, role
+from Game.Werewolf.discord_transport import DiscordTransport
+from Game.Werewolf.roster import Roster
+from Game.Werewolf.transport import Transport
+from Modules.admission import admission
+from Modules.checkpoint import checkpoint_store
+from Modules.edit_coalescer import EditCoalescer
+from Modules.inbox import Inbox
+from Modules.sharding import coordinator_client
+from Modules.tracing import GameTrace
 from Modules.translator import Translator
 from Modules.Views.JoinView import JoinView
+from Modules.Views.TrackedView import TrackedView
+
+NIGHT_ABILITY_DEADLINE: Final = float(os.getenv("NIGHT_ABILITY_DEADLINE", "120"))
+KILL_VOTE_DEADLINE: Final = float(os.getenv("KILL_VOTE_DEADLINE", "120"))
+EXECUTE_VOTE_DEADLINE: Final = float(os.getenv("EXECUTE_VOTE_DEADLINE", "300"))
+
+
+@dataclass(frozen=True, slots=True)
+class PhaseDeadlines:
+    """
+    フェーズごとの選択・投票の期限(秒)。
+    期限までに選ばなかったプレイヤーはスキップとして扱い、
+    人狼が誰も襲撃先を選ばなかった場合はランダムに襲撃する。
+
+    Attributes
+    ----------
+    night_ability : float
+        占い・護衛などの夜の能力の期限
+    kill_vote : float
+        人狼の襲撃投票の期限
+    execute_vote : float
+        処刑投票の期限
+    """
+
+    night_ability: float = NIGHT_ABILITY_DEADLINE
+    kill_vote: float = KILL_VOTE_DEADLINE
+    execute_vote: float = EXECUTE_VOTE_DEADLINE
 
 
 @dataclass
@@ -22,40 +63,60 @@ class WerewolfGame:
         ホストのID
     limit : int
         参加人数の上限
-    message : discord.Message
-        募集メッセージ
-    channel : discord.TextChannel
-        募集メッセージのチャンネル
-    client : discord.Client
-        Discordクライアント
-    joinview : JoinView
-        募集用のボタン
+    message : discord.Message | None
+        募集メッセージ。Discordを使わない場合はNone。
+    channel : discord.TextChannel | None
+        募集メッセージのチャンネル。Discordを使わない場合はNone。
+    client : discord.Client | None
+        Discordクライアント。Discordを使わない場合はNone。
+    joinview : JoinView | None
+        募集用のボタン。Discordを使わない場合はNone。
     logger : logging.LoggerAdapter
         ロガー
     translator : Translator
         翻訳クラス
+    transport : Transport
+        ゲームの入出力を行うクラス。省略した場合はDiscordTransportを使う。
+    deadlines : PhaseDeadlines
+        フェーズごとの選択・投票の期限
+    start_position : int | None
+        開始待ちの順番。開始待ちでない場合はNone。
+    last_activity : float
+        最後に参加・退出・役職の変更やフェーズの進行があった時刻(time.monotonic)
+    task : asyncio.Task | None
+        ゲームを進行しているタスク
+    inbox : Inbox
+        参加・投票などのインタラクションによる状態の変更を、届いた順に1つずつ処理する受信箱
+    views : weakref.WeakSet[TrackedView]
+        このゲームが作ったView。ゲームの削除時にすべて取り除く。
+    trace : GameTrace
+        フェーズ・選択待ち・RESTの呼び出しのスパン。ゲームの削除時に書き出す。
     is_started : bool
         ゲームが開始されたかどうか
     participant_ids : set[int]
         参加者のIDのセット
     turns : int
         ターン数
+    roster : Roster
+        プレイヤーの一覧。生存者と陣営ごとの人数を持つ。
     players : list[player.Player]
-        プレイヤーのリスト
+        プレイヤーのリスト(rosterから取得する)
     alive_players : list[player.Player]
-        生存しているプレイヤーのリスト
+        生存しているプレイヤーのリスト(rosterから取得する)
     """
 
     # 以下ゲーム募集情報
     id: int
     host_id: int
     limit: int
-    message: discord.Message
-    channel: discord.TextChannel
-    client: discord.Client
-    joinview: JoinView
+    message: discord.Message | None
+    channel: discord.TextChannel | None
+    client: discord.Client | None
+    joinview: JoinView | None
     logger: logging.LoggerAdapter
     translator: Translator
+    transport: Transport = None  # type: ignore[assignment]
+    deadlines: PhaseDeadlines = field(default_factory=PhaseDeadlines)
 
     is_started: bool = False
     is_ended: bool = False
@@ -66,8 +127,7 @@ class WerewolfGame:
     turns: int = 0
     last_night_turn_time: float = 0.0
 
-    players: list[player.Player] = field(default_factory=list)
-    alive_players: list[player.Player] = field(default_factory=list)
+    roster: Roster = field(default_factory=Roster, repr=False)
     last_alive_players: list[player.Player] = field(default_factory=list)
     roles: dict[role.Role, int] = field(default_factory=dict)
     assigned_roles: list[role.Role] = field(default_factory=list)
@@ -76,32 +136,59 @@ class WerewolfGame:
     win_team: str | None = None
     winner: list[player.Player] = field(default_factory=list)
 
-    def refresh_alive_players(self):
-        """
-        生存しているプレイヤーを更新する。
-        """
+    recruiting_editor: EditCoalescer | None = field(default=None, repr=False)
+    start_position: int | None = None
+    _position_update: "asyncio.Future[None] | None" = field(
+        default=None, init=False, repr=False
+    )
 
-        self.alive_players = [p for p in self.players if p.is_alive]
+    last_activity: float = field(default_factory=time.monotonic)
+    task: asyncio.Task | None = field(default=None, repr=False)
+    inbox: Inbox = field(init=False, repr=False)
+    views: "weakref.WeakSet[TrackedView]" = field(
+        default_factory=weakref.WeakSet, repr=False
+    )
+    trace: GameTrace = field(init=False, repr=False)
 
-    async def update_recruiting_embed(
-        self, interaction: discord.Interaction | None = None, show_view: bool = True
-    ) -> None:
+    def __post_init__(self):
+        self.inbox = Inbox(f"game-{self.id}")
+        self.trace = GameTrace(self.id)
+        if self.joinview is not None:
+            self.track_view(self.joinview)
+        if self.transport is None:
+            self.transport = DiscordTransport(self.id)
+
+    @property
+    def guild_id(self) -> int | None:
+        return self.channel.guild.id if self.channel is not None else None
+
+    @property
+    def players(self) -> list[player.Player]:
+        return self.roster.players
+
+    @property
+    def alive_players(self) -> list[player.Player]:
+        return self.roster.alive_players
+
+    def _render_recruiting_embed(self, show_view: bool = True) -> dict:
         """
-        募集用のEmbedを更新する。
+        募集用のEmbedを生成し、message.editに渡す引数として返す。
 
         Parameters
         ----------
-        interaction : discord.Interaction | None
-            インタラクションオブジェクト
         show_view : bool
             募集用のボタンを表示するかどうか
         """
 
         t = self.translator
 
+        description = f"募集者:<@!{self.host_id}>"
+        if self.start_position is not None:
+            description += f"\n開始待ち:{self.start_position}番目"
+
         embed = discord.Embed(
             title=f"人狼ゲーム({len(self.participant_ids) + 1}/{self.limit}人)",
-            description=f"募集者:<@!{self.host_id}>",
+            description=description,
             color=discord.Color.green(),
         )
         embed.add_field(
@@ -123,33 +210,248 @@ class WerewolfGame:
             inline=False,
         )
 
-        view = self.joinview if show_view else None
+        return {"embed": embed, "view": self.joinview if show_view else None}
+
+    async def update_recruiting_embed(
+        self, interaction: discord.Interaction | None = None, show_view: bool = True
+    ) -> None:
+        """
+        募集用のEmbedを更新する。
+        インタラクションがない場合は短時間の更新をまとめ、メッセージを取得せずに1回だけ編集する。
+
+        Parameters
+        ----------
+        interaction : discord.Interaction | None
+            インタラクションオブジェクト
+        show_view : bool
+            募集用のボタンを表示するかどうか
+        """
+
+        if self.recruiting_editor is None:
+            self.recruiting_editor = EditCoalescer(
+                self.channel.get_partial_message(self.message.id)
+            )
 
         if interaction:
-            await interaction.response.edit_message(embed=embed, view=view)
+            # インタラクションへの応答で最新の状態を反映するので、待機中の編集は不要になる
+            kwargs = self._render_recruiting_embed(show_view)
+            self.recruiting_editor.cancel()
+            await interaction.response.edit_message(**kwargs)
+            self.recruiting_editor.mark_sent(**kwargs)
         else:
-            channel = self.client.get_channel(self.channel.id)
-            if isinstance(channel, discord.TextChannel):
-                message = await channel.fetch_message(self.message.id)
-                await message.edit(embed=embed, view=view)
-            else:
-                self.logger.warning(
-                    "channel is not a TextChannel. Cannot fetch message."
-                )
+            await self.recruiting_editor.request(
+                lambda: self._render_recruiting_embed(show_view)
+            )
+
+    def track_view(self, view: TrackedView) -> None:
+        """
+        ゲームが作ったViewを記録する。
+        止まったViewは他から参照されなくなると自然に外れるため、記録から消す必要はない。
+        """
+
+        self.views.add(view)
+
+    def release_views(self) -> None:
+        """
+        記録したViewをすべて止め、クライアントから取り除く。
+        """
+
+        for view in list(self.views):
+            view.release()
+        self.views.clear()
+
+    def touch(self) -> None:
+        """
+        最後の操作の時刻を更新する。放置されたゲームの判定に使う。
+        """
+
+        self.last_activity = time.monotonic()
 
     def delete(self):
         """
         ゲームを削除する。
         """
 
+        if self.recruiting_editor is not None:
+            self.recruiting_editor.cancel()
+
+        self.inbox.close()
+        self.release_views()
+        self.trace.export()
+        checkpoint_store.discard(self.id)
+        coordinator_client.release_game(self.id)
+        admission.release(self.id)
         del g.werewolf_games[self.id]
         self.logger.info(f"Game {self.id} deleted.")
 
+    def add_participant(self, user_id: int) -> None:
+        """
+        参加者を追加する。
+
+        Parameters
+        ----------
+        user_id : int
+            参加するユーザーのID
+        """
+
+        g.werewolf_games.add_participant(self, user_id)
+        self.touch()
+
+    def remove_participant(self, user_id: int) -> None:
+        """
+        参加者を取り除く。
+
+        Parameters
+        ----------
+        user_id : int
+            退出するユーザーのID
+        """
+
+        g.werewolf_games.remove_participant(self, user_id)
+        self.touch()
+
+    def mark_ended(self) -> None:
+        """
+        ゲームを終了状態にする。
+        """
+
+        self.is_ended = True
+        g.werewolf_games.update_state(self)
+        # 放置されたゲームの削除で、終了してからの時間を測るのに使う
+        self.touch()
+
+    def mark_started(self) -> None:
+        """
+        ゲームを開始済みにする。以降は参加・退出・役職の変更を受け付けない。
+        """
+
+        self.is_started = True
+        g.werewolf_games.update_state(self)
+        self.touch()
+
+    def _show_start_position(self, position: int | None) -> None:
+        self.start_position = position
+        # 開始待ちの間も募集者が中止できるよう、中止のボタンだけを押せるようにする
+        queued = position is not None and self.joinview is not None
+        if queued:
+            self.joinview.show_queued()
+        # 順番が続けて変わっても、編集はまとめて1回にする
+        if self.recruiting_editor is not None:
+            self._position_update = self.recruiting_editor.request(
+                lambda: self._render_recruiting_embed(show_view=queued)
+            )
+            self._position_update.add_done_callback(self._on_position_updated)
+
+    def _on_position_updated(self, future: "asyncio.Future[None]") -> None:
+        if self._position_update is future:
+            self._position_update = None
+        if not future.cancelled() and future.exception() is not None:
+            self.logger.warning(
+                "Failed to show the start position", exc_info=future.exception()
+            )
+
+    async def wait_for_admission(self) -> bool:
+        """
+        ゲームを開始してよくなるまで待つ。待っている間は募集メッセージに開始待ちの順番と中止のボタンを表示する。
+
+        Returns
+        -------
+        bool
+            開始してよい場合はTrue。待っている間にゲームが削除された場合はFalse。
+        """
+
+        with self.trace.span("admission", turn=self.turns):
+            admitted = await admission.acquire(
+                self.id,
+                self.guild_id,
+                len(self.participant_ids) + 1,
+                on_position=self._show_start_position,
+            )
+        if not admitted:
+            # 待っている間に中止されたゲームは、中止の表示を書き換えない
+            self.start_position = None
+        elif self.start_position is not None:
+            self._show_start_position(None)
+        return admitted
+
     async def start(self):
         """
         ゲームを開始する。
         """
 
-        self.is_started = True
-        await main.main(self.id)
+        if not self.is_started:
+            self.mark_started()
+        self.task = asyncio.current_task()
+        with self.trace.span(
+            "game", turn=self.turns, players=len(self.participant_ids) + 1
+        ):
+            await main.main(self.id)
         self.logger.info(f"Game {self.id} started.")
+
+    async def resume(self, phase: main.Phase):
+        """
+        チェックポイントから復元したゲームを、保存したフェーズの始めから再開する。
+
+        Parameters
+        ----------
+        phase : Phase
+            再開するフェーズ
+        """
+
+        self.logger.info(f"Game {self.id} resumed at {phase} (turn {self.turns}).")
+        admission.admit_resumed(self.id, self.guild_id)
+        self.task = asyncio.current_task()
+        self.touch()
+        with self.trace.span("game", turn=self.turns, resumed_at=phase):
+            await self.transport.announce("Resumed")
+            await main.main(self.id, phase)
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        ゲームの進行状況をJSONに変換できる辞書にする。
+        Discordのオブジェクトは持たず、再開時にIDから取得し直す。
+        """
+
+        return {
+            "host_id": self.host_id,
+            "limit": self.limit,
+            "channel_id": self.channel.id if self.channel is not None else None,
+            "guild_id": self.guild_id,
+            "lang": self.translator.lang,
+            "participant_ids": list(self.participant_ids),
+            "turns": self.turns,
+            "last_night_turn_time": self.last_night_turn_time,
+            "roles": {r.name: count for r, count in self.roles.items()},
+            "players": [
+                {
+                    "id": p.id,
+                    "name": p.name,
+                    "role": p.role.name if p.role is not None else None,
+                    "status": p.status,
+                    "is_alive": p.is_alive,
+                    "is_kill_protected": p.is_kill_protected,
+                }
+                for p in self.players
+            ],
+            "last_alive_ids": [p.id for p in self.last_alive_players],
+            "last_executed_id": (
+                self.last_executed_player.id
+                if self.last_executed_player is not None
+                else None
+            ),
+        }
+
+    def checkpoint(self, phase: main.Phase) -> None:
+        """
+        次に始まるフェーズとともにスナップショットの保存を予約する。
+        書き込みはまとめて後から行われる。
+
+        Parameters
+        ----------
+        phase : Phase
+            次に始まるフェーズ
+        """
+
+        # 保存が無効なときはスナップショットも作らない
+        if checkpoint_store.is_open:
+            checkpoint_store.save(self.id, phase, self.snapshot())
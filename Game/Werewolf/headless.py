@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any
+
+import Modules.global_value as g
+from Game.Werewolf.game import WerewolfGame
+from Game.Werewolf.role import Role
+from Game.Werewolf.tally import VoteTally
+from Game.Werewolf.transport import (
+    AnnounceEvent,
+    ChooseEvent,
+    NotifyEvent,
+    Transport,
+)
+from Modules.logger import make_logger
+from Modules.translator import Translator
+
+if TYPE_CHECKING:
+    from Game.Werewolf.player import Player
+
+_game_ids = itertools.count(1)
+
+
+class Agent:
+    """
+    Discordを使わずにプレイヤーの選択を決める基底クラス。
+    """
+
+    def choose(
+        self,
+        player: "Player",
+        event: ChooseEvent,
+        choices: list["Player"],
+        allow_skip: bool,
+    ) -> int | None:
+        """
+        能力の対象や襲撃先を選ぶ。
+        """
+
+        raise NotImplementedError
+
+    def vote(
+        self, voter: "Player", choices: list["Player"], allow_skip: bool
+    ) -> int | None:
+        """
+        処刑投票の投票先を選ぶ。
+        """
+
+        raise NotImplementedError
+
+
+class RandomAgent(Agent):
+    """
+    選択肢からランダムに選ぶエージェント。
+
+    Parameters
+    ----------
+    rng : random.Random | None
+        乱数生成器
+    skip_rate : float
+        スキップが許可されているときにスキップする確率
+    """
+
+    def __init__(self, rng: random.Random | None = None, skip_rate: float = 0.1):
+        self.rng = rng or random.Random()
+        self.skip_rate = skip_rate
+
+    def _pick(
+        self, player: "Player", choices: list["Player"], allow_skip: bool
+    ) -> int | None:
+        if allow_skip and self.rng.random() < self.skip_rate:
+            return None
+
+        # 自分以外を優先して選ぶ
+        candidates = [c for c in choices if c.id != player.id] or choices
+        if not candidates:
+            return None
+        return self.rng.choice(candidates).id
+
+    def choose(self, player, event, choices, allow_skip):
+        return self._pick(player, choices, allow_skip)
+
+    def vote(self, voter, choices, allow_skip):
+        return self._pick(voter, choices, allow_skip)
+
+
+class ScriptedAgent(Agent):
+    """
+    あらかじめ決めた順に選択を返すエージェント。
+    台本が尽きたプレイヤーは、代わりのエージェントに任せる。
+
+    Parameters
+    ----------
+    script : dict[int, list[int | None]]
+        プレイヤーIDごとの選択の列
+    fallback : Agent | None
+        台本がない場合に使うエージェント
+    """
+
+    def __init__(
+        self, script: dict[int, list[int | None]], fallback: Agent | None = None
+    ):
+        self.script = {player_id: list(moves) for player_id, moves in script.items()}
+        self.fallback = fallback or RandomAgent()
+
+    def _next(self, player: "Player") -> tuple[bool, int | None]:
+        moves = self.script.get(player.id)
+        if moves:
+            return True, moves.pop(0)
+        return False, None
+
+    def choose(self, player, event, choices, allow_skip):
+        found, move = self._next(player)
+        if found:
+            return move
+        return self.fallback.choose(player, event, choices, allow_skip)
+
+    def vote(self, voter, choices, allow_skip):
+        found, move = self._next(voter)
+        if found:
+            return move
+        return self.fallback.vote(voter, choices, allow_skip)
+
+
+class HeadlessTransport(Transport):
+    """
+    ゲームの入出力をエージェントで行うクラス。通知は記録するか捨てる。
+
+    Parameters
+    ----------
+    agent : Agent
+        プレイヤーの選択を決めるエージェント
+    record : bool
+        通知をeventsに記録するかどうか
+    """
+
+    def __init__(self, agent: Agent, record: bool = False) -> None:
+        self.agent = agent
+        self.record = record
+        self.events: list[tuple[str, Any, dict[str, Any]]] = []
+
+    async def prepare_players(self, players: list["Player"]) -> None:
+        for p in players:
+            p.name = f"Player{p.id}"
+
+    async def announce(self, event: AnnounceEvent, **data: Any) -> None:
+        if self.record:
+            self.events.append((event, None, data))
+
+    async def notify(self, player: "Player", event: NotifyEvent, **data: Any) -> None:
+        if self.record:
+            self.events.append((event, player.id, data))
+
+    async def notify_all(
+        self, players: list["Player"], event: NotifyEvent, **data: Any
+    ) -> list["Player"]:
+        if self.record:
+            for p in players:
+                self.events.append((event, p.id, data))
+        return []
+
+    async def choose(
+        self,
+        player: "Player",
+        event: ChooseEvent,
+        choices: list["Player"],
+        allow_skip: bool = False,
+        deadline: float | None = None,
+    ) -> int | None:
+        return self.agent.choose(player, event, choices, allow_skip)
+
+    async def vote(
+        self,
+        voters: list["Player"],
+        choices: list["Player"],
+        allow_skip: bool = True,
+        deadline: float | None = None,
+    ) -> VoteTally:
+        tally = VoteTally(v.id for v in voters)
+        for v in voters:
+            if tally.is_decided:
+                break
+            tally.cast(v.id, self.agent.vote(v, choices, allow_skip))
+        return tally
+
+
+async def play_game(
+    roles: dict[Role, int],
+    players: int,
+    agent: Agent | None = None,
+    record: bool = False,
+) -> WerewolfGame:
+    """
+    Discordを使わずにゲームを1回最後まで行う。
+    本番と同じマネージャーと役職の処理を使う。
+
+    Parameters
+    ----------
+    roles : dict[Role, int]
+        役職と人数の対応。足りない分は村人になる。
+    players : int
+        プレイヤー数
+    agent : Agent | None
+        プレイヤーの選択を決めるエージェント。Noneの場合はRandomAgent。
+    record : bool
+        通知を記録するかどうか
+
+    Returns
+    -------
+    WerewolfGame
+        終了したゲーム
+    """
+
+    game_id = next(_game_ids)
+    game = WerewolfGame(
+        id=game_id,
+        host_id=1,
+        limit=players,
+        message=None,
+        channel=None,
+        client=None,
+        joinview=None,
+        logger=make_logger("Game", game_id),
+        translator=Translator("ja"),
+        transport=HeadlessTransport(agent or RandomAgent(), record=record),
+        roles=dict(roles),
+        participant_ids=set(range(2, players + 1)),
+    )
+    g.werewolf_games.add(game)
+
+    try:
+        await game.start()
+    finally:
+        # 途中で例外が起きてもレジストリに残さない
+        if game.id in g.werewolf_games:
+            game.delete()
+
+    return game
+
+
+def simulate(
+    roles: dict[Role, int],
+    players: int,
+    games: int,
+    seed: int | None = None,
+) -> Counter[str]:
+    """
+    同じ構成でゲームを繰り返し、勝利陣営ごとの回数を数える。
+
+    Parameters
+    ----------
+    roles : dict[Role, int]
+        役職と人数の対応
+    players : int
+        プレイヤー数
+    games : int
+        ゲームの回数
+    seed : int | None
+        乱数のシード
+
+    Returns
+    -------
+    Counter[str]
+        勝利陣営ごとの回数
+    """
+
+    # 役職の割り当てなどはrandomモジュールを直接使うため、モジュールごとシードする
+    random.seed(seed)
+    agent = RandomAgent(random.Random(seed))
+
+    async def run() -> Counter[str]:
+        wins: Counter[str] = Counter()
+        for _ in range(games):
+            game = await play_game(roles, players, agent)
+            wins[game.win_team or ""] += 1
+        return wins
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    from Game.Werewolf.Roles.Villager import Seer
+    from Game.Werewolf.Roles.Werewolf import Werewolf
+
+    parser = argparse.ArgumentParser(description="人狼ゲームのシミュレーション")
+    parser.add_argument("--players", type=int, default=9)
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    start = time.perf_counter()
+    wins = simulate(
+        {Werewolf.Werewolf.shared(): 2, Seer.Seer.shared(): 1},
+        args.players,
+        args.games,
+        args.seed,
+    )
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.games} games in {elapsed:.2f}s ({args.games / elapsed:.0f} games/s)")
+    for team, count in wins.most_common():
+        print(f"{team}: {count / args.games:.1%}")
@@ -1,22 +1,46 @@
+from typing import Literal
+
 from Game.Werewolf import manager
 
+# チェックポイントから再開するときの区切り
+Phase = Literal["night", "day"]
+
+
+async def main(id: int, phase: Phase | None = None):
+    """
+    ゲームを進行する。
+
+    Parameters
+    ----------
+    id : int
+        ゲームのID
+    phase : Phase | None
+        再開するフェーズ。Noneの場合はゲーム開始から行う。
+    """
 
-async def main(id: int):
     werewolf_manager = manager.WerewolfManager(id)
     game = werewolf_manager.game
-    await werewolf_manager.game_start()
+
+    if phase is None:
+        await werewolf_manager.game_start()
+        phase = "night"
+        werewolf_manager.checkpoint(phase)
 
     while True:
-        await werewolf_manager.night()
+        if phase == "night":
+            await werewolf_manager.night()
+            phase = "day"
+        else:
+            await werewolf_manager.day()
+            phase = "night"
 
         await werewolf_manager.win_check()
         if game is not None and game.is_ended:
             break
 
-        await werewolf_manager.day()
-
-        await werewolf_manager.win_check()
-        if game is not None and game.is_ended:
-            break
+        # 各フェーズの区切りで、次のフェーズから再開できるように保存する
+        werewolf_manager.checkpoint(phase)
+        if game is not None:
+            game.touch()
 
     await werewolf_manager.execute_game_end()
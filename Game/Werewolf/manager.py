@@ -2,14 +2,20 @@ import asyncio
 import random
 import time
 from collections import Counter
-
-import discord
+from typing import TYPE_CHECKING
 
 import Modules.global_value as g
 from Game.Werewolf import player
+from Game.Werewolf.role import NIGHT_RESOLUTION_ORDER, NightAction
 from Game.Werewolf.Roles.Villager import Villager
-from Game.Werewolf.view import PlayerChoiceView, RoleInfoView
 from Modules.logger import make_logger
+from Modules.metrics import phase_duration
+from Modules.tracing import span
+
+if TYPE_CHECKING:
+    from Game.Werewolf.main import Phase
+
+_RESOLUTION_RANK = {kind: i for i, kind in enumerate(NIGHT_RESOLUTION_ORDER)}
 
 
 class WerewolfManager:
@@ -28,7 +34,6 @@ class WerewolfManager:
         self.id = id
         self.game = g.werewolf_games.get(id)
         if self.game is not None:
-            self.client = self.game.client
             self.logger = make_logger("WerewolfManager", id)
             self.t = self.game.translator
 
@@ -39,14 +44,12 @@ class WerewolfManager:
         if self.game is not None:
             players_ids = [self.game.host_id] + list(self.game.participant_ids)
 
-            # 各プレイヤーのインスタンスを生成して初期化後、ゲーム内プレイヤーリストに追加する
-            for id in players_ids:
-                p = player.Player(id, self.id)
-                await p.initialize()
-                self.game.players.append(p)
+            # 各プレイヤーのインスタンスを生成して初期化後、ゲーム内プレイヤー一覧に追加する
+            players = [player.Player(id, self.id) for id in players_ids]
+            await self.game.transport.prepare_players(players)
+            for p in players:
+                self.game.roster.add(p)
 
-            # 現在生存しているプレイヤーのリストを更新
-            self.game.refresh_alive_players()
             self.game.last_alive_players = self.game.players
 
     def _assign_roles(self) -> None:
@@ -63,7 +66,7 @@ class WerewolfManager:
 
             # プレイヤー数に足りなければ、村人役を追加する
             while len(self.game.assigned_roles) < len(self.game.players):
-                self.game.assigned_roles.append(Villager.Villager())
+                self.game.assigned_roles.append(Villager.Villager.shared())
 
             # 役職リストをシャッフルしてランダムな割り当てにする
             random.shuffle(self.game.assigned_roles)
@@ -75,24 +78,22 @@ class WerewolfManager:
                 ]
 
             # 各プレイヤーに役職を順次割り当て、ログにも記録する
-            for i, r in enumerate(self.game.assigned_roles):
-                self.game.players[i].assign_role(r)
-                self.logger.info(
-                    f"{self.game.players[i].id} has been assigned {r.name}"
-                )
+            for p, r in zip(self.game.players, self.game.assigned_roles):
+                p.assign_role(r)
+                self.logger.info(f"{p.id} has been assigned {r.name}")
 
     async def _notify_roles(self) -> None:
         """
         各プレイヤーに自分の役職情報を通知する。
-        通知にはRoleInfoViewを利用してインタラクティブなメッセージを送信する。
         """
         if self.game is not None:
-            role_info_view = RoleInfoView(self.game.players, self.id)
-            for p in self.game.players:
-                await p.message(
-                    f"あなたの役職は{self.t.getstring(p.role.name)}です",
-                    view=role_info_view,
-                )
+            failed = await self.game.transport.notify_all(
+                self.game.players, "RoleAssigned"
+            )
+
+            # 通知できなかったプレイヤーには全体で知らせる
+            if failed:
+                await self.game.transport.announce("NotifyFailed", players=failed)
 
     async def game_start(self) -> None:
         """
@@ -100,23 +101,32 @@ class WerewolfManager:
         プレイヤーのインスタンス生成、役職の割り当て、通知を行う。
         """
         self.logger.info("Game has started.")
-        await self._create_player_instances()
-        self._assign_roles()
-        await self._notify_roles()
+        with span("game_start"):
+            await self._create_player_instances()
+            self._assign_roles()
+            await self._notify_roles()
+
+    def _phase_span(self, name: str):
+        """
+        フェーズのスパンを記録する。開始時点のターン数を付ける。
+        """
+        return span(name, turn=self.game.turns if self.game is not None else None)
 
     async def night(self) -> None:
         """
         夜のフェーズを開始する。
         NightManagerクラスのmain関数を呼び出す。
         """
-        await NightManager(self.id).main()
+        with self._phase_span("night"):
+            await NightManager(self.id).main()
 
     async def day(self) -> None:
         """
         昼のフェーズを開始する。
         DayManagerクラスのmain関数を呼び出す。
         """
-        await DayManager(self.id).main()
+        with self._phase_span("day"):
+            await DayManager(self.id).main()
 
     async def win_check(self) -> None:
         """
@@ -129,7 +139,15 @@ class WerewolfManager:
         """
         ゲーム終了時の処理。
         """
-        await EndManager(self.id).execute_game_end()
+        with self._phase_span("game_end"):
+            await EndManager(self.id).execute_game_end()
+
+    def checkpoint(self, phase: "Phase") -> None:
+        """
+        フェーズの区切りでゲームの状態を保存する。
+        """
+        if self.game is not None:
+            self.game.checkpoint(phase)
 
 
 class NightManager:
@@ -155,21 +173,20 @@ class NightManager:
     async def main(self) -> None:
         """
         夜の処理のメインルーチン。
-        夜の開始通知、各プレイヤーの夜のアクション実行、襲撃処理、夜の終了通知を順次実施する。
+        夜の開始通知の後、各プレイヤーの夜のアクションと襲撃先の投票を同時に受け付け、
+        集まった行動を決まった順番で適用してから夜の終了を通知する。
         """
         # 夜時間の測定
         start = time.monotonic()
 
         await self._announce_night_start()
-        await self.night_ability_time()
-        await self.kill_time()
+        actions = await self.collect_night_actions()
+        await self.resolve_night_actions(actions)
 
         if self.game is not None:
-            # 襲撃処理後、現在の生存プレイヤーリストを更新
-            self.game.refresh_alive_players()
-
             end = time.monotonic()
             self.game.last_night_turn_time = end - start
+            phase_duration.observe(self.game.last_night_turn_time, "night")
 
             # ターン数をインクリメントし、夜終了の通知を送信
             self.game.turns += 1
@@ -178,97 +195,131 @@ class NightManager:
     async def _announce_night_start(self) -> None:
         """
         夜の開始を全体に通知する。
-        チャンネルに埋め込みメッセージを送信する。
         """
         if self.game is not None:
-            embed = discord.Embed(
-                title="人狼ゲーム",
-                description=f"夜になりました。プレイヤーは<@!{self.game.client.application_id}>のDMに移動してください。",
-            )
-            await self.game.channel.send(embed=embed)
+            await self.game.transport.announce("NightStart")
 
     async def _announce_night_end(self) -> None:
         """
         夜の終了後、プレイヤーにチャンネルに戻るよう促す通知を送る。
         """
         if self.game is not None:
-            for p in self.game.last_alive_players:
-                await p.message(f"<#{self.game.channel.id}>に戻ってください")
+            await self.game.transport.notify_all(
+                self.game.last_alive_players, "ReturnToChannel"
+            )
 
     async def _announce_kill(self, target_player) -> None:
         """
         襲撃対象のプレイヤーが決定した際に、人狼側に通知する。
         """
-        for p in self.alive_werewolf_players:
-            await p.message(f"<@!{target_player.id}>を襲撃します")
+        if self.game is not None:
+            await self.game.transport.notify_all(
+                self.alive_werewolf_players, "KillTarget", target=target_player
+            )
 
-    async def night_ability_time(self) -> None:
+    async def collect_night_actions(self) -> list[NightAction]:
         """
-        夜間の各プレイヤーの特殊能力（役職固有のアクション）を実行する。
+        夜間の各プレイヤーの特殊能力（役職固有のアクション）と人狼の襲撃先の投票を同時に受け付ける。
+        人狼は他の役職の選択を待たずに襲撃先を選べる。
+
+        Returns
+        -------
+        list[NightAction]
+            選ばれた行動のリスト。参加順に並ぶ。
         """
-        if self.game is not None:
-            tasks = [
-                p.role.night_ability(game_id=self.id, player=p)
-                for p in self.game.alive_players
-            ]
-            await asyncio.gather(*tasks)
+        if self.game is None:
+            return []
+
+        # 夜行動を持たない役職のコルーチンは作らない
+        abilities = [
+            self._night_ability(p)
+            for p in self.game.alive_players
+            if p.role.has_night_ability
+        ]
+        with span("collect_night_actions"):
+            results = await asyncio.gather(*abilities, self.kill_time())
+        return [action for action in results if action is not None]
+
+    async def _night_ability(self, p: player.Player) -> NightAction | None:
+        # 選択待ちはプレイヤーごとの行に並べる
+        with span(f"ability:{p.role.name}", lane=f"player {p.id}", player=str(p.id)):
+            return await p.role.night_ability(game_id=self.id, player=p)
+
+    async def resolve_night_actions(self, actions: list[NightAction]) -> None:
+        """
+        集めた行動をNIGHT_RESOLUTION_ORDERの順に適用する。
+        護衛は襲撃より先に、占いの結果と呪殺は襲撃の後に適用される。
+        同じ種類の行動は参加順に適用する。
 
-    async def kill_time(self) -> None:
+        Parameters
+        ----------
+        actions : list[NightAction]
+            夜に選ばれた行動
         """
-        人狼の襲撃処理を行う。
-        前ターン以降の場合のみ、投票に基づいた襲撃対象を決定し、対象プレイヤーを襲撃する。
+        with span("resolve_night_actions", actions=len(actions)):
+            for action in sorted(actions, key=lambda a: _RESOLUTION_RANK[a.kind]):
+                if action.kind == "Kill":
+                    await self._resolve_kill(action)
+                elif action.actor is not None:
+                    await action.actor.role.resolve_night_action(self.id, action)
+
+    async def kill_time(self) -> NightAction | None:
         """
-        if self.game is not None:
-            if self.game.turns != 0:
-                results = await self.kill_votes()
-                target_id = self._decide_kill_target(results)
+        人狼の襲撃先を決める。
+        前ターン以降の場合のみ、投票に基づいた襲撃対象を決定する。襲撃はresolve_night_actionsで適用する。
+        """
+        if self.game is None or self.game.turns == 0:
+            return None
 
-                if target_id is None:
-                    self.logger.info("No valid kill target was decided. Skipping kill.")
-                    return
+        results = await self.kill_votes()
+        target_id = self._decide_kill_target(results)
 
-                target_player = next(
-                    p for p in self.game.last_alive_players if p.id == target_id
-                )
-                await self._announce_kill(target_player)
-                target_player.kill()
-                self.logger.info(
-                    f"Werewolfs {target_player.id} tried to kill a target."
-                )
+        if target_id is None:
+            self.logger.info("No valid kill target was decided. Skipping kill.")
+            return None
 
-    def _decide_kill_target(self, results: list[int | None]) -> int | None:
-        counter = Counter(results)
-        max_count = max(counter.values(), default=0)
-        modes = [key for key, count in counter.items() if count == max_count]
+        return NightAction("Kill", None, self.game.roster.get(target_id))
 
-        if not modes:
-            self.logger.warning("Kill target is not found.")
+    async def _resolve_kill(self, action: NightAction) -> None:
+        """
+        襲撃対象を人狼側に通知し、襲撃する。護衛されていれば襲撃は防がれる。
+        """
+        await self._announce_kill(action.target)
+        action.target.kill()
+        self.logger.info(f"Werewolfs {action.target.id} tried to kill a target.")
 
+    def _decide_kill_target(self, results: list[int | None]) -> int | None:
+        counter = Counter(r for r in results if r is not None)
+
+        if not counter:
+            # 誰も期限までに選ばなかった場合は、既定の行動としてランダムに襲撃する
+            if not self.alive_not_werewolf_players:
+                self.logger.warning("Kill target is not found.")
+                return None
+            self.logger.info("No kill votes before the deadline. Choosing at random.")
+            return random.choice(self.alive_not_werewolf_players).id
+
+        max_count = max(counter.values())
+        modes = [key for key, count in counter.items() if count == max_count]
         return random.choice(modes)
 
     async def kill_votes(self) -> list[int | None]:
         """
         人狼側プレイヤーからの襲撃対象投票を実施する。
-        各プレイヤーに対してDMで投票を促し、その結果をリストとして返す。
+        各プレイヤーに投票を促し、その結果をリストとして返す。
         """
 
         async def wait_for_vote(player: player.Player) -> int | None:
-            embed = discord.Embed(
-                title="キル投票", description="襲撃対象を選んでください"
-            )
-            view = PlayerChoiceView(
-                choices=self.alive_not_werewolf_players,
-                process="Ability",
-                allow_skip=False,
-                game_id=self.id,
-            )
-
-            # プレイヤーへメッセージと投票用ビューを送信
-            await player.message(embed=embed, view=view)
-            await view.wait()
-
-            # 投票結果を取得（今回は単一票を前提とする）
-            return list(view.votes.values())[0]
+            if self.game is None:
+                return None
+
+            with span("kill_vote", lane=f"player {player.id}", player=str(player.id)):
+                return await self.game.transport.choose(
+                    player,
+                    "Kill",
+                    choices=self.alive_not_werewolf_players,
+                    deadline=self.game.deadlines.kill_vote,
+                )
 
         # 現在生存している人狼プレイヤーと、人狼でないプレイヤーをリストアップする
         if self.game is not None:
@@ -314,10 +365,10 @@ class DayManager:
         昼の処理のメインルーチン。
         前夜に死亡したプレイヤーの通知、処刑投票、保護状態のリセットを行う。
         """
+        start = time.monotonic()
+
         self.today_killed_players = [
-            player
-            for player in self.game.last_alive_players
-            if player not in self.game.alive_players
+            player for player in self.game.last_alive_players if not player.is_alive
         ]
 
         await self._announce_day_start()
@@ -326,6 +377,8 @@ class DayManager:
         await self.execute_vote()
         self.reset_protected()
 
+        phase_duration.observe(time.monotonic() - start, "day")
+
     def reset_protected(self) -> None:
         """
         各プレイヤーの「殺害保護」状態をリセットする。
@@ -338,23 +391,12 @@ class DayManager:
     async def _announce_day_start(self) -> None:
         """
         昼の開始を全体に通知する。
-        埋め込みメッセージで、前夜の死亡者を一覧表示する。
-        """
-        embed = discord.Embed(
-            title="人狼ゲーム",
-            description="朝になりました。議論を行い、誰を追放するか決めてください。",
-            color=0xFFFACD,
-        )
-        embed.add_field(
-            name="本日の死亡者",
-            value="\n".join(
-                [f"<@!{player.id}>" for player in self.today_killed_players]
-            )
-            or "なし",
-            inline=False,
-        )
+        前夜の死亡者を一覧表示する。
+        """
         if self.game is not None:
-            await self.game.channel.send(embed=embed)
+            await self.game.transport.announce(
+                "DayStart", killed=self.today_killed_players
+            )
 
     async def _announce_bakery(self) -> None:
         """
@@ -362,94 +404,48 @@ class DayManager:
         秒数によってメッセージが変化する
         """
         if self.game is not None:
-            if any(p for p in self.game.alive_players if p.role.name == "Bakery"):
+            if self.game.roster.has_alive_role("Bakery"):
                 time = self.game.last_night_turn_time
                 self.logger.info(f"Last night was {time} seconds")
 
                 if time < 40:
-                    message_text = self.t.getstring("BakeryEarlyMessage")
+                    message = "BakeryEarlyMessage"
                 elif time < 180:
-                    message_text = self.t.getstring("BakeryNormalMessage")
+                    message = "BakeryNormalMessage"
                 else:
-                    message_text = self.t.getstring("BakeryLateMessage")
-
-                embed = discord.Embed(
-                    title="人狼ゲーム",
-                    description=message_text,
-                    color=0xE59F5C,
-                )
-                await self.game.channel.send(embed=embed)
-
-    def _decide_execute_target(self, results: list[int | None]) -> int | None:
-        """
-        処刑投票の結果から、実際に処刑する対象を決定する。
-        過半数がスキップした場合は処刑を行わない。
-        また、最も票を得たプレイヤーが複数いた場合も処刑しない。
-
-        Parameters
-        ----------
-        results: list[int]
-            投票結果のリスト。各プレイヤーのIDが格納されている。
-        Returns
-        -------
-        int | None
-            処刑対象のプレイヤーID。決定しなかった場合はNone。
-        """
-        counter = Counter(results)
-
-        if not counter:
-            execute_target = None
-        elif counter.get(None, 0) * 2 >= len(results):
-            execute_target = None
-        else:
-            most_common = counter.most_common()
-            max_count = most_common[0][1]
-            result_candidates = [k for k, v in most_common if v == max_count]
-            execute_target = (
-                result_candidates[0] if len(result_candidates) == 1 else None
-            )
+                    message = "BakeryLateMessage"
 
-        return execute_target
+                await self.game.transport.announce("Bakery", message=message)
 
     async def execute_vote(self) -> None:
         """
         処刑投票を実施し、その結果に基づいて対象プレイヤーを処刑する。
-        対象が決定しなかった場合は処刑をスキップする。
+        過半数がスキップした場合や、最多票が複数いた場合は処刑をスキップする。
+        結果が確定した時点で投票は締め切られる。
         """
         if self.game is not None:
-            embed = discord.Embed(
-                title="処刑投票", description="処刑対象を選んでください"
-            )
-            view = PlayerChoiceView(
-                choices=self.game.alive_players,
-                process="Execute",
-                allow_skip=True,
-                game_id=self.id,
+            with span("execute_vote", voters=len(self.game.alive_players)):
+                tally = await self.game.transport.vote(
+                    voters=self.game.alive_players,
+                    choices=self.game.alive_players,
+                    allow_skip=True,
+                    deadline=self.game.deadlines.execute_vote,
+                )
+            execute_id = tally.result()
+            self.logger.info(
+                f"Vote closed with {len(tally.votes)}/{tally.total} votes: {tally.snapshot()}"
             )
 
-            # チャンネルに投票用のメッセージとビューを送信
-            await self.game.channel.send(embed=embed, view=view)
-            await view.wait()
-
-            filtered_votes = [v for v in view.votes.values()]
-            execute_id = self._decide_execute_target(filtered_votes)
-
             if execute_id is None:
-                await self.game.channel.send("誰も処刑されませんでした。")
+                await self.game.transport.announce("NoExecution")
                 self.logger.info("Nobody was executed.")
             else:
                 # 該当するプレイヤーを検索して処刑処理を実行
-                target_player = [
-                    p for p in self.game.alive_players if p.id == execute_id
-                ][0]
-                await self.game.channel.send(
-                    f"<@!{target_player.id}> が処刑されました。"
-                )
+                target_player = self.game.roster.get(execute_id)
+                await self.game.transport.announce("Executed", target=target_player)
 
                 await target_player.execute()
                 self.game.last_executed_player = target_player
-
-                self.game.refresh_alive_players()
                 self.logger.info(f"{target_player.id} was executed.")
 
             # 前回の生存プレイヤーリストを更新
@@ -480,6 +476,8 @@ class EndManager:
         """
         await self._send_result()
         if self.game is not None:
+            # まとめて送るために待たせている結果を送り切ってから削除する
+            await self.game.transport.drain()
             self.game.delete()
 
     async def win_check(self) -> None:
@@ -505,7 +503,7 @@ class EndManager:
                 self.game.winner = [
                     p for p in self.game.players if p.role.team == self.game.win_team
                 ]
-                self.game.is_ended = True
+                self.game.mark_ended()
 
     def _is_werewolf_win(self) -> bool:
         """
@@ -516,10 +514,8 @@ class EndManager:
             人狼勝利の場合はTrue、そうでない場合はFalse。
         """
         if self.game is not None:
-            if (
-                len([p for p in self.game.alive_players if p.role.is_werewolf])
-                >= len(self.game.alive_players) / 2
-            ):
+            roster = self.game.roster
+            if roster.alive_werewolves >= roster.alive_count / 2:
                 return True
         return False
 
@@ -532,7 +528,7 @@ class EndManager:
             村人勝利の場合はTrue、そうでない場合はFalse。
         """
         if self.game is not None:
-            if len([p for p in self.game.alive_players if p.role.is_werewolf]) == 0:
+            if self.game.roster.alive_werewolves == 0:
                 return True
         return False
 
@@ -545,7 +541,7 @@ class EndManager:
             狐勝利の場合はTrue、そうでない場合はFalse。
         """
         if self.game is not None:
-            if [p for p in self.game.alive_players if p.role.name == "Fox"]:
+            if self.game.roster.has_alive_role("Fox"):
                 return True
         return False
 
@@ -555,33 +551,14 @@ class EndManager:
         勝利陣営と勝者リスト、各プレイヤーの最終ステータス・役職情報を送信する。
         """
         if self.game is not None:
-            embed = discord.Embed(
-                title="人狼ゲーム",
-                description=f"{self.t.getstring(self.game.win_team or '')}勝利",
-                color=0xFFD700,
-            )
-            embed.add_field(
-                name="勝者",
-                value="\n".join([f"<@!{player.id}>" for player in self.game.winner]),
-                inline=False,
-            )
-            await self.game.channel.send(embed=embed)
-
             self.logger.info(f"Game has ended. Winners: {self.game.winner}")
 
-            result_embed = discord.Embed(
-                title="人狼ゲーム",
-                color=0xFFD700,
-            )
-            result_embed.add_field(
-                name="最終結果",
-                value="\n".join(
-                    f"<@!{p.id}> {self.t.getstring(p.status)} - {self.t.getstring(p.role.name)}"
-                    for p in self.game.players
-                ),
-                inline=False,
+            await self.game.transport.announce(
+                "Result",
+                win_team=self.game.win_team,
+                winners=self.game.winner,
+                players=self.game.players,
             )
-            await self.game.channel.send(embed=result_embed)
 
     async def game_end(self, team: str, winners: list[player.Player]) -> None:
         """
@@ -595,6 +572,6 @@ class EndManager:
             勝利したプレイヤーのリスト
         """
         if self.game is not None:
-            self.game.is_ended = True
+            self.game.mark_ended()
             self.game.win_team = team
             self.game.winner = winners
@@ -1,54 +1,100 @@
+import time
+from typing import TYPE_CHECKING
+
 import discord
 
 import Game.Werewolf.role as role
-import Modules.global_value as g
 from Modules.logger import make_logger
+from Modules.metrics import send_latency
+from Modules.user_cache import user_cache
+
+if TYPE_CHECKING:
+    from Game.Werewolf.roster import Roster
+
+# プレイヤーごとにロガーを持たないため、ログにはゲームとプレイヤーのIDを含める
+logger = make_logger("Werewolf.Player")
 
 
 class Player:
-    def __init__(self, id, game_id):
+    """
+    ゲーム中のプレイヤーごとの状態。
+    ゲームごとに人数分作られるため、__slots__で小さく保つ。
+    役職の情報は共有のRoleを参照するだけで、生存状態などはここに持つ。
+    """
+
+    __slots__ = (
+        "id",
+        "game_id",
+        "name",
+        "member",
+        "role",
+        "status",
+        "is_alive",
+        "is_kill_protected",
+        "roster",
+    )
+
+    def __init__(self, id, game_id, name: str | None = None):
         self.id = id
-        self.game = g.werewolf_games.get(game_id)
-        self.client = self.game.client
+        self.game_id = game_id
+        self.name = name if name is not None else str(id)
         self.member = None
         self.status = "Alive"
         self.is_alive = True
         self.role = None
         self.is_kill_protected = False
+        self.roster: Roster | None = None
 
-        self.logger = make_logger("Werewolf.Player", id)
+    async def initialize(
+        self,
+        client: discord.Client,
+        member: discord.User | discord.Member | None = None,
+    ):
+        if member is None:
+            member = await user_cache.fetch(client, self.id)
 
-    async def initialize(self):
-        self.member = await self.client.fetch_user(self.id)
+        self.member = member
         self.name = self.member.name
 
     async def message(
-        self, content: str | None = None, embed: discord.Embed | None = None, view=None
+        self,
+        content: str | None = None,
+        embed: discord.Embed | None = None,
+        view=None,
+        embeds: list[discord.Embed] | None = None,
     ):
-        return await self.member.send(content, embed=embed, view=view)
+        start = time.perf_counter()
+        message = await self.member.send(content, embed=embed, embeds=embeds, view=view)
+        send_latency.observe(time.perf_counter() - start, "dm")
+        return message
 
     def assign_role(self, role: role.Role):
-        self.role = role
+        old_role, self.role = self.role, role
+        if self.roster is not None:
+            self.roster.on_role_assigned(self, old_role)
+
+    def _die(self, status: str):
+        self.status = status
+        self.is_alive = False
+        if self.roster is not None:
+            self.roster.on_death(self)
 
     def kill(self):
         if not self.is_kill_protected and not self.role.is_kill_protected:
-            self.status = "Killed"
-            self.is_alive = False
+            self._die("Killed")
 
-            self.logger.info(f"{self.id} was killed.")
+            logger.info(f"Game {self.game_id}: player {self.id} was killed.")
         else:
-            self.logger.info(f"{self.id} was blocked to kill.")
+            logger.info(f"Game {self.game_id}: player {self.id} was blocked to kill.")
 
     def system_kill(self, status: str):
-        self.status = status
-        self.is_alive = False
+        self._die(status)
 
-        self.logger.info(f"{self.id} was killed by system.")
+        logger.info(f"Game {self.game_id}: player {self.id} was killed by system.")
 
     async def execute(self, status: str = "Executed"):
-        self.status = status
-        self.is_alive = False
+        self._die(status)
 
-        self.logger.info(f"{self.id} was executed.")
+        logger.info(f"Game {self.game_id}: player {self.id} was executed.")
 
-        await self.role.executed_ability(game_id=self.game.id, player=self)
+        await self.role.executed_ability(game_id=self.game_id, player=self)
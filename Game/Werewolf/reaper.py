@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Final, Literal
+
+import discord
+import discord.state
+import discord.ui.view
+
+import Modules.global_value as g
+from Game.Werewolf.game import WerewolfGame
+from Game.Werewolf.role import Role
+from Modules.admission import admission
+from Modules.logger import make_logger
+from Modules.metrics import metrics
+from Modules.translator import Translator
+
+LOBBY_IDLE_TIMEOUT: Final = float(os.getenv("LOBBY_IDLE_TIMEOUT", "1800"))
+# フェーズには期限があるため、これだけ進まないゲームは止まっているとみなす
+STALLED_GAME_TIMEOUT: Final = float(os.getenv("STALLED_GAME_TIMEOUT", "3600"))
+REAPER_INTERVAL: Final = float(os.getenv("REAPER_INTERVAL", "60"))
+# 終了したゲームは結果の送信を終えてから削除されるため、タスクが動いている間はこれだけ待つ
+ENDED_GAME_GRACE: Final = float(os.getenv("ENDED_GAME_GRACE", "300"))
+
+ReapReason = Literal["idle_lobby", "stalled", "ended"]
+
+logger = make_logger("Reaper")
+
+reaped_games = metrics.counter(
+    "werewolf_reaped_games_total", "Games removed by the reaper", ("reason",)
+)
+reaped_bytes = metrics.counter(
+    "werewolf_reaped_bytes_total", "Estimated memory released by the reaper"
+)
+
+# 全ゲームで共有しているものや、ゲームが消えても残るものは数えない
+_SHARED_TYPES: Final = (
+    type,
+    Role,
+    Translator,
+    logging.Logger,
+    logging.LoggerAdapter,
+    asyncio.Task,
+    discord.Client,
+    # Viewからたどると他のゲームのViewやプレイヤーまで数えてしまう
+    discord.state.ConnectionState,
+    discord.ui.view.ViewStore,
+    discord.abc.Messageable,
+    discord.abc.GuildChannel,
+    discord.Guild,
+    discord.Message,
+    discord.PartialMessage,
+)
+
+
+def estimate_size(obj: object, seen: set[int] | None = None) -> int:
+    """
+    オブジェクトとそこから参照されている、そのゲームだけが持つオブジェクトの大きさの概算。
+
+    Parameters
+    ----------
+    obj : object
+        対象のオブジェクト
+    seen : set[int] | None
+        数え終わったオブジェクトのid
+
+    Returns
+    -------
+    int
+        バイト数
+    """
+
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        children = [*obj.keys(), *obj.values()]
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = list(obj)
+    elif isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+    else:
+        children = []
+        if hasattr(obj, "__dict__"):
+            children.append(vars(obj))
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if hasattr(obj, name):
+                    children.append(getattr(obj, name))
+
+    return size + sum(estimate_size(child, seen) for child in children)
+
+
+class Reaper:
+    """
+    放置されたゲームを定期的に削除するクラス。
+
+    - 募集中で、最後の参加・退出・役職の変更から一定時間たったゲーム
+    - 進行中で、一定時間フェーズが進んでいないゲーム。開始待ちのゲームは除く
+    - 終了しているのに残っているゲーム。結果を送っている間は猶予を置く
+
+    募集中のゲームはメッセージを期限切れの表示にし、Viewをクライアントから外す。
+
+    Parameters
+    ----------
+    lobby_idle_timeout : float
+        募集中のゲームを削除するまでの放置時間(秒)
+    stalled_game_timeout : float
+        進行中のゲームを止まっているとみなすまでの時間(秒)
+    interval : float
+        確認の間隔(秒)
+    ended_game_grace : float
+        終了したゲームのタスクがまだ動いている場合に、削除するまで待つ時間(秒)
+    """
+
+    def __init__(
+        self,
+        lobby_idle_timeout: float = LOBBY_IDLE_TIMEOUT,
+        stalled_game_timeout: float = STALLED_GAME_TIMEOUT,
+        interval: float = REAPER_INTERVAL,
+        ended_game_grace: float = ENDED_GAME_GRACE,
+    ):
+        self.lobby_idle_timeout = lobby_idle_timeout
+        self.stalled_game_timeout = stalled_game_timeout
+        self.interval = interval
+        self.ended_game_grace = ended_game_grace
+        self._task: asyncio.Task | None = None
+
+    def _expired(self, now: float) -> list[tuple[WerewolfGame, ReapReason]]:
+        expired: list[tuple[WerewolfGame, ReapReason]] = []
+        for game in g.werewolf_games.by_state("recruiting"):
+            if now - game.last_activity >= self.lobby_idle_timeout:
+                expired.append((game, "idle_lobby"))
+        # 開始待ちのゲームは枠が空くのを待っているだけで、止まってはいない
+        for game in g.werewolf_games.by_state("running"):
+            if admission.is_queued(game.id):
+                continue
+            if now - game.last_activity >= self.stalled_game_timeout:
+                expired.append((game, "stalled"))
+        for game in g.werewolf_games.by_state("ended"):
+            # 勝敗の判定から結果を送り終えるまでの間は、タスクを止めると結果が失われる
+            running = game.task is not None and not game.task.done()
+            if running and now - game.last_activity < self.ended_game_grace:
+                continue
+            expired.append((game, "ended"))
+        return expired
+
+    async def _close_lobby(self, game: WerewolfGame) -> None:
+        if game.joinview is not None:
+            # Viewを止めると、クライアントが持つViewの一覧からも外れる
+            game.joinview.stop()
+
+        if game.channel is None or game.message is None:
+            return
+        try:
+            await game.channel.get_partial_message(game.message.id).edit(
+                embed=discord.Embed(
+                    title="人狼ゲーム",
+                    description="一定時間操作がなかったため、募集を終了しました",
+                    color=discord.Color.red(),
+                ),
+                view=None,
+            )
+        except discord.HTTPException:
+            game.logger.warning("Failed to edit expired lobby", exc_info=True)
+
+    async def reap(self, game: WerewolfGame, reason: ReapReason) -> int:
+        """
+        ゲームを削除する。
+
+        Returns
+        -------
+        int
+            解放したと見積もったバイト数
+        """
+
+        size = estimate_size(game)
+
+        if reason == "idle_lobby":
+            await self._close_lobby(game)
+        elif game.task is not None and not game.task.done():
+            # 進行中のタスクを止めると、待機中のViewも外れる
+            game.task.cancel()
+
+        if game.id in g.werewolf_games:
+            game.delete()
+
+        reaped_games.inc(reason)
+        reaped_bytes.inc(amount=size)
+        idle = time.monotonic() - game.last_activity
+        game.logger.info(
+            f"Reaped game {game.id} ({reason}, idle {idle:.0f}s, ~{size / 1024:.1f}KB)"
+        )
+        return size
+
+    async def sweep(self) -> int:
+        """
+        期限切れのゲームをすべて削除する。
+
+        Returns
+        -------
+        int
+            削除したゲームの数
+        """
+
+        expired = self._expired(time.monotonic())
+        if not expired:
+            return 0
+
+        total = 0
+        for game, reason in expired:
+            try:
+                total += await self.reap(game, reason)
+            except Exception:
+                logger.error(f"Failed to reap game {game.id}", exc_info=True)
+
+        logger.info(
+            f"Reaped {len(expired)} games (~{total / 1024:.1f}KB),"
+            f" {len(g.werewolf_games)} remaining"
+        )
+        return len(expired)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.error("Reaper sweep failed", exc_info=True)
+
+    def start(self) -> None:
+        """
+        定期的な確認を開始する。すでに動いている場合は何もしない。
+        """
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+
+reaper = Reaper()
@@ -1,18 +1,158 @@
+import importlib
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, ClassVar, Final, Literal
+
+if TYPE_CHECKING:
+    from Game.Werewolf.player import Player
+
+# 役職名と、その役職クラスがあるモジュール。役職のモジュールは初めて使われたときに読み込む
+ROLE_MODULES: Final = {
+    "Villager": "Game.Werewolf.Roles.Villager.Villager",
+    "Seer": "Game.Werewolf.Roles.Villager.Seer",
+    "Medium": "Game.Werewolf.Roles.Villager.Medium",
+    "Hunter": "Game.Werewolf.Roles.Villager.Hunter",
+    "Bakery": "Game.Werewolf.Roles.Villager.Bakery",
+    "Nekomata": "Game.Werewolf.Roles.Villager.Nekomata",
+    "Werewolf": "Game.Werewolf.Roles.Werewolf.Werewolf",
+    "Madmate": "Game.Werewolf.Roles.Villager.Madmate",
+    "BlackCat": "Game.Werewolf.Roles.Villager.BlackCat",
+    "Teruteru": "Game.Werewolf.Roles.Neutral.Teruteru",
+    "Fox": "Game.Werewolf.Roles.Neutral.Fox",
+}
+
+NightActionKind = Literal["Guard", "Kill", "Divination", "Medium"]
+# 夜の行動を適用する順番。護衛は襲撃より先に、占いの副作用(呪殺など)は襲撃の後に適用する
+NIGHT_RESOLUTION_ORDER: Final[tuple[NightActionKind, ...]] = (
+    "Guard",
+    "Kill",
+    "Divination",
+    "Medium",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class NightAction:
+    """
+    夜に選ばれた行動。夜の間にすべて集めてから、NIGHT_RESOLUTION_ORDERの順に適用する。
+
+    Parameters
+    ----------
+    kind : NightActionKind
+        行動の種類
+    actor : Player | None
+        行動したプレイヤー。人狼の襲撃のように複数人で決めた場合はNone。
+    target : Player
+        行動の対象
+    """
+
+    kind: NightActionKind
+    actor: "Player | None"
+    target: "Player"
+
+
 class Role:
-    def __init__(self):
-        self.name = ""
-        self.is_villager = False
-        self.is_werewolf = False
-        self.is_neutral = False
+    """
+    役職の情報を表すクラス。
+    役職ごとに1つのインスタンスを全ゲームで共有するため、生成後は変更できない。
+    ゲームごと・プレイヤーごとの状態はPlayerに持たせる。
+    """
+
+    __slots__ = (
+        "name",
+        "team",
+        "fortune_result",
+        "description",
+        "win_condition",
+        "is_villager",
+        "is_werewolf",
+        "is_neutral",
+        "is_kill_protected",
+    )
+
+    # night_abilityを上書きしている役職だけTrueになる
+    has_night_ability: ClassVar[bool] = False
+
+    _shared: ClassVar[dict[type["Role"], "Role"]] = {}
+    # 役職名から役職クラスを引くための表。読み込まれた役職クラスが登録される
+    _classes: ClassVar[dict[str, type["Role"]]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.has_night_ability = cls.night_ability is not Role.night_ability
+        Role._classes[cls.__name__] = cls
+
+    def __init__(
+        self,
+        *,
+        team: str = "",
+        fortune_result: str = "",
+        description: str = "",
+        win_condition: str = "",
+        is_villager: bool = False,
+        is_werewolf: bool = False,
+        is_neutral: bool = False,
+        is_kill_protected: bool = False,
+    ):
+        init = object.__setattr__
+        init(self, "name", self.__class__.__name__)
+        init(self, "team", team)
+        init(self, "fortune_result", fortune_result)
+        init(self, "description", description)
+        init(self, "win_condition", win_condition)
+        init(self, "is_villager", is_villager)
+        init(self, "is_werewolf", is_werewolf)
+        init(self, "is_neutral", is_neutral)
+        init(self, "is_kill_protected", is_kill_protected)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __repr__(self):
+        return f"<{self.name}>"
+
+    @classmethod
+    def shared(cls) -> "Role":
+        """
+        この役職の共有インスタンスを返す。
+        """
+
+        role = Role._shared.get(cls)
+        if role is None:
+            role = Role._shared[cls] = cls()
+        return role
+
+    @staticmethod
+    def by_name(name: str) -> "Role":
+        """
+        役職名から共有インスタンスを返す。
+        役職クラスがまだ読み込まれていなければ、ROLE_MODULESからモジュールを読み込む。
+
+        Parameters
+        ----------
+        name : str
+            役職名(クラス名)
+
+        Raises
+        ------
+        KeyError
+            その名前の役職がない場合
+        """
 
-        self.team = ""
-        self.win_condition = ""
-        self.description = ""
+        cls = Role._classes.get(name)
+        if cls is None:
+            importlib.import_module(ROLE_MODULES[name])
+            cls = Role._classes[name]
+        return cls.shared()
 
-        self.is_kill_protected = False
+    async def night_ability(self, game_id: int, player) -> NightAction | None:
+        # 夜行動の対象を選ぶ。効果はresolve_night_actionで適用する
+        return None
 
-    async def night_ability(self, game_id: int, player):
-        # 夜行動の記述
+    async def resolve_night_action(self, game_id: int, action: NightAction):
+        # 選んだ夜行動の効果の記述
         pass
 
     async def seer_ability(self, game_id: int, player):
@@ -0,0 +1,137 @@
+from collections import Counter
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from Game.Werewolf.player import Player
+    from Game.Werewolf.role import Role
+
+
+class Roster:
+    """
+    ゲームに参加しているプレイヤーの一覧。
+    IDからの検索と生存者の集合、生存者の陣営・役職ごとの人数を持ち、
+    死亡や役職の割り当てのたびに差分だけ更新する。
+
+    Attributes
+    ----------
+    roles : dict[int, Role]
+        プレイヤーIDから役職を引く表。死亡したプレイヤーも含む
+    alive_by_team : Counter[str]
+        陣営ごとの生存者数
+    alive_by_role : Counter[str]
+        役職名ごとの生存者数
+    alive_werewolves : int
+        人狼(is_werewolf)の生存者数
+    """
+
+    def __init__(self) -> None:
+        self.by_id: dict[int, "Player"] = {}
+        self.roles: dict[int, "Role"] = {}
+        # 参加順を保つため、集合ではなく辞書で持つ
+        self._alive: dict[int, "Player"] = {}
+        # 参加順のプレイヤーの一覧。追加されるまで作り直さない
+        self._players: list["Player"] | None = None
+
+        self.alive_by_team: Counter[str] = Counter()
+        self.alive_by_role: Counter[str] = Counter()
+        self.alive_werewolves = 0
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, player_id: object) -> bool:
+        return player_id in self.by_id
+
+    def _count(self, role: "Role", delta: int) -> None:
+        self.alive_by_team[role.team] += delta
+        self.alive_by_role[role.name] += delta
+        if role.is_werewolf:
+            self.alive_werewolves += delta
+
+    def add(self, player: "Player") -> None:
+        """
+        プレイヤーを追加する。
+
+        Parameters
+        ----------
+        player : Player
+            追加するプレイヤー
+        """
+
+        player.roster = self
+        self.by_id[player.id] = player
+        self._players = None
+        if player.role is not None:
+            self.roles[player.id] = player.role
+        if player.is_alive:
+            self._alive[player.id] = player
+            if player.role is not None:
+                self._count(player.role, 1)
+
+    def get(self, player_id: int | None) -> "Player | None":
+        """
+        IDからプレイヤーを取得する。
+        """
+
+        return self.by_id.get(player_id)  # type: ignore[arg-type]
+
+    def role_of(self, player_id: int) -> "Role | None":
+        """
+        プレイヤーの役職を取得する。参加していないか、役職がない場合はNone。
+        """
+
+        return self.roles.get(player_id)
+
+    @property
+    def players(self) -> list["Player"]:
+        """
+        参加順のプレイヤーの一覧。アクセスのたびにコピーしないため、呼び出し側で変更しないこと。
+        """
+
+        if self._players is None:
+            self._players = list(self.by_id.values())
+        return self._players
+
+    @property
+    def alive_players(self) -> list["Player"]:
+        return list(self._alive.values())
+
+    @property
+    def alive_count(self) -> int:
+        return len(self._alive)
+
+    def is_alive(self, player_id: int) -> bool:
+        return player_id in self._alive
+
+    def has_alive_role(self, role_name: str) -> bool:
+        """
+        指定した役職の生存者がいるかどうか。
+        """
+
+        return self.alive_by_role[role_name] > 0
+
+    def on_role_assigned(self, player: "Player", old_role: "Role | None") -> None:
+        """
+        役職が割り当てられたときに人数を更新する。Playerから呼ばれる。
+        """
+
+        if player.role is not None:
+            self.roles[player.id] = player.role
+        else:
+            self.roles.pop(player.id, None)
+
+        if player.id not in self._alive:
+            return
+        if old_role is not None:
+            self._count(old_role, -1)
+        if player.role is not None:
+            self._count(player.role, 1)
+
+    def on_death(self, player: "Player") -> None:
+        """
+        プレイヤーが死亡したときに生存者と人数を更新する。Playerから呼ばれる。
+        すでに死亡している場合は何もしない。
+        """
+
+        if self._alive.pop(player.id, None) is not None and player.role is not None:
+            self._count(player.role, -1)
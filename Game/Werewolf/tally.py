@@ -0,0 +1,143 @@
+from collections.abc import Iterable
+
+
+class VoteTally:
+    """
+    処刑投票の集計。1票ごとに差分だけ更新し、結果が変わらなくなった時点で確定とする。
+
+    投票しなかったプレイヤーはスキップとして数える。
+    スキップが投票者の半数以上なら処刑なし、それ以外で最多票が1人なら処刑、
+    最多票が並んだ場合(スキップとの同数も含む)は処刑なし。
+
+    Parameters
+    ----------
+    voter_ids : Iterable[int]
+        投票できるプレイヤーのID
+    """
+
+    def __init__(self, voter_ids: Iterable[int]):
+        self.voter_ids = frozenset(voter_ids)
+        self.votes: dict[int, int | None] = {}
+        self.counts: dict[int | None, int] = {}
+        self.remaining = len(self.voter_ids)
+
+        # 得票数の上位2つ。票は取り消せないので、増えた候補だけを見れば保てる
+        self._first: int | None = None
+        self._second: int | None = None
+        self._has_first = False
+        self._has_second = False
+
+    @property
+    def total(self) -> int:
+        return len(self.voter_ids)
+
+    @property
+    def skips(self) -> int:
+        return self.counts.get(None, 0)
+
+    def can_vote(self, voter_id: int) -> bool:
+        return voter_id in self.voter_ids
+
+    def has_voted(self, voter_id: int) -> bool:
+        return voter_id in self.votes
+
+    def _count(self, target: int | None) -> int:
+        return self.counts.get(target, 0)
+
+    def cast(self, voter_id: int, target: int | None) -> None:
+        """
+        1票を数える。
+
+        Parameters
+        ----------
+        voter_id : int
+            投票したプレイヤーのID
+        target : int | None
+            投票先のプレイヤーのID。スキップはNone。
+
+        Raises
+        ------
+        ValueError
+            投票できないプレイヤーか、すでに投票したプレイヤーの場合
+        """
+
+        if voter_id not in self.voter_ids:
+            raise ValueError(f"{voter_id} cannot vote")
+        if voter_id in self.votes:
+            raise ValueError(f"{voter_id} has already voted")
+
+        self.votes[voter_id] = target
+        self.remaining -= 1
+        count = self.counts[target] = self._count(target) + 1
+
+        if self._has_first and target == self._first:
+            return
+        if not self._has_first or count > self._count(self._first):
+            if self._has_first:
+                self._second, self._has_second = self._first, True
+            self._first, self._has_first = target, True
+        elif not self._has_second or count > self._count(self._second):
+            self._second, self._has_second = target, True
+
+    @property
+    def leader(self) -> int | None:
+        """
+        現在の最多得票(スキップを含む)。票がない場合はNone。
+        """
+
+        return self._first
+
+    @property
+    def is_decided(self) -> bool:
+        """
+        残りの票がどう入っても結果が変わらないかどうか。
+        """
+
+        remaining = self.remaining
+        if remaining == 0:
+            return True
+
+        # スキップが半数以上になれば、それ以上の票に関係なく処刑なし
+        counts = self.counts
+        skips = counts.get(None, 0)
+        total = len(self.voter_ids)
+        if skips * 2 >= total:
+            return True
+
+        # 最多のプレイヤーに、2位(スキップや0票の候補を含む)が残り全部を集めても届かない
+        if self._first is not None:
+            second = counts[self._second] if self._has_second else 0
+            if counts[self._first] > max(second, skips) + remaining:
+                # 残りが全部スキップでも半数に届かない場合だけ確定
+                return (skips + remaining) * 2 < total
+
+        return False
+
+    def result(self) -> int | None:
+        """
+        投票の結果。投票していないプレイヤーはスキップとして扱う。
+
+        Returns
+        -------
+        int | None
+            処刑対象のプレイヤーID。処刑しない場合はNone。
+        """
+
+        skips = self.skips + self.remaining
+        if self.total == 0 or skips * 2 >= self.total:
+            return None
+
+        top = self._count(self._first)
+        if self._first is None:
+            # スキップが最多の場合は、スキップ以外の最多と比べる必要はない
+            return None
+        if top <= max(skips, self._count(self._second) if self._has_second else 0):
+            return None
+        return self._first
+
+    def snapshot(self) -> dict[int | None, int]:
+        """
+        現在の得票数。未投票の分は含まない。
+        """
+
+        return dict(self.counts)
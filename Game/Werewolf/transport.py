@@ -0,0 +1,167 @@
+from typing import TYPE_CHECKING, Any, Literal
+
+if TYPE_CHECKING:
+    from Game.Werewolf.player import Player
+    from Game.Werewolf.tally import VoteTally
+
+# チャンネル全体への通知
+AnnounceEvent = Literal[
+    "NightStart",
+    "DayStart",
+    "Bakery",
+    "Executed",
+    "NoExecution",
+    "Result",
+    "NotifyFailed",
+    "Resumed",
+]
+# 個別のプレイヤーへの通知
+NotifyEvent = Literal[
+    "RoleAssigned",
+    "KillTarget",
+    "ReturnToChannel",
+    "DivinationResult",
+    "GuardResult",
+    "MediumResult",
+]
+# 1人のプレイヤーによる選択
+ChooseEvent = Literal["Divination", "Guard", "Kill"]
+
+
+class Transport:
+    """
+    ゲームのルールと外部との入出力をつなぐ基底クラス。
+    ルール側(マネージャーや役職)は、メッセージの送信や選択の受け付けをすべてこのクラスを通して行う。
+    Discordで遊ぶ場合はDiscordTransport、シミュレーションではHeadlessTransportを使う。
+    """
+
+    async def prepare_players(self, players: list["Player"]) -> None:
+        """
+        ゲーム開始時にプレイヤーの名前などを準備する。
+
+        Parameters
+        ----------
+        players : list[Player]
+            参加するプレイヤーのリスト
+        """
+
+    async def drain(self) -> None:
+        """
+        送信を待っている通知をすべて送信する。
+        """
+
+    async def announce(self, event: AnnounceEvent, **data: Any) -> None:
+        """
+        ゲーム全体に通知する。送信の完了を待たずに戻ってもよい。
+
+        Parameters
+        ----------
+        event : AnnounceEvent
+            通知の種類
+        **data : Any
+            通知に必要な情報
+        """
+
+        raise NotImplementedError
+
+    async def notify(self, player: "Player", event: NotifyEvent, **data: Any) -> None:
+        """
+        1人のプレイヤーに通知する。送信の完了を待たずに戻ってもよい。
+
+        Parameters
+        ----------
+        player : Player
+            通知先のプレイヤー
+        event : NotifyEvent
+            通知の種類
+        **data : Any
+            通知に必要な情報
+        """
+
+        raise NotImplementedError
+
+    async def notify_all(
+        self, players: list["Player"], event: NotifyEvent, **data: Any
+    ) -> list["Player"]:
+        """
+        複数のプレイヤーに通知する。
+
+        Parameters
+        ----------
+        players : list[Player]
+            通知先のプレイヤーのリスト
+        event : NotifyEvent
+            通知の種類
+        **data : Any
+            通知に必要な情報
+
+        Returns
+        -------
+        list[Player]
+            通知できなかったプレイヤーのリスト
+        """
+
+        for p in players:
+            await self.notify(p, event, **data)
+        return []
+
+    async def choose(
+        self,
+        player: "Player",
+        event: ChooseEvent,
+        choices: list["Player"],
+        allow_skip: bool = False,
+        deadline: float | None = None,
+    ) -> int | None:
+        """
+        プレイヤーに対象を1人選ばせる。
+
+        Parameters
+        ----------
+        player : Player
+            選択するプレイヤー
+        event : ChooseEvent
+            選択の種類
+        choices : list[Player]
+            選択肢となるプレイヤーのリスト
+        allow_skip : bool
+            スキップを許可するかどうか
+        deadline : float | None
+            選択の期限(秒)。Noneの場合は期限なし。
+
+        Returns
+        -------
+        int | None
+            選ばれたプレイヤーのID。スキップした場合や期限までに選ばれなかった場合はNone。
+        """
+
+        raise NotImplementedError
+
+    async def vote(
+        self,
+        voters: list["Player"],
+        choices: list["Player"],
+        allow_skip: bool = True,
+        deadline: float | None = None,
+    ) -> "VoteTally":
+        """
+        処刑投票を行う。結果が確定した時点で締め切ってよい。
+
+        Parameters
+        ----------
+        voters : list[Player]
+            投票できるプレイヤーのリスト
+        choices : list[Player]
+            投票先となるプレイヤーのリスト
+        allow_skip : bool
+            スキップを許可するかどうか
+        deadline : float | None
+            投票の期限(秒)。Noneの場合は期限なし。
+
+        Returns
+        -------
+        VoteTally
+            投票の集計。期限までに投票しなかったプレイヤーはスキップとして扱われる。
+        """
+
+        raise NotImplementedError
@@ -5,56 +5,59 @@ from discord.ui import Select
 
 import Modules.global_value as g
 from Game.Werewolf import player
+from Game.Werewolf.embeds import embed_templates
+from Game.Werewolf.tally import VoteTally
+from Modules.inbox import INBOX_FULL_MSG, InboxClosed, InboxFull
+from Modules.logger import LOG_SAMPLE_RATE, make_logger
+from Modules.metrics import track_interaction
+from Modules.Views.TrackedView import TrackedView
 
 
-class RoleInfoView(discord.ui.View):
-    def __init__(self, players: list, game_id: int, timeout: int | None = None):
+class RoleInfoView(TrackedView):
+    def __init__(self, game_id: int, timeout: int | None = None):
         super().__init__(timeout=timeout)
-        self.players = players
         self.game = g.werewolf_games[game_id]
+        self.game.track_view(self)
         self.logger = self.game.logger
         self.t = self.game.translator
 
     @discord.ui.button(emoji="ℹ️", style=discord.ButtonStyle.gray)
+    @track_interaction("role_info")
     async def InfoButton(
         self, interaction: discord.Interaction, button: discord.ui.Button
     ):
-        player_role = [p.role for p in self.players if interaction.user.id == p.id][0]
-
-        embed = discord.Embed(
-            title=self.t.getstring(player_role.name),
-            color=discord.Color.green(),
-        )
-        embed.add_field(
-            name="陣営",
-            value=self.t.getstring(player_role.team),
-            inline=False,
-        )
-        embed.add_field(
-            name="勝利条件",
-            value=self.t.getstring(player_role.win_condition),
-            inline=False,
-        )
-        embed.add_field(
-            name="説明",
-            value=self.t.getstring(player_role.description),
-            inline=False,
-        )
-
+        player_role = self.game.roster.role_of(interaction.user.id)
+        if player_role is None:
+            await interaction.response.send_message(
+                "このゲームに参加していません", ephemeral=True
+            )
+            return
+
+        embed = embed_templates.role_info(self.t, player_role)
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
-class PlayerChoiceView(discord.ui.View):
+class PlayerChoiceView(TrackedView):
     def __init__(
         self,
         choices: list[player.Player],
         process: Literal["Execute", "Ability"],
         game_id: int,
         allow_skip: bool = False,
+        tally: VoteTally | None = None,
+        voters: list[player.Player] | None = None,
     ) -> None:
-        super().__init__()
+        # 期限は共有のタイマーで管理するため、View自身のタイムアウトは使わない
+        super().__init__(timeout=None)
         self.choices = choices
         self.votes: dict[int, int | None] = {}
+        # 処刑投票の集計。投票のたびに更新され、途中経過も参照できる。
+        # 選択肢は投票先であって投票者ではないため、集計は投票者から作る。夜の能力では使わない
+        if tally is None and process == "Execute":
+            if voters is None:
+                raise ValueError("An Execute view needs a tally or its voters")
+            tally = VoteTally(v.id for v in voters)
+        self.tally = tally
         self.process = process
         self.options = [
             discord.SelectOption(label=choice.name, value=choice.id)
@@ -62,6 +65,7 @@ class PlayerChoiceView(discord.ui.View):
         ]
 
         self.game = g.werewolf_games[game_id]
+        self.game.track_view(self)
         self.logger = self.game.logger
         self.t = self.game.translator
 
@@ -88,76 +92,105 @@ class GenericSelect(Select):
         self.game = g.werewolf_games[game_id]
         self.logger = self.game.logger
         self.t = self.game.translator
+        # クリックごとのログは量が多いため、サンプリングしたロガーに出す
+        self.click_logger = make_logger(
+            "Werewolf.Interaction", game_id, sample_rate=LOG_SAMPLE_RATE
+        )
 
+    @track_interaction("player_choice")
     async def callback(self, interaction: discord.Interaction) -> None:
-        if self.values:
-            self.logger.info(f"{interaction.user.id} selected {self.values[0]}")
-
-            selected_user_id: int | None
-
-            if self.process == "Execute":
-                alive_player_ids = (p.id for p in self.players if p.is_alive)
-
-                if self.view is None:
-                    self.logger.error("self.view is None")
-                    await interaction.response.send_message(
-                        "内部エラーが発生しました。", ephemeral=True
-                    )
-                    return
-
-                if interaction.user.id in self.view.votes:
-                    await interaction.response.send_message(
-                        "既に投票済みです", ephemeral=True
-                    )
-                    return
-                if interaction.user.id not in alive_player_ids:
-                    await interaction.response.send_message(
-                        "生存しているプレイヤーだけが投票できます", ephemeral=True
-                    )
-                    return
-
-                if self.values[0] == "skip":
-                    selected_user_id = None
-                    await interaction.response.send_message(
-                        "スキップしました。", ephemeral=True
-                    )
-                else:
-                    selected_user_id = int(self.values[0])
-                    await interaction.response.send_message(
-                        f"<@!{selected_user_id}> に投票しました。", ephemeral=True
-                    )
-
-                self.view.votes[interaction.user.id] = selected_user_id
-
-                if len(self.view.votes) == len(self.players):
-                    if interaction.message is not None:  # None チェックを追加
-                        await interaction.message.edit(view=None)
-                    self.view.stop()
-
-            elif self.process == "Ability":
-                if self.view is None:
-                    self.logger.error("self.view is None")
-                    await interaction.response.send_message(
-                        "内部エラーが発生しました。", ephemeral=True
-                    )
-                    return
-
-                selected_user_id = (
-                    int(self.values[0]) if self.values[0] != "skip" else None
-                )
-                self.view.votes[interaction.user.id] = selected_user_id
-
-                if selected_user_id is not None:
-                    await interaction.response.send_message(
-                        f"<@!{selected_user_id}> に投票しました。", ephemeral=True
-                    )
-                else:
-                    await interaction.response.send_message(
-                        "スキップしました。", ephemeral=True
-                    )
-
-                if interaction.message is not None:
-                    await interaction.message.edit(view=None)
-                self.view.stop()
-        else:
+        if not self.values:
             self.logger.warning(f"Not selected by {interaction.user.id}")
+            return
+
+        self.click_logger.debug("%s selected %s", interaction.user.id, self.values[0])
+
+        if self.view is None:
+            self.logger.error("self.view is None")
+            await interaction.response.send_message(
+                "内部エラーが発生しました。", ephemeral=True
+            )
+            return
+
+        view = self.view
+        value = self.values[0]
+        handler = self._execute if self.process == "Execute" else self._ability
+
+        # 投票の確認と集計はゲームの受信箱で行い、同時の投票が交互に実行されないようにする
+        try:
+            reply, closed = await self.game.inbox.call(
+                lambda: handler(view, interaction.user.id, value)
+            )
+        except InboxFull:
+            await interaction.response.send_message(INBOX_FULL_MSG, ephemeral=True)
+            return
+        except InboxClosed:
+            await interaction.response.send_message(
+                "ゲームが見つかりませんでした。", ephemeral=True
+            )
+            return
+
+        await interaction.response.send_message(reply, ephemeral=True)
+        if closed and interaction.message is not None:
+            await interaction.message.edit(view=None)
+
+    def _execute(
+        self, view: PlayerChoiceView, user_id: int, value: str
+    ) -> tuple[str, bool]:
+        """
+        処刑投票を集計する。
+
+        Returns
+        -------
+        tuple[str, bool]
+            返信する内容と、投票を締め切ったかどうか
+        """
+
+        tally = view.tally
+        assert tally is not None
+        if tally.has_voted(user_id):
+            return "既に投票済みです", False
+        if not tally.can_vote(user_id):
+            return "生存しているプレイヤーだけが投票できます", False
+        if view.is_finished():
+            return "投票は締め切られました", False
+
+        selected_user_id = int(value) if value != "skip" else None
+        view.votes[user_id] = selected_user_id
+        tally.cast(user_id, selected_user_id)
+
+        if selected_user_id is None:
+            reply = "スキップしました。"
+        else:
+            reply = f"<@!{selected_user_id}> に投票しました。"
+
+        # 残りの票で結果が変わらなくなった時点で締め切る
+        if not tally.is_decided:
+            return reply, False
+        if tally.remaining:
+            self.logger.info(f"Vote decided with {tally.remaining} votes remaining")
+        view.stop()
+        return reply, True
+
+    def _ability(
+        self, view: PlayerChoiceView, user_id: int, value: str
+    ) -> tuple[str, bool]:
+        """
+        夜の能力の対象を記録する。
+
+        Returns
+        -------
+        tuple[str, bool]
+            返信する内容と、選択を締め切ったかどうか
+        """
+
+        if view.is_finished():
+            return "既に選択済みです", False
+
+        selected_user_id = int(value) if value != "skip" else None
+        view.votes[user_id] = selected_user_id
+        view.stop()
+
+        if selected_user_id is None:
+            return "スキップしました。", True
+        return f"<@!{selected_user_id}> に投票しました。", True
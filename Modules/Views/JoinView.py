@@ -1,9 +1,16 @@
+from collections.abc import Awaitable, Callable
 from typing import TYPE_CHECKING, Final
 
 import discord
 
 import Modules.global_value as g
+from Modules.admission import admission
+from Modules.inbox import INBOX_FULL_MSG, InboxClosed, InboxFull
 from Modules.logger import make_logger
+from Modules.metrics import track_interaction
+from Modules.sharding import coordinator_client
+from Modules.user_cache import user_cache
+from Modules.Views.TrackedView import TrackedView
 
 if TYPE_CHECKING:
     from Game.Werewolf.game import WerewolfGame
@@ -11,21 +18,25 @@ if TYPE_CHECKING:
 NOT_HOST_MSG: Final = "あなたは募集者ではありません"
 NOT_PLAYER_MSG: Final = "あなたは参加していません"
 ALREADY_PLAYER_MSG: Final = "すでに参加しています"
+OTHER_GAME_PLAYER_MSG: Final = "他のゲームに参加しています"
 LIMIT_PLAYER_MSG: Final = "人数制限に達しました"
 HOST_JOIN_MSG: Final = "募集者は参加できません"
 HOST_LEAVE_MSG: Final = "募集者は退出できません"
+ALREADY_STARTED_MSG: Final = "ゲームはすでに開始しています"
+GAME_NOT_FOUND_MSG: Final = "ゲームが見つかりませんでした。"
 ERROR_TEMPLATE: Final = "エラーが発生しました\n"
 
 logger = make_logger("JoinView")
 
 
-class JoinView(discord.ui.View):
+class JoinView(TrackedView):
     def __init__(self, id: int, timeout: int | None = None):
         super().__init__(timeout=timeout)
         self.game_id = id
         self.game: WerewolfGame | None = None
 
     @discord.ui.button(label="参加", style=discord.ButtonStyle.success)
+    @track_interaction("join")
     async def join(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.game is None:
             self.game = g.werewolf_games.get(self.game_id)
@@ -37,41 +48,63 @@ class JoinView(discord.ui.View):
             logger.warning(f"Game with ID {self.game_id} not found.")
             return
 
-        logger.info(f"User {interaction.user.id} clicked join button.")
+        logger.debug("User %s clicked join button.", interaction.user.id)
+        user_cache.put(interaction.user)
         try:
-            # ホストかどうか
-            if interaction.user.id == self.game.host_id:
-                await interaction.response.send_message(HOST_JOIN_MSG, ephemeral=True)
-                logger.info(
-                    f"User {interaction.user.id} (host) attempted to join but is not allowed."
-                )
-                return
-
-            # すでに参加しているか
-            if interaction.user.id in self.game.participant_ids:
-                await interaction.response.send_message(
-                    ALREADY_PLAYER_MSG, ephemeral=True
-                )
-                logger.info(f"User {interaction.user.id} is already a participant.")
-                return
-
-            # 参加人数制限に達しているか
-            if len(self.game.participant_ids) + 1 >= self.game.limit:
-                await interaction.response.send_message(
-                    LIMIT_PLAYER_MSG, ephemeral=True
-                )
-                logger.info(
-                    f"User {interaction.user.id} could not join due to player limit."
-                )
-                return
-
-            self.game.participant_ids.add(interaction.user.id)
-            await self.game.update_recruiting_embed(interaction)
+            # 確認と追加の間に他の参加が入らないよう、ゲームの受信箱で行う
+            error = await self._submit(interaction, self._join, interaction.user.id)
+            if error is None:
+                await self.game.update_recruiting_embed(interaction)
         except Exception as e:
             logger.error("An error occurred", exc_info=True)
             await interaction.response.send_message(ERROR_TEMPLATE + str(e))
 
+    async def _join(self, user_id: int) -> str | None:
+        """
+        参加者を追加する。参加できない場合はその理由を返す。
+        """
+
+        game = self.game
+        assert game is not None
+
+        # 開始済みか
+        if game.is_started:
+            return ALREADY_STARTED_MSG
+
+        # ホストかどうか
+        if user_id == game.host_id:
+            logger.info(f"User {user_id} (host) attempted to join but is not allowed.")
+            return HOST_JOIN_MSG
+
+        # すでに参加しているか
+        if user_id in game.participant_ids:
+            logger.info(f"User {user_id} is already a participant.")
+            return ALREADY_PLAYER_MSG
+
+        # 他のゲームに参加していないか
+        other_game = g.werewolf_games.active_game_of(user_id)
+        if other_game is not None and other_game.id != game.id:
+            logger.info(f"User {user_id} is already in game {other_game.id}.")
+            return OTHER_GAME_PLAYER_MSG
+
+        # 参加人数制限に達しているか
+        if len(game.participant_ids) + 1 >= game.limit:
+            logger.info(f"User {user_id} could not join due to player limit.")
+            return LIMIT_PLAYER_MSG
+
+        # 別のプロセスが担当するゲームに参加していないか
+        other_game_id = await coordinator_client.claim(user_id, game.id)
+        if other_game_id is not None:
+            logger.info(
+                f"User {user_id} is already in game {other_game_id} on another shard."
+            )
+            return OTHER_GAME_PLAYER_MSG
+
+        game.add_participant(user_id)
+        return None
+
     @discord.ui.button(label="退出", style=discord.ButtonStyle.red)
+    @track_interaction("leave")
     async def leave(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.game is None:
             self.game = g.werewolf_games.get(self.game_id)
@@ -83,30 +116,42 @@ class JoinView(discord.ui.View):
             logger.warning(f"Game with ID {self.game_id} not found.")
             return
 
-        logger.info(f"User {interaction.user.id} clicked leave button.")
+        logger.debug("User %s clicked leave button.", interaction.user.id)
+        user_cache.put(interaction.user)
         try:
-            # ホストかどうか
-            if interaction.user.id == self.game.host_id:
-                await interaction.response.send_message(HOST_LEAVE_MSG, ephemeral=True)
-                logger.info(
-                    f"User {interaction.user.id} (host) attempted to leave but is not allowed."
-                )
-                return
-
-            # 参加しているか
-            if interaction.user.id not in self.game.participant_ids:
-                await interaction.response.send_message(NOT_PLAYER_MSG, ephemeral=True)
-                logger.info(
-                    f"User {interaction.user.id} tried to leave but was not in the game."
-                )
-                return
-
-            self.game.participant_ids.remove(interaction.user.id)
-            await self.game.update_recruiting_embed(interaction)
+            error = await self._submit(interaction, self._leave, interaction.user.id)
+            if error is None:
+                await self.game.update_recruiting_embed(interaction)
         except Exception as e:
             logger.error("An error occurred", exc_info=True)
             await interaction.response.send_message(ERROR_TEMPLATE + str(e))
 
+    def _leave(self, user_id: int) -> str | None:
+        """
+        参加者を取り除く。退出できない場合はその理由を返す。
+        """
+
+        game = self.game
+        assert game is not None
+
+        # 開始済みか
+        if game.is_started:
+            return ALREADY_STARTED_MSG
+
+        # ホストかどうか
+        if user_id == game.host_id:
+            logger.info(f"User {user_id} (host) attempted to leave but is not allowed.")
+            return HOST_LEAVE_MSG
+
+        # 参加しているか
+        if user_id not in game.participant_ids:
+            logger.info(f"User {user_id} tried to leave but was not in the game.")
+            return NOT_PLAYER_MSG
+
+        game.remove_participant(user_id)
+        coordinator_client.release(user_id, game.id)
+        return None
+
     @discord.ui.button(label="開始", style=discord.ButtonStyle.primary)
     async def start(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.game is None:
@@ -119,23 +164,48 @@ class JoinView(discord.ui.View):
             logger.warning(f"Game with ID {self.game_id} not found.")
             return
 
-        logger.info(f"User {interaction.user.id} clicked start button.")
+        logger.debug("User %s clicked start button.", interaction.user.id)
+        user_cache.put(interaction.user)
 
         try:
-            # ホストかどうか
-            if interaction.user.id != self.game.host_id:
-                await interaction.response.send_message(NOT_HOST_MSG, ephemeral=True)
-                logger.info(f"User {interaction.user.id} attempted to start the game.")
+            error = await self._submit(interaction, self._start, interaction.user.id)
+            if error is not None:
                 return
 
-            logger.info(f"Game {self.game.id} started by host {interaction.user.id}.")
             await self.game.update_recruiting_embed(interaction, show_view=False)
+            # 同時に進行するゲームの数と、開始時の送信の集中を抑える
+            if not await self.game.wait_for_admission():
+                return
+
+            logger.info(f"Game {self.game.id} started by host {interaction.user.id}.")
+            # ゲームの進行は受信箱の外で行い、進行中も投票などを受け付ける
             await self.game.start()
         except Exception as e:
             logger.error("An error occurred", exc_info=True)
             await interaction.response.send_message(ERROR_TEMPLATE + str(e))
 
+    def _start(self, user_id: int) -> str | None:
+        """
+        ゲームを開始済みにする。開始できない場合はその理由を返す。
+        """
+
+        game = self.game
+        assert game is not None
+
+        # ホストかどうか
+        if user_id != game.host_id:
+            logger.info(f"User {user_id} attempted to start the game.")
+            return NOT_HOST_MSG
+
+        # 2回押された場合に2回進行しないようにする
+        if game.is_started:
+            return ALREADY_STARTED_MSG
+
+        game.mark_started()
+        return None
+
     @discord.ui.button(label="中止", style=discord.ButtonStyle.grey)
+    @track_interaction("end")
     async def end(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.game is None:
             self.game = g.werewolf_games.get(self.game_id)
@@ -147,17 +217,14 @@ class JoinView(discord.ui.View):
             logger.warning(f"Game with ID {self.game_id} not found.")
             return
 
-        logger.info(f"User {interaction.user.id} clicked end button.")
+        logger.debug("User %s clicked end button.", interaction.user.id)
+        user_cache.put(interaction.user)
 
         try:
-            # ホストかどうか
-            if interaction.user.id != self.game.host_id:
-                await interaction.response.send_message(NOT_HOST_MSG, ephemeral=True)
-                logger.info(f"User {interaction.user.id} attempted to end the game.")
+            error = await self._submit(interaction, self._end, interaction.user.id)
+            if error is not None:
                 return
 
-            # 募集を中止する
-            self.game.delete()
             await interaction.response.edit_message(
                 embed=discord.Embed(
                     title="人狼ゲーム",
@@ -171,3 +238,60 @@ class JoinView(discord.ui.View):
         except Exception as e:
             logger.error("An error occurred", exc_info=True)
             await interaction.response.send_message(ERROR_TEMPLATE + str(e))
+
+    def _end(self, user_id: int) -> str | None:
+        """
+        募集を中止する。中止できない場合はその理由を返す。
+        """
+
+        game = self.game
+        assert game is not None
+
+        # ホストかどうか
+        if user_id != game.host_id:
+            logger.info(f"User {user_id} attempted to end the game.")
+            return NOT_HOST_MSG
+
+        # 進行中のゲームは中止しない。開始待ちのゲームは中止できる
+        if game.is_started and not admission.is_queued(game.id):
+            return ALREADY_STARTED_MSG
+
+        game.delete()
+        return None
+
+    def show_queued(self) -> None:
+        """
+        開始待ちの間は、中止のボタンだけを押せるようにする。
+        """
+
+        # ViewStoreに登録済みのViewから子を外すと、外した分の登録が取り除かれずに残る
+        for item in (self.join, self.leave, self.start):
+            item.disabled = True
+
+    async def _submit(
+        self,
+        interaction: discord.Interaction,
+        handler: Callable[[int], str | None | Awaitable[str | None]],
+        user_id: int,
+    ) -> str | None:
+        """
+        ゲームの受信箱で処理を行う。
+        処理が理由を返した場合や受信箱に入れられなかった場合は、その旨をエフェメラルで返信する。
+
+        Returns
+        -------
+        str | None
+            処理できなかった理由。処理できた場合はNone。
+        """
+
+        assert self.game is not None
+        try:
+            error = await self.game.inbox.call(lambda: handler(user_id))
+        except InboxFull:
+            error = INBOX_FULL_MSG
+        except InboxClosed:
+            error = GAME_NOT_FOUND_MSG
+
+        if error is not None:
+            await interaction.response.send_message(error, ephemeral=True)
+        return error
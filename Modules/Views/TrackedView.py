@@ -0,0 +1,49 @@
+from typing import Any
+
+import discord
+
+
+class TrackedView(discord.ui.View):
+    """
+    ゲームが作るViewの基底クラス。
+    登録されたメッセージをすべて記録し、release()でクライアントのViewStoreから取り除く。
+
+    discord.pyのViewは、同じViewを複数のメッセージ(全員へのDMや、インタラクションの応答と
+    その後の編集)に付けると、最後のメッセージの分しかstop()で取り除かれない。
+    残った登録はViewとその先のゲームを参照し続けるため、ゲームの終了時にはrelease()を呼ぶ。
+    """
+
+    def __init__(self, *, timeout: float | None = None):
+        self.__cache_keys: set[int | None] = set()
+        self._store: Any = None
+        super().__init__(timeout=timeout)
+
+    @property
+    def _cache_key(self) -> int | None:
+        return self.__cache_key
+
+    @_cache_key.setter
+    def _cache_key(self, key: int | None) -> None:
+        # ViewStore.add_viewが登録のたびに設定する
+        self.__cache_key = key
+        self.__cache_keys.add(key)
+
+    def _start_listening_from_store(self, store: Any) -> None:
+        super()._start_listening_from_store(store)
+        self._store = store
+
+    def release(self) -> None:
+        """
+        Viewを止め、登録されたすべてのメッセージからViewStoreの登録を取り除く。
+        """
+
+        self.stop()
+        store, self._store = self._store, None
+        if store is None:
+            return
+
+        # stop()で取り除かれるのは最後に登録されたメッセージの分だけ
+        for key in self.__cache_keys:
+            self.__cache_key = key
+            store.remove_view(self)
+        self.__cache_keys.clear()
@@ -0,0 +1,307 @@
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Final
+
+from Modules.logger import make_logger
+from Modules.metrics import metrics, rest_rate
+
+# プロセス全体で同時に進行できるゲームの数
+MAX_RUNNING_GAMES: Final = int(os.getenv("MAX_RUNNING_GAMES", "100"))
+# 1つのギルドで同時に進行できるゲームの数
+MAX_GUILD_GAMES: Final = int(os.getenv("MAX_GUILD_GAMES", "5"))
+# 1つのギルドで同時に開ける募集(開始待ちを含む)の数
+MAX_GUILD_LOBBIES: Final = int(os.getenv("MAX_GUILD_LOBBIES", "10"))
+# ボット全体で1秒あたりに送れるRESTリクエストの数(Discordのグローバルレート制限)
+REST_BUDGET: Final = float(os.getenv("REST_BUDGET", "50"))
+# ゲーム開始時にプレイヤー1人あたりに送るリクエストの見積もり(ユーザーの取得・DMチャンネル・役職の通知)
+START_REQUESTS_PER_PLAYER: Final = 3
+# 他の送信で予算が埋まっていても、開始に使える最低限の割合
+MIN_START_SHARE: Final = 0.2
+# 429を受けてからこの秒数の間は、開始の間隔を倍にする
+RATE_LIMIT_COOLDOWN: Final = 5.0
+
+logger = make_logger("Admission")
+
+admission_rejected = metrics.counter(
+    "game_admission_rejected_total",
+    "Games refused by admission control",
+    ("reason",),
+)
+admission_wait = metrics.histogram(
+    "game_admission_wait_seconds",
+    "Time a started game waited for a slot and the start pacing",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+
+PositionCallback = Callable[[int], None]
+
+
+@dataclass(eq=False)
+class _Ticket:
+    game_id: int
+    guild_id: int | None
+    on_position: PositionCallback | None
+    granted: asyncio.Future[bool] = field(repr=False)
+    position: int = 0
+
+
+class AdmissionController:
+    """
+    同時に進行するゲームの数を、プロセス全体とギルドごとに制限するクラス。
+
+    - 募集(/werewolf)はギルドごとの上限を超えると断る
+    - 開始は枠が空くまで届いた順に待たせ、待っている間の順番を通知する
+    - 枠が空いても、直近の送信量から見た余裕に合わせて開始の間隔をあける
+
+    ゲームの開始時には参加者全員へのDMなどでリクエストがまとまって発生するため、
+    同時に開始すると他のゲームの送信までレート制限を受ける。
+
+    Parameters
+    ----------
+    max_running : int
+        プロセス全体で同時に進行できるゲームの数
+    max_guild_running : int
+        1つのギルドで同時に進行できるゲームの数
+    max_guild_lobbies : int
+        1つのギルドで同時に開ける募集の数
+    rest_budget : float
+        1秒あたりに送れるRESTリクエストの数
+    """
+
+    def __init__(
+        self,
+        max_running: int = MAX_RUNNING_GAMES,
+        max_guild_running: int = MAX_GUILD_GAMES,
+        max_guild_lobbies: int = MAX_GUILD_LOBBIES,
+        rest_budget: float = REST_BUDGET,
+    ):
+        self.max_running = max_running
+        self.max_guild_running = max_guild_running
+        self.max_guild_lobbies = max_guild_lobbies
+        self.rest_budget = rest_budget
+
+        # ゲームID -> ギルドID
+        self._lobbies: dict[int, int | None] = {}
+        self._running: dict[int, int | None] = {}
+        self._guild_lobbies: Counter[int | None] = Counter()
+        self._guild_running: Counter[int | None] = Counter()
+        self._queue: deque[_Ticket] = deque()
+        # 開始待ちのゲームのID。中止や削除のたびに待ち行列をたどらないよう、出入りのたびに更新する
+        self._queued_ids: set[int] = set()
+
+        # 次の開始を許可する時刻(time.monotonic)
+        self._next_start_at = 0.0
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def is_queued(self, game_id: int) -> bool:
+        """
+        ゲームが開始待ちかどうか。
+        """
+
+        return game_id in self._queued_ids
+
+    def open_lobby(self, game_id: int, guild_id: int | None) -> bool:
+        """
+        募集を登録する。ギルドの募集が上限に達している場合はFalseを返す。
+        """
+
+        lobbies = self._guild_lobbies[guild_id]
+        if guild_id is not None and lobbies >= self.max_guild_lobbies:
+            admission_rejected.inc("guild_lobbies")
+            return False
+
+        self._lobbies[game_id] = guild_id
+        self._guild_lobbies[guild_id] += 1
+        return True
+
+    def _has_slot(self, guild_id: int | None) -> bool:
+        if len(self._running) >= self.max_running:
+            return False
+        if guild_id is None:
+            return True
+        return self._guild_running[guild_id] < self.max_guild_running
+
+    def _admit(self, game_id: int, guild_id: int | None) -> None:
+        self._running[game_id] = guild_id
+        self._guild_running[guild_id] += 1
+
+    def admit_resumed(self, game_id: int, guild_id: int | None) -> None:
+        """
+        再起動前から進行中だったゲームを、上限に関係なく進行中として登録する。
+        """
+
+        self._close_lobby(game_id)
+        if game_id not in self._running:
+            self._admit(game_id, guild_id)
+
+    def _close_lobby(self, game_id: int) -> None:
+        if game_id in self._lobbies:
+            guild_id = self._lobbies.pop(game_id)
+            self._guild_lobbies[guild_id] -= 1
+            if self._guild_lobbies[guild_id] <= 0:
+                del self._guild_lobbies[guild_id]
+
+    def start_cost(self, players: int) -> float:
+        """
+        ゲームの開始で送るリクエストの数の見積もり。
+        """
+
+        return START_REQUESTS_PER_PLAYER * players
+
+    def _start_delay(self, cost: float) -> float:
+        """
+        開始を許可するまでの秒数を決め、次の開始の時刻を進める。
+        他の送信に使われていない分を開始に回し、429を受けた直後は間隔を倍にする。
+        """
+
+        spare = max(
+            self.rest_budget * MIN_START_SHARE, self.rest_budget - rest_rate.rate()
+        )
+        if rest_rate.rate_limited_within(RATE_LIMIT_COOLDOWN):
+            spare /= 2
+
+        now = time.monotonic()
+        start_at = max(now, self._next_start_at)
+        self._next_start_at = start_at + cost / spare
+        return start_at - now
+
+    async def acquire(
+        self,
+        game_id: int,
+        guild_id: int | None,
+        players: int,
+        on_position: PositionCallback | None = None,
+    ) -> bool:
+        """
+        ゲームを開始してよくなるまで待つ。
+        枠が空くまでは届いた順に待ち、順番が変わるたびにon_positionを呼ぶ。
+
+        Parameters
+        ----------
+        game_id : int
+            ゲームのID
+        guild_id : int | None
+            ゲームのギルドのID
+        players : int
+            参加人数。開始の間隔を決めるのに使う。
+        on_position : PositionCallback | None
+            開始待ちの順番(1から)を受け取る関数
+
+        Returns
+        -------
+        bool
+            開始してよい場合はTrue。待っている間にゲームが取り除かれた場合はFalse。
+        """
+
+        started = time.monotonic()
+        self._close_lobby(game_id)
+
+        if not self._queue and self._has_slot(guild_id):
+            self._admit(game_id, guild_id)
+        else:
+            ticket = _Ticket(
+                game_id,
+                guild_id,
+                on_position,
+                asyncio.get_running_loop().create_future(),
+            )
+            self._queue.append(ticket)
+            self._queued_ids.add(game_id)
+            # 先に待っているゲームがギルドの上限で入れない場合は、このゲームが先に入れる
+            self._grant()
+            if not ticket.granted.done():
+                logger.info(
+                    f"Game {game_id} queued for start (position {ticket.position})"
+                )
+            try:
+                if not await ticket.granted:
+                    return False
+            except asyncio.CancelledError:
+                self.release(game_id)
+                raise
+
+        delay = self._start_delay(self.start_cost(players))
+        if delay > 0:
+            logger.info(f"Game {game_id} start delayed {delay:.2f}s to pace requests")
+            await asyncio.sleep(delay)
+        admission_wait.observe(time.monotonic() - started)
+        return True
+
+    def _notify_positions(self) -> None:
+        for position, ticket in enumerate(self._queue, 1):
+            if ticket.position != position:
+                ticket.position = position
+                if ticket.on_position is not None:
+                    ticket.on_position(position)
+
+    def _grant(self) -> None:
+        """
+        空いた枠を、待っているゲームに届いた順に割り当てる。
+        ギルドの上限で入れないゲームは飛ばし、後ろのゲームを先に入れる。
+        """
+
+        if not self._queue:
+            return
+
+        waiting: deque[_Ticket] = deque()
+        while self._queue:
+            ticket = self._queue.popleft()
+            if ticket.granted.done():
+                self._queued_ids.discard(ticket.game_id)
+                continue
+            if self._has_slot(ticket.guild_id):
+                self._queued_ids.discard(ticket.game_id)
+                self._admit(ticket.game_id, ticket.guild_id)
+                ticket.granted.set_result(True)
+            else:
+                waiting.append(ticket)
+        self._queue = waiting
+        self._notify_positions()
+
+    def release(self, game_id: int) -> None:
+        """
+        ゲームの募集・開始待ち・進行の登録を取り除き、空いた枠を割り当てる。
+        """
+
+        self._close_lobby(game_id)
+
+        if game_id in self._queued_ids:
+            self._queued_ids.discard(game_id)
+            for ticket in self._queue:
+                if ticket.game_id == game_id:
+                    if not ticket.granted.done():
+                        ticket.granted.set_result(False)
+                    self._queue.remove(ticket)
+                    break
+
+        if game_id in self._running:
+            guild_id = self._running.pop(game_id)
+            self._guild_running[guild_id] -= 1
+            if self._guild_running[guild_id] <= 0:
+                del self._guild_running[guild_id]
+
+        self._grant()
+
+
+admission = AdmissionController()
+
+metrics.gauge(
+    "game_admission_games",
+    "Games held by admission control by state",
+    ("state",),
+    collect=lambda: {
+        ("running",): admission.running,
+        ("queued",): admission.queued,
+    },
+)
@@ -0,0 +1,279 @@
+import asyncio
+import atexit
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Final
+
+from Modules.logger import make_logger
+from Modules.metrics import metrics
+
+CHECKPOINT_PATH: Final = os.getenv("CHECKPOINT_PATH", "Data/checkpoint.db")
+# 書き込みをまとめる間隔(秒)。この間に保存されたスナップショットは1回のトランザクションで書く
+CHECKPOINT_FLUSH_INTERVAL: Final = float(os.getenv("CHECKPOINT_FLUSH_INTERVAL", "0.5"))
+
+logger = make_logger("Checkpoint")
+
+checkpoint_writes = metrics.histogram(
+    "checkpoint_write_seconds", "Time spent writing a batch of checkpoints"
+)
+checkpoint_size = metrics.histogram(
+    "checkpoint_size_bytes",
+    "Size of each game snapshot written to the checkpoint database",
+    buckets=(512, 1024, 2048, 4096, 8192, 16384, 32768, 65536),
+)
+checkpoint_saved = metrics.counter(
+    "checkpoint_saved_total", "Game snapshots written to the checkpoint database"
+)
+
+_SCHEMA: Final = """
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY,
+    phase TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class CheckpointStore:
+    """
+    ゲームのスナップショットをSQLite(WALモード)に保存するクラス。
+    保存の要求はゲームごとに最新のものだけを保持し、一定間隔でまとめて書き込む。
+    ディスクへの書き込みは専用のスレッドで行うため、イベントループは止まらない。
+
+    open()するまでは何も保存しないため、シミュレーションなどでは無効のまま使える。
+
+    Parameters
+    ----------
+    path : str
+        データベースファイルのパス
+    flush_interval : float
+        書き込みをまとめる間隔(秒)
+
+    Attributes
+    ----------
+    flushes : int
+        書き込みを行った回数
+    saved : int
+        書き込んだスナップショットの数
+    bytes_written : int
+        書き込んだスナップショットの合計バイト数
+    last_size : int
+        最後に書き込んだスナップショットのバイト数
+    write_latencies : deque[float]
+        各書き込みにかかった秒数
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_PATH,
+        flush_interval: float = CHECKPOINT_FLUSH_INTERVAL,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+
+        self.flushes = 0
+        self.saved = 0
+        self.bytes_written = 0
+        self.last_size = 0
+        self.write_latencies: deque[float] = deque(maxlen=1000)
+
+        self._conn: sqlite3.Connection | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        # 値がNoneのものは削除を表す
+        self._pending: dict[int, tuple[str, dict[str, Any]] | None] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._conn is not None
+
+    def _connect(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WALではNORMALでもクラッシュ時に壊れない。電源断では最後の書き込みだけ失われうる
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SCHEMA)
+        conn.commit()
+        self._conn = conn
+
+    def open(self) -> None:
+        """
+        データベースを開き、保存を有効にする。すでに開いている場合は何もしない。
+        """
+
+        if self.is_open:
+            return
+
+        # 接続は書き込み用のスレッドだけで使う
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="checkpoint"
+        )
+        self._executor.submit(self._connect).result()
+        atexit.register(self.close)
+        logger.info(f"Opened checkpoint database {self.path}")
+
+    def _load(self) -> list[tuple[int, str, dict[str, Any]]]:
+        assert self._conn is not None
+        rows = self._conn.execute("SELECT id, phase, state FROM games").fetchall()
+        return [(int(id), phase, json.loads(state)) for id, phase, state in rows]
+
+    async def load_all(self) -> list[tuple[int, str, dict[str, Any]]]:
+        """
+        保存されているスナップショットをすべて読み込む。
+
+        Returns
+        -------
+        list[tuple[int, str, dict[str, Any]]]
+            ゲームID、フェーズ、スナップショットの組のリスト
+        """
+
+        if not self.is_open:
+            return []
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._load)
+
+    def save(self, game_id: int, phase: str, state: dict[str, Any]) -> None:
+        """
+        スナップショットの保存を予約する。
+        同じゲームの未書き込みのスナップショットは新しいもので置き換える。
+
+        Parameters
+        ----------
+        game_id : int
+            ゲームのID
+        phase : str
+            再開するフェーズ
+        state : dict[str, Any]
+            JSONに変換できるスナップショット
+        """
+
+        if not self.is_open:
+            return
+
+        self._pending[game_id] = (phase, state)
+        self._schedule_flush()
+
+    def discard(self, game_id: int) -> None:
+        """
+        スナップショットの削除を予約する。
+        """
+
+        if not self.is_open:
+            return
+
+        self._pending[game_id] = None
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        # 書き込み中に届いた保存と削除は、このタスクが動いている間は新しく予約されないため続けて書く
+        while self._pending and self.is_open:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        予約されている保存と削除をすぐに書き込む。
+        """
+
+        if not self._pending or not self.is_open:
+            return
+
+        batch, self._pending = self._pending, {}
+        loop = asyncio.get_running_loop()
+        try:
+            sizes, elapsed = await loop.run_in_executor(
+                self._executor, self._write, batch
+            )
+        except Exception:
+            logger.error(f"Failed to write {len(batch)} checkpoints", exc_info=True)
+            return
+
+        # メトリクスはイベントループのスレッドで更新する
+        checkpoint_writes.observe(elapsed)
+        checkpoint_saved.inc(amount=len(sizes))
+        for size in sizes:
+            checkpoint_size.observe(size)
+
+    def _write(
+        self, batch: dict[int, tuple[str, dict[str, Any]] | None]
+    ) -> tuple[list[int], float]:
+        """
+        スナップショットを書き込み、書き込んだそれぞれのバイト数とかかった秒数を返す。
+        """
+
+        assert self._conn is not None
+        start = time.perf_counter()
+
+        rows = []
+        deleted = []
+        sizes: list[int] = []
+        size = 0
+        now = time.time()
+        for game_id, entry in batch.items():
+            if entry is None:
+                deleted.append((str(game_id),))
+                continue
+            phase, state = entry
+            data = json.dumps(state, ensure_ascii=False, separators=(",", ":"))
+            size = len(data.encode())
+            sizes.append(size)
+            self.bytes_written += size
+            rows.append((str(game_id), phase, data, now))
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO games (id, phase, state, updated_at)"
+                " VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.executemany("DELETE FROM games WHERE id = ?", deleted)
+
+        elapsed = time.perf_counter() - start
+        self.flushes += 1
+        self.saved += len(rows)
+        if rows:
+            self.last_size = size
+        self.write_latencies.append(elapsed)
+        logger.debug(
+            f"Wrote {len(rows)} checkpoints and deleted {len(deleted)}"
+            f" in {elapsed * 1000:.1f}ms (last {size} bytes)"
+        )
+        return sizes, elapsed
+
+    def close(self) -> None:
+        """
+        残っている保存を書き込み、データベースを閉じる。
+        イベントループが止まった後でも呼べる。
+        """
+
+        if not self.is_open or self._executor is None:
+            return
+
+        # 終了時はスレッドプールが先に止められているため、書き込みを待ってからこのスレッドで書く
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+        batch, self._pending = self._pending, {}
+        if batch:
+            self._write(batch)
+
+        conn, self._conn = self._conn, None
+        conn.close()  # type: ignore[union-attr]
+        atexit.unregister(self.close)
+
+
+checkpoint_store = CheckpointStore()
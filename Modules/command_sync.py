@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Final
+
+from discord import app_commands
+
+from Modules.logger import make_logger
+
+COMMAND_HASH_PATH: Final = os.getenv("COMMAND_HASH_PATH", "Data/command_tree.sha256")
+
+logger = make_logger("CommandSync")
+
+
+async def command_tree_hash(tree: app_commands.CommandTree) -> str:
+    """
+    同期の際にDiscordへ送る内容からハッシュを計算する。
+    選択肢の翻訳済みの名前や、翻訳機能によるローカライズも含まれる。
+
+    Parameters
+    ----------
+    tree : app_commands.CommandTree
+        コマンドツリー
+
+    Returns
+    -------
+    str
+        SHA-256の16進数表記
+    """
+
+    commands = tree.get_commands()
+    translator = tree.translator
+    if translator is not None:
+        payload = [
+            await command.get_translated_payload(tree, translator)
+            for command in commands
+        ]
+    else:
+        payload = [command.to_dict(tree) for command in commands]
+
+    data: dict[str, Any] = {
+        # 別のボットのトークンで起動した場合も同期し直す
+        "application_id": tree.client.application_id,
+        "commands": sorted(payload, key=lambda c: (c.get("type", 1), c["name"])),
+    }
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _write(path: str, digest: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(digest)
+
+
+async def sync_if_changed(
+    tree: app_commands.CommandTree, path: str = COMMAND_HASH_PATH
+) -> bool:
+    """
+    前回同期したときからコマンドツリーが変わっている場合だけ同期する。
+    グローバルコマンドの同期は遅く、厳しいレート制限があるため、起動のたびには行わない。
+
+    Parameters
+    ----------
+    tree : app_commands.CommandTree
+        コマンドツリー
+    path : str
+        前回同期したときのハッシュを保存するファイル
+
+    Returns
+    -------
+    bool
+        同期した場合はTrue
+    """
+
+    digest = await command_tree_hash(tree)
+    if await asyncio.to_thread(_read, path) == digest:
+        logger.info(f"Command tree unchanged ({digest[:12]}), skipping sync")
+        return False
+
+    synced = await tree.sync()
+    # 同期に成功してから保存し、失敗した場合は次回の起動で再び同期する
+    await asyncio.to_thread(_write, path, digest)
+    logger.info(f"Synced {len(synced)} commands ({digest[:12]})")
+    return True
@@ -0,0 +1,218 @@
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from dataclasses import dataclass, field
+from typing import Any, Final, Generic, TypeVar
+
+import aiohttp
+import discord
+
+from Modules.logger import make_logger
+from Modules.metrics import metrics
+
+T = TypeVar("T")
+
+DM_CONCURRENCY: Final = int(os.getenv("DM_CONCURRENCY", "5"))
+DM_RETRIES: Final = int(os.getenv("DM_RETRIES", "3"))
+RETRY_BASE_DELAY: Final = 0.5
+
+logger = make_logger("Dispatcher")
+
+dispatch_latency = metrics.histogram(
+    "discord_dispatch_seconds",
+    "Time to deliver each message of a broadcast, including retries",
+    ("result",),
+)
+
+
+@dataclass
+class DispatchResult(Generic[T]):
+    """
+    一斉送信の結果を保持するクラス。
+
+    Attributes
+    ----------
+    sent : list[T]
+        送信に成功した宛先のリスト
+    failed : list[tuple[T, BaseException]]
+        送信に失敗した宛先と、その原因となった例外のリスト
+    """
+
+    sent: list[T] = field(default_factory=list)
+    failed: list[tuple[T, BaseException]] = field(default_factory=list)
+
+    @property
+    def failed_targets(self) -> list[T]:
+        return [target for target, _ in self.failed]
+
+
+class Dispatcher:
+    """
+    DMなどの送信を同時実行数を制限しながら並行に行うクラス。
+    レート制限を受けたルートはそのルートだけ待機し、失敗した送信は再試行する。
+
+    Parameters
+    ----------
+    concurrency : int
+        同時に実行する送信の上限
+    retries : int
+        送信に失敗したときの再試行回数
+    """
+
+    def __init__(self, concurrency: int = DM_CONCURRENCY, retries: int = DM_RETRIES):
+        self.concurrency = concurrency
+        self.retries = retries
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._route_resume_at: dict[Hashable, float] = {}
+
+    async def _wait_route(self, route: Hashable) -> None:
+        resume_at = self._route_resume_at.get(route)
+        if resume_at is None:
+            return
+
+        delay = resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            self._route_resume_at.pop(route, None)
+
+    def _backoff(self, route: Hashable, delay: float) -> None:
+        now = time.monotonic()
+        # 一度だけ待機したルートが残り続けないよう、期限切れのものを取り除く
+        expired = [r for r, at in self._route_resume_at.items() if at <= now]
+        for r in expired:
+            del self._route_resume_at[r]
+
+        resume_at = now + delay
+        self._route_resume_at[route] = max(
+            resume_at, self._route_resume_at.get(route, 0.0)
+        )
+
+    def _forget_route(self, route: Hashable) -> None:
+        resume_at = self._route_resume_at.get(route)
+        # 並行する送信が新しく設定した待機は残す
+        if resume_at is not None and resume_at <= time.monotonic():
+            del self._route_resume_at[route]
+
+    @staticmethod
+    def _retry_delay(error: BaseException, attempt: int) -> float | None:
+        """
+        再試行までの待機秒数を返す。再試行すべきでない場合はNoneを返す。
+        """
+
+        if isinstance(error, discord.RateLimited):
+            return error.retry_after
+
+        if isinstance(error, discord.HTTPException):
+            if error.status == 429:
+                retry_after = error.response.headers.get("Retry-After")
+                try:
+                    return float(retry_after)
+                except (TypeError, ValueError):
+                    return RETRY_BASE_DELAY * 2**attempt
+            if error.status >= 500:
+                return RETRY_BASE_DELAY * 2**attempt
+            # 403(DM拒否)などは再試行しても成功しない
+            return None
+
+        if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError)):
+            return RETRY_BASE_DELAY * 2**attempt
+
+        return None
+
+    async def send(self, route: Hashable, send: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        1件の送信を行う。レート制限やサーバーエラーの場合は再試行する。
+
+        Parameters
+        ----------
+        route : Hashable
+            レート制限を管理する単位(DMなら宛先のユーザーID)
+        send : Callable[[], Awaitable[Any]]
+            実際に送信を行うコルーチンを返す関数
+
+        Returns
+        -------
+        Any
+            sendの戻り値
+        """
+
+        attempt = 0
+        while True:
+            await self._wait_route(route)
+
+            async with self._semaphore:
+                try:
+                    result = await send()
+                except (
+                    discord.HTTPException,
+                    discord.RateLimited,
+                    aiohttp.ClientError,
+                    asyncio.TimeoutError,
+                    OSError,
+                ) as e:
+                    error = e
+                else:
+                    self._forget_route(route)
+                    return result
+
+            delay = self._retry_delay(error, attempt)
+            if delay is None or attempt >= self.retries:
+                raise error
+
+            logger.warning(
+                f"Send to {route} failed ({error}). Retrying in {delay:.2f}s."
+            )
+            self._backoff(route, delay)
+            attempt += 1
+
+    async def send_all(
+        self,
+        targets: Iterable[T],
+        send: Callable[[T], Awaitable[Any]],
+        route: Callable[[T], Hashable] = lambda target: getattr(target, "id", target),
+    ) -> DispatchResult[T]:
+        """
+        複数の宛先に並行して送信する。
+        失敗した宛先があっても他の送信は中断せず、結果として返す。
+        宛先ごとに再試行を含めて届くまでの秒数をdiscord_dispatch_secondsに記録する。
+
+        Parameters
+        ----------
+        targets : Iterable[T]
+            宛先のリスト
+        send : Callable[[T], Awaitable[Any]]
+            宛先を受け取り、送信を行うコルーチンを返す関数
+        route : Callable[[T], Hashable]
+            宛先からレート制限の単位を求める関数
+
+        Returns
+        -------
+        DispatchResult[T]
+            送信結果
+        """
+
+        result: DispatchResult[T] = DispatchResult()
+
+        async def run(target: T) -> None:
+            start = time.monotonic()
+            try:
+                await self.send(route(target), lambda: send(target))
+            except Exception as e:
+                elapsed = time.monotonic() - start
+                dispatch_latency.observe(elapsed, "failed")
+                logger.warning(
+                    f"Failed to send to {route(target)} after {elapsed:.2f}s: {e}"
+                )
+                result.failed.append((target, e))
+            else:
+                dispatch_latency.observe(time.monotonic() - start, "sent")
+                result.sent.append(target)
+
+        await asyncio.gather(*(run(target) for target in targets))
+        return result
+
+
+dispatcher = Dispatcher()
@@ -0,0 +1,115 @@
+import asyncio
+import os
+from collections.abc import Callable
+from typing import Any, Final
+
+import discord
+
+from Modules.logger import make_logger
+
+EDIT_WINDOW: Final = float(os.getenv("EDIT_WINDOW", "0.5"))
+
+logger = make_logger("EditCoalescer")
+
+
+class EditCoalescer:
+    """
+    1つのメッセージへの編集をまとめるクラス。
+    一定時間内に来た編集要求は最後のものだけを反映し、
+    内容が前回から変わっていない場合は編集しない。
+
+    Parameters
+    ----------
+    message : discord.PartialMessage
+        編集対象のメッセージ。取得せずに編集するため部分メッセージを使う。
+    window : float
+        編集要求をまとめる時間(秒)
+
+    Attributes
+    ----------
+    edits : int
+        実際に行った編集の回数
+    skipped : int
+        内容が変わっていなかったため省略した編集の回数
+    """
+
+    def __init__(self, message: discord.PartialMessage, window: float = EDIT_WINDOW):
+        self.message = message
+        self.window = window
+        self.edits = 0
+        self.skipped = 0
+
+        self._render: Callable[[], dict[str, Any]] | None = None
+        self._task: asyncio.Task | None = None
+        self._last_fingerprint: tuple | None = None
+
+    @staticmethod
+    def _fingerprint(kwargs: dict[str, Any]) -> tuple:
+        embed = kwargs.get("embed")
+        return (
+            kwargs.get("content"),
+            embed.to_dict() if embed is not None else None,
+            id(kwargs.get("view")),
+        )
+
+    def mark_sent(self, **kwargs: Any) -> None:
+        """
+        インタラクションの応答など、他の経路で反映した内容を記録する。
+        同じ内容の編集要求が残っていれば、それは省略される。
+        """
+
+        self._last_fingerprint = self._fingerprint(kwargs)
+
+    def request(self, render: Callable[[], dict[str, Any]]) -> asyncio.Future[None]:
+        """
+        編集を要求する。実際の編集は一定時間後にまとめて行う。
+
+        Parameters
+        ----------
+        render : Callable[[], dict[str, Any]]
+            message.editに渡す引数を返す関数。編集の直前に呼ばれる。
+
+        Returns
+        -------
+        asyncio.Future[None]
+            編集が反映されたときに完了するFuture。
+            編集は要求をまとめた全員で共有するため、待っている1人がキャンセルされても編集は止まらない。
+        """
+
+        self._render = render
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+        return asyncio.shield(self._task)
+
+    async def _flush_later(self) -> None:
+        # 編集の途中に来た要求は、同じタスクで次の区切りにまとめて反映する
+        while True:
+            await asyncio.sleep(self.window)
+
+            render, self._render = self._render, None
+            if render is None:
+                return
+
+            kwargs = render()
+            fingerprint = self._fingerprint(kwargs)
+            if fingerprint == self._last_fingerprint:
+                self.skipped += 1
+            else:
+                await self.message.edit(**kwargs)
+                self._last_fingerprint = fingerprint
+                self.edits += 1
+                logger.debug(
+                    f"Edited message {self.message.id} "
+                    f"(edits={self.edits}, skipped={self.skipped})"
+                )
+
+            if self._render is None:
+                return
+
+    def cancel(self) -> None:
+        """
+        まだ反映していない編集を取り消す。
+        """
+
+        # 待機中のタスクを待っている呼び出し元があるため、タスク自体は止めない
+        self._render = None
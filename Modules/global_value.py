@@ -1,3 +1,3 @@
-from Game.Werewolf.game import WerewolfGame
+from Modules.registry import GameRegistry
 
-werewolf_games: dict[int, WerewolfGame] = {}
+werewolf_games: GameRegistry = GameRegistry()
@@ -0,0 +1,141 @@
+import asyncio
+import inspect
+import os
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any, Final, TypeVar
+
+from Modules.logger import make_logger
+from Modules.metrics import metrics
+
+GAME_INBOX_SIZE: Final = int(os.getenv("GAME_INBOX_SIZE", "64"))
+# 受信箱に入れられなかったときの返信
+INBOX_FULL_MSG: Final = "操作が混み合っています。少し待ってからもう一度お試しください。"
+
+T = TypeVar("T")
+
+logger = make_logger("Inbox")
+
+inbox_messages = metrics.counter(
+    "game_inbox_messages_total", "Messages processed by game inboxes"
+)
+inbox_rejected = metrics.counter(
+    "game_inbox_rejected_total",
+    "Messages rejected because the game inbox was full or closed",
+    ("reason",),
+)
+inbox_wait = metrics.histogram(
+    "game_inbox_wait_seconds", "Time messages waited in a game inbox before running"
+)
+
+
+class InboxFull(Exception):
+    """
+    受信箱に処理待ちのメッセージが多すぎる。
+    """
+
+
+class InboxClosed(Exception):
+    """
+    ゲームが削除され、受信箱が閉じられている。
+    """
+
+
+class Inbox:
+    """
+    1つのゲームへの操作を、届いた順に1つずつ処理する受信箱。
+    ゲームの状態を変える処理は受信箱を通すことで、他の操作と交互に実行されない。
+
+    処理待ちのメッセージがあるときだけタスクが動き、空になると止まるため、
+    ゲームがいくつあっても待機中のタスクは増えない。
+    応答の送信のように待ち時間の長い処理は、受信箱の外で行う。
+
+    Parameters
+    ----------
+    name : str
+        ログに使う名前
+    maxsize : int
+        処理待ちにできるメッセージの数。超えた場合はInboxFullを送出する。
+    """
+
+    def __init__(self, name: str, maxsize: int = GAME_INBOX_SIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self.closed = False
+
+        self._messages: deque[tuple[Callable[[], Any], asyncio.Future[Any], float]] = (
+            deque()
+        )
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def call(self, handler: Callable[[], T | Awaitable[T]]) -> asyncio.Future[T]:
+        """
+        メッセージを受信箱に入れる。
+
+        Parameters
+        ----------
+        handler : Callable[[], T | Awaitable[T]]
+            受信箱の順番で実行する関数。コルーチン関数でもよい。
+
+        Returns
+        -------
+        asyncio.Future[T]
+            handlerの戻り値か例外を受け取るFuture
+
+        Raises
+        ------
+        InboxClosed
+            受信箱が閉じられている場合
+        InboxFull
+            処理待ちのメッセージが上限に達している場合
+        """
+
+        if self.closed:
+            inbox_rejected.inc("closed")
+            raise InboxClosed(self.name)
+        if len(self._messages) >= self.maxsize:
+            inbox_rejected.inc("full")
+            logger.warning(f"Inbox {self.name} is full ({self.maxsize} messages)")
+            raise InboxFull(self.name)
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[T] = loop.create_future()
+        self._messages.append((handler, future, loop.time()))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._messages:
+            handler, future, queued_at = self._messages.popleft()
+            if future.done():
+                # 呼び出し元が待つのをやめた
+                continue
+
+            inbox_wait.observe(loop.time() - queued_at)
+            inbox_messages.inc()
+            try:
+                result = handler()
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    def close(self) -> None:
+        """
+        受信箱を閉じる。処理待ちのメッセージにはInboxClosedを渡す。
+        """
+
+        self.closed = True
+        while self._messages:
+            _, future, _ = self._messages.popleft()
+            if not future.done():
+                future.set_exception(InboxClosed(self.name))
@@ -1,8 +1,21 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import random
+import sys
 from logging import LoggerAdapter, getLogger
+from logging.handlers import QueueHandler, QueueListener
+from typing import Final
 
 from rich.logging import RichHandler
 
+# rich: 開発用のコンソール出力, json: 本番用のJSON Lines出力
+LOG_FORMAT: Final = os.getenv("LOG_FORMAT", "rich")
+LOG_LEVEL: Final = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_SAMPLE_RATE: Final = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
 
 class CustomFormatter(logging.Formatter):
     def format(self, record):
@@ -16,14 +29,127 @@ class CustomFormatter(logging.Formatter):
         return message.replace("[ ]", "").replace("[]", "")
 
 
-def make_logger(name: str, id: int | None = None, level=logging.DEBUG) -> LoggerAdapter:
+class JsonFormatter(logging.Formatter):
+    """
+    1レコードを1行のJSONとして出力するフォーマッタ。
+    """
+
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "name": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "id", None) is not None:
+            data["id"] = record.id
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    レコードを整形せずにキューへ渡すハンドラ。
+    整形はリスナースレッドで行うため、イベントループ上ではキューに積むだけで済む。
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    WARNING未満のレコードを指定した割合だけ通すフィルタ。
+
+    Parameters
+    ----------
+    rate : float
+        通す割合(0.0~1.0)
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_queue_handler: LazyQueueHandler | None = None
+_listener: QueueListener | None = None
+
+
+def _make_output_handler() -> logging.Handler:
+    if LOG_FORMAT == "json":
+        handler: logging.Handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler = RichHandler(rich_tracebacks=True, markup=True)
+        handler.setFormatter(
+            CustomFormatter("[magenta]%(name)s[/magenta][%(id)s] %(message)s")
+        )
+    return handler
+
+
+def _get_queue_handler() -> LazyQueueHandler:
+    """
+    共有のキューハンドラを返す。初回呼び出し時にリスナースレッドを開始する。
+    """
+
+    global _queue_handler, _listener
+
+    if _queue_handler is None:
+        _queue_handler = LazyQueueHandler(_queue)
+        _listener = QueueListener(
+            _queue, _make_output_handler(), respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(_listener.stop)
+
+    return _queue_handler
+
+
+def make_logger(
+    name: str,
+    id: int | None = None,
+    level: int | str | None = None,
+    sample_rate: float | None = None,
+) -> LoggerAdapter:
+    """
+    ロガーを作成する。出力はキューを経由して別スレッドで行われる。
+
+    Parameters
+    ----------
+    name : str
+        ロガーの名前
+    id : int | None
+        ログに付与するID
+    level : int | str | None
+        ログレベル。Noneの場合は環境変数LOG_LEVELに従う。
+    sample_rate : float | None
+        WARNING未満のログを出力する割合。クリックごとのログなど頻度の高いロガーに使う。
+        同じ名前のロガーで共有され、指定するたびに最後の値で置き換わる。Noneの場合は変えない。
+    """
+
     logger = getLogger(name)
-    logger.setLevel(level)
+    if level is not None:
+        logger.setLevel(level)
+    elif logger.level == logging.NOTSET:
+        logger.setLevel(LOG_LEVEL)
 
     if not logger.handlers:
-        handler = RichHandler(rich_tracebacks=True, markup=True)
-        formatter = CustomFormatter("[magenta]%(name)s[/magenta][%(id)s] %(message)s")
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.addHandler(_get_queue_handler())
+
+    if sample_rate is not None:
+        sampling = next(
+            (f for f in logger.filters if isinstance(f, SamplingFilter)), None
+        )
+        if sampling is not None:
+            sampling.rate = sample_rate
+        elif sample_rate < 1.0:
+            logger.addFilter(SamplingFilter(sample_rate))
 
     return LoggerAdapter(logger, {"id": id})
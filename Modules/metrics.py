@@ -0,0 +1,426 @@
+import asyncio
+import bisect
+import functools
+import os
+import re
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterator
+from types import SimpleNamespace
+from typing import Any, Final, ParamSpec, TypeVar
+
+import aiohttp
+from aiohttp import web
+
+from Modules import tracing
+from Modules.logger import make_logger
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+METRICS_PORT: Final = int(os.getenv("METRICS_PORT", "8080"))
+LOOP_LAG_INTERVAL: Final = 0.5
+# イベントループの遅延がこの秒数を超えている間は/healthzで異常を返す
+HEALTH_MAX_LOOP_LAG: Final = float(os.getenv("HEALTH_MAX_LOOP_LAG", "5.0"))
+
+LATENCY_BUCKETS: Final = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASE_BUCKETS: Final = (5.0, 10.0, 30.0, 60.0, 120.0, 180.0, 300.0, 600.0)
+
+logger = make_logger("Metrics")
+
+Labels = tuple[str, ...]
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """
+    メトリクスの基底クラス。
+    値の更新はイベントループのスレッドからだけ行うため、ロックを取らずに辞書を直接更新する。
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type_name}"
+        yield from self.samples()
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(Metric):
+    """
+    値を設定するか、出力のたびにcollectで値を集めるメトリクス。
+    """
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        collect: Callable[[], dict[Labels, float]] | None = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self._values: dict[Labels, float] = {}
+        self.collect = collect
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def samples(self) -> Iterator[str]:
+        values = self.collect() if self.collect is not None else self._values
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram(Metric):
+    """
+    値の分布を数えるメトリクス。記録時は該当するバケットだけを数え、累積は出力時に計算する。
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+        # ラベル -> [各バケットの数..., +Infの数, 合計値]
+        self._values: dict[Labels, list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self) -> Iterator[str]:
+        for labels, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            suffix = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{suffix} {counts[-1]}"
+            yield f"{self.name}_count{suffix} {cumulative}"
+
+
+class MetricsRegistry:
+    """
+    メトリクスをまとめて保持し、Prometheusのテキスト形式で出力するクラス。
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Labels = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        collect: Callable[[], dict[Labels, float]] | None = None,
+    ) -> Gauge:
+        return self._register(Gauge(name, help, labelnames, collect))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+phase_duration = metrics.histogram(
+    "werewolf_phase_duration_seconds",
+    "Duration of game phases",
+    ("phase",),
+    PHASE_BUCKETS,
+)
+interaction_latency = metrics.histogram(
+    "discord_interaction_handler_seconds",
+    "Time spent in interaction handlers",
+    ("handler",),
+)
+send_latency = metrics.histogram(
+    "discord_send_latency_seconds", "Latency of message sends", ("kind",)
+)
+rest_requests = metrics.counter(
+    "discord_rest_requests_total",
+    "REST requests to Discord by route and status",
+    ("method", "route", "status"),
+)
+rest_latency = metrics.histogram(
+    "discord_rest_latency_seconds", "Latency of REST requests", ("method", "route")
+)
+rate_limited = metrics.counter(
+    "discord_rate_limited_total", "429 responses from Discord", ("method", "route")
+)
+user_cache_lookups = metrics.counter(
+    "user_cache_lookups_total", "User cache lookups by result", ("result",)
+)
+user_cache_rest_calls = metrics.counter(
+    "user_cache_rest_calls_total",
+    "Users fetched over REST because they were not cached",
+)
+loop_lag = metrics.histogram(
+    "event_loop_lag_seconds", "How late the event loop wakes up a sleeping task"
+)
+
+
+def track_interaction(handler: str):
+    """
+    インタラクションの処理時間を記録するデコレーター。
+    ボタンやセレクトのコールバック、スラッシュコマンドに付ける。
+
+    Parameters
+    ----------
+    handler : str
+        メトリクスのラベルに使う名前
+    """
+
+    def decorator(
+        func: Callable[P, Awaitable[R]],
+    ) -> Callable[P, Awaitable[R]]:
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                interaction_latency.observe(time.perf_counter() - start, handler)
+
+        return wrapper
+
+    return decorator
+
+
+# スノーフレークやトークンをまとめて、ルートの種類が増えすぎないようにする
+_API_PREFIX = re.compile(r"^/api/v\d+")
+_SNOWFLAKE = re.compile(r"/\d{15,}")
+_TOKEN = re.compile(r"/(webhooks|interactions)/\{id\}/[^/]+")
+
+
+class RequestRate:
+    """
+    直近のRESTリクエストの数を数えるクラス。送信の余裕を見積もるために使う。
+
+    Parameters
+    ----------
+    window : float
+        数える期間(秒)
+    """
+
+    def __init__(self, window: float = 1.0):
+        self.window = window
+        self.last_rate_limited = float("-inf")
+        self._times: deque[float] = deque()
+
+    def record(self, status: int) -> None:
+        now = time.monotonic()
+        self._times.append(now)
+        if status == 429:
+            self.last_rate_limited = now
+        self._expire(now)
+
+    def _expire(self, now: float) -> None:
+        times = self._times
+        while times and times[0] < now - self.window:
+            times.popleft()
+
+    def rate(self) -> float:
+        """
+        1秒あたりのリクエスト数。
+        """
+
+        self._expire(time.monotonic())
+        return len(self._times) / self.window
+
+    def rate_limited_within(self, seconds: float) -> bool:
+        """
+        直近の指定した秒数の間に429を受けていればTrue。
+        """
+
+        return time.monotonic() - self.last_rate_limited < seconds
+
+
+rest_rate = RequestRate()
+
+
+def route_of(path: str) -> str:
+    """
+    URLのパスをメトリクス用のルート名にする。
+    """
+
+    path = _API_PREFIX.sub("", path)
+    path = _SNOWFLAKE.sub("/{id}", path)
+    return _TOKEN.sub(r"/\1/{id}/{token}", path)
+
+
+async def _on_request_start(
+    session: aiohttp.ClientSession,
+    ctx: SimpleNamespace,
+    params: aiohttp.TraceRequestStartParams,
+) -> None:
+    ctx.start = time.perf_counter()
+
+
+async def _on_request_end(
+    session: aiohttp.ClientSession,
+    ctx: SimpleNamespace,
+    params: aiohttp.TraceRequestEndParams,
+) -> None:
+    end = time.perf_counter()
+    route = route_of(params.url.path)
+    status = params.response.status
+    rest_requests.inc(params.method, route, str(status))
+    rest_latency.observe(end - ctx.start, params.method, route)
+    tracing.record_request(params.method, route, status, ctx.start, end)
+    rest_rate.record(status)
+    if status == 429:
+        rate_limited.inc(params.method, route)
+
+
+async def _on_request_exception(
+    session: aiohttp.ClientSession,
+    ctx: SimpleNamespace,
+    params: aiohttp.TraceRequestExceptionParams,
+) -> None:
+    route = route_of(params.url.path)
+    rest_requests.inc(params.method, route, "error")
+    tracing.record_request(
+        params.method, route, "error", ctx.start, time.perf_counter()
+    )
+
+
+def http_trace_config() -> aiohttp.TraceConfig:
+    """
+    discord.Clientのhttp_traceに渡し、RESTリクエストを数えるためのTraceConfig。
+    ゲームの中で行われたリクエストは、そのゲームのトレースにも記録する。
+    """
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(_on_request_start)
+    trace.on_request_end.append(_on_request_end)
+    trace.on_request_exception.append(_on_request_exception)
+    return trace
+
+
+class MetricsServer:
+    """
+    /metricsと/healthzを提供するHTTPサーバー。
+
+    Parameters
+    ----------
+    port : int
+        待ち受けるポート
+    is_ready : Callable[[], bool] | None
+        ボットが準備できているかを返す関数
+    """
+
+    def __init__(
+        self, port: int = METRICS_PORT, is_ready: Callable[[], bool] | None = None
+    ):
+        self.port = port
+        self.is_ready = is_ready
+        self.loop_lag = 0.0
+
+        self._runner: web.AppRunner | None = None
+        self._lag_task: asyncio.Task | None = None
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=metrics.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    async def _healthz(self, request: web.Request) -> web.Response:
+        ready = self.is_ready() if self.is_ready is not None else True
+        healthy = ready and self.loop_lag < HEALTH_MAX_LOOP_LAG
+        return web.json_response(
+            {"ready": ready, "loop_lag": round(self.loop_lag, 4)},
+            status=200 if healthy else 503,
+        )
+
+    async def _monitor_loop_lag(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag = max(0.0, time.monotonic() - start - LOOP_LAG_INTERVAL)
+            loop_lag.observe(self.loop_lag)
+
+    async def start(self) -> None:
+        """
+        サーバーとイベントループの遅延の計測を開始する。
+        """
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        app.router.add_get("/healthz", self._healthz)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, port=self.port).start()
+        self._lag_task = asyncio.create_task(self._monitor_loop_lag())
+        logger.info(f"Metrics server listening on :{self.port}")
+
+    async def stop(self) -> None:
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,258 @@
+import asyncio
+import os
+from collections.abc import Awaitable, Callable
+from typing import Any, Final
+
+import discord
+
+from Modules.logger import make_logger
+from Modules.metrics import metrics
+
+OUTBOUND_WINDOW: Final = float(os.getenv("OUTBOUND_WINDOW", "0.1"))
+# Discordの1メッセージあたりの上限
+MAX_CONTENT_LENGTH: Final = 2000
+MAX_EMBEDS: Final = 10
+
+logger = make_logger("Outbound")
+
+queued_messages = metrics.counter(
+    "discord_outbound_messages_total", "Messages queued for sending", ("kind",)
+)
+outbound_sends = metrics.counter(
+    "discord_outbound_sends_total",
+    "API calls made after merging queued messages",
+    ("kind",),
+)
+outbound_dropped = metrics.counter(
+    "discord_outbound_dropped_total",
+    "Queued messages given up on after their send failed",
+    ("kind",),
+)
+
+# 送信待ちのメッセージ(本文・埋め込み・View)
+_Part = tuple[str | None, discord.Embed | None, discord.ui.View | None]
+
+
+class _Batch:
+    """
+    1回の送信にまとめるメッセージ。
+    """
+
+    __slots__ = ("contents", "embeds", "view", "waiters", "detached")
+
+    def __init__(self) -> None:
+        self.contents: list[str] = []
+        self.embeds: list[discord.Embed] = []
+        self.view: discord.ui.View | None = None
+        self.waiters: list[asyncio.Future[discord.Message]] = []
+        # put()で送信を待たずに入れたメッセージ。失敗したときに送り直す
+        self.detached: list[_Part] = []
+
+    def can_add(self, content: str | None, embed: discord.Embed | None) -> bool:
+        # 本文は埋め込みより上に表示されるため、埋め込みの後の本文は同じメッセージに入れない
+        if content is not None and self.embeds:
+            return False
+        if embed is not None and len(self.embeds) >= MAX_EMBEDS:
+            return False
+        if content is not None:
+            length = sum(len(c) + 1 for c in self.contents) + len(content)
+            if length > MAX_CONTENT_LENGTH:
+                return False
+        return True
+
+    def add(
+        self,
+        content: str | None,
+        embed: discord.Embed | None,
+        view: discord.ui.View | None,
+    ) -> None:
+        if content is not None:
+            self.contents.append(content)
+        if embed is not None:
+            self.embeds.append(embed)
+        if view is not None:
+            self.view = view
+
+    def kwargs(self) -> dict[str, Any]:
+        kwargs: dict[str, Any] = {}
+        if self.contents:
+            kwargs["content"] = "\n".join(self.contents)
+        if len(self.embeds) == 1:
+            kwargs["embed"] = self.embeds[0]
+        elif self.embeds:
+            kwargs["embeds"] = self.embeds
+        if self.view is not None:
+            kwargs["view"] = self.view
+        return kwargs
+
+
+class OutboundQueue:
+    """
+    1つの宛先(チャンネルやDM)への送信をまとめるクラス。
+    短い時間内に続けて送られたメッセージは、本文をつなげるか埋め込みを並べて1回のAPI呼び出しにする。
+
+    - 送信は要求された順番に1つずつ行い、宛先の中での順番は変わらない
+    - Viewを付けたメッセージは、それまでのメッセージとまとめてすぐに送り、Viewはそのメッセージに付く
+    - 埋め込みの後の本文は、表示の順番が逆になるため別のメッセージにする
+
+    Parameters
+    ----------
+    send : Callable[..., Awaitable[discord.Message]]
+        実際に送信する関数。content・embed・embeds・viewを受け取る。
+    kind : str
+        メトリクスのラベルに使う宛先の種類
+    window : float
+        メッセージをまとめる時間(秒)
+    """
+
+    def __init__(
+        self,
+        send: Callable[..., Awaitable[discord.Message]],
+        kind: str,
+        window: float = OUTBOUND_WINDOW,
+    ):
+        self._send = send
+        self.kind = kind
+        self.window = window
+
+        self._pending: _Batch | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._last: asyncio.Task | None = None
+
+    def _add(
+        self,
+        content: str | None,
+        embed: discord.Embed | None,
+        view: discord.ui.View | None,
+        detached: bool = False,
+    ) -> _Batch:
+        queued_messages.inc(self.kind)
+
+        if self._pending is not None and not self._pending.can_add(content, embed):
+            self.flush()
+        if self._pending is None:
+            self._pending = _Batch()
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+        batch = self._pending
+        batch.add(content, embed, view)
+        if detached:
+            batch.detached.append((content, embed, view))
+        if view is not None:
+            # Viewの操作を待つ呼び出し元がいるため、待たずに送る
+            self.flush()
+        return batch
+
+    def put(
+        self,
+        content: str | None = None,
+        embed: discord.Embed | None = None,
+        view: discord.ui.View | None = None,
+    ) -> None:
+        """
+        メッセージを送信待ちにする。送信の完了は待たない。
+        送信に失敗した場合は1回だけ送り直し、それでも失敗した場合はログに残す。
+        """
+
+        self._add(content, embed, view, detached=True)
+
+    async def send(
+        self,
+        content: str | None = None,
+        embed: discord.Embed | None = None,
+        view: discord.ui.View | None = None,
+    ) -> discord.Message:
+        """
+        メッセージを送信待ちのメッセージとまとめて、すぐに送信する。
+
+        Returns
+        -------
+        discord.Message
+            送信したメッセージ。前のメッセージとまとめられた場合はそのメッセージ。
+        """
+
+        future: asyncio.Future[discord.Message] = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._add(content, embed, view).waiters.append(future)
+        self.flush()
+        return await future
+
+    def flush(self) -> None:
+        """
+        送信待ちのメッセージを送信する。送信は前の送信が終わってから行う。
+        """
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, None
+        if batch is None:
+            return
+        self._last = asyncio.create_task(self._send_batch(batch, self._last))
+
+    async def _send_batch(self, batch: _Batch, previous: asyncio.Task | None) -> None:
+        try:
+            if previous is not None:
+                # 前の送信の失敗はそちらで扱うため、ここでは順番を守るためだけに待つ
+                await asyncio.wait([previous])
+
+            try:
+                message = await self._send(**batch.kwargs())
+            except Exception as e:
+                logger.warning(
+                    f"Failed to send {self.kind} message"
+                    f" ({len(batch.waiters)} awaited, {len(batch.detached)} queued)",
+                    exc_info=True,
+                )
+                for waiter in batch.waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                # 後の送信はこのタスクの終了を待つため、ここで送り直せば順番は変わらない
+                await self._retry_detached(batch)
+                return
+            finally:
+                outbound_sends.inc(self.kind)
+        except asyncio.CancelledError:
+            for waiter in batch.waiters:
+                if not waiter.done():
+                    waiter.cancel()
+            raise
+
+        for waiter in batch.waiters:
+            if not waiter.done():
+                waiter.set_result(message)
+
+    async def _retry_detached(self, batch: _Batch) -> None:
+        """
+        失敗した送信に含まれていたput()のメッセージを、1回だけ送り直す。
+        送信を待っている呼び出し元は自分の分だけを送り直すため、ここではput()の分だけを扱う。
+        送り直しても失敗したものは諦める。
+        """
+
+        if not batch.detached:
+            return
+
+        retry = _Batch()
+        for content, embed, view in batch.detached:
+            retry.add(content, embed, view)
+        try:
+            await self._send(**retry.kwargs())
+        except Exception:
+            outbound_dropped.inc(self.kind, amount=len(batch.detached))
+            logger.warning(
+                f"Dropped {len(batch.detached)} {self.kind} messages after a retry",
+                exc_info=True,
+            )
+        finally:
+            outbound_sends.inc(self.kind)
+
+    async def drain(self) -> None:
+        """
+        送信待ちのメッセージをすべて送信し、送信が終わるまで待つ。
+        """
+
+        self.flush()
+        if self._last is not None:
+            await asyncio.wait([self._last])
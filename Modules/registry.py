@@ -0,0 +1,242 @@
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from Game.Werewolf.game import WerewolfGame
+
+GameState = Literal["recruiting", "running", "ended"]
+GAME_STATES: tuple[GameState, ...] = ("recruiting", "running", "ended")
+
+
+class GameRegistry:
+    """
+    進行中のゲームを保持するクラス。
+    ゲームIDに加えて、(チャンネルID, ホストID)・参加者ID・状態ごとの索引を持ち、
+    どの検索も全ゲームを走査せずに行える。
+
+    索引を保つため、参加者や状態の変更は必ずこのクラスを通して行う。
+    """
+
+    def __init__(self) -> None:
+        self._games: dict[int, "WerewolfGame"] = {}
+        self._states: dict[int, GameState] = {}
+
+        # 値はゲームIDの順序付き集合として使う
+        self._by_channel_host: dict[tuple[int | None, int], dict[int, None]] = {}
+        self._by_user: dict[int, dict[int, None]] = {}
+        self._by_state: dict[GameState, dict[int, None]] = {
+            state: {} for state in GAME_STATES
+        }
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._games)
+
+    def __contains__(self, game_id: object) -> bool:
+        return game_id in self._games
+
+    def __getitem__(self, game_id: int) -> "WerewolfGame":
+        return self._games[game_id]
+
+    def __setitem__(self, game_id: int, game: "WerewolfGame") -> None:
+        if game_id != game.id:
+            raise ValueError(f"Game id mismatch: {game_id} != {game.id}")
+        self.add(game)
+
+    def __delitem__(self, game_id: int) -> None:
+        if self.remove(game_id) is None:
+            raise KeyError(game_id)
+
+    def get(self, game_id: int) -> "WerewolfGame | None":
+        return self._games.get(game_id)
+
+    def values(self):
+        return self._games.values()
+
+    def items(self):
+        return self._games.items()
+
+    @staticmethod
+    def _channel_host_key(game: "WerewolfGame") -> tuple[int | None, int]:
+        # Discordを使わないゲームはチャンネルを持たない
+        channel_id = game.channel.id if game.channel is not None else None
+        return (channel_id, game.host_id)
+
+    @staticmethod
+    def _state_of(game: "WerewolfGame") -> GameState:
+        if game.is_ended:
+            return "ended"
+        if game.is_started:
+            return "running"
+        return "recruiting"
+
+    def _index_user(self, user_id: int, game_id: int) -> None:
+        self._by_user.setdefault(user_id, {})[game_id] = None
+
+    def _unindex_user(self, user_id: int, game_id: int) -> None:
+        game_ids = self._by_user.get(user_id)
+        if game_ids is not None:
+            game_ids.pop(game_id, None)
+            if not game_ids:
+                del self._by_user[user_id]
+
+    def add(self, game: "WerewolfGame") -> None:
+        """
+        ゲームを登録する。
+
+        Parameters
+        ----------
+        game : WerewolfGame
+            登録するゲーム
+        """
+
+        if game.id in self._games:
+            self.remove(game.id)
+
+        state = self._state_of(game)
+        self._games[game.id] = game
+        self._states[game.id] = state
+        self._by_state[state][game.id] = None
+        self._by_channel_host.setdefault(self._channel_host_key(game), {})[
+            game.id
+        ] = None
+
+        self._index_user(game.host_id, game.id)
+        for user_id in game.participant_ids:
+            self._index_user(user_id, game.id)
+
+    def remove(self, game_id: int) -> "WerewolfGame | None":
+        """
+        ゲームの登録を解除し、すべての索引から取り除く。
+
+        Parameters
+        ----------
+        game_id : int
+            ゲームのID
+
+        Returns
+        -------
+        WerewolfGame | None
+            解除したゲーム。登録されていなかった場合はNone。
+        """
+
+        game = self._games.pop(game_id, None)
+        if game is None:
+            return None
+
+        state = self._states.pop(game_id)
+        self._by_state[state].pop(game_id, None)
+
+        key = self._channel_host_key(game)
+        game_ids = self._by_channel_host.get(key)
+        if game_ids is not None:
+            game_ids.pop(game_id, None)
+            if not game_ids:
+                del self._by_channel_host[key]
+
+        self._unindex_user(game.host_id, game_id)
+        for user_id in game.participant_ids:
+            self._unindex_user(user_id, game_id)
+
+        return game
+
+    def update_state(self, game: "WerewolfGame") -> None:
+        """
+        ゲームのフラグ(is_started, is_ended)に合わせて状態の索引を更新する。
+
+        Parameters
+        ----------
+        game : WerewolfGame
+            状態が変化したゲーム
+        """
+
+        old_state = self._states.get(game.id)
+        if old_state is None:
+            return
+
+        new_state = self._state_of(game)
+        if new_state != old_state:
+            self._by_state[old_state].pop(game.id, None)
+            self._by_state[new_state][game.id] = None
+            self._states[game.id] = new_state
+
+    def add_participant(self, game: "WerewolfGame", user_id: int) -> None:
+        """
+        ゲームに参加者を追加する。
+
+        Parameters
+        ----------
+        game : WerewolfGame
+            対象のゲーム
+        user_id : int
+            参加するユーザーのID
+        """
+
+        game.participant_ids.add(user_id)
+        if game.id in self._games:
+            self._index_user(user_id, game.id)
+
+    def remove_participant(self, game: "WerewolfGame", user_id: int) -> None:
+        """
+        ゲームから参加者を取り除く。
+
+        Parameters
+        ----------
+        game : WerewolfGame
+            対象のゲーム
+        user_id : int
+            退出するユーザーのID
+        """
+
+        game.participant_ids.discard(user_id)
+        if game.id in self._games and user_id != game.host_id:
+            self._unindex_user(user_id, game.id)
+
+    def state_of(self, game_id: int) -> GameState | None:
+        return self._states.get(game_id)
+
+    def by_state(self, state: GameState) -> list["WerewolfGame"]:
+        """
+        指定した状態のゲームを登録順に返す。
+        """
+
+        return [self._games[game_id] for game_id in self._by_state[state]]
+
+    def count(self, state: GameState) -> int:
+        return len(self._by_state[state])
+
+    def find_recruiting(self, channel_id: int, host_id: int) -> "WerewolfGame | None":
+        """
+        チャンネルとホストから募集中のゲームを探す。
+
+        Parameters
+        ----------
+        channel_id : int
+            チャンネルのID
+        host_id : int
+            ホストのID
+        """
+
+        for game_id in self._by_channel_host.get((channel_id, host_id), ()):
+            if self._states[game_id] == "recruiting":
+                return self._games[game_id]
+        return None
+
+    def games_of(self, user_id: int) -> list["WerewolfGame"]:
+        """
+        ユーザーが参加しているゲーム(ホストとして募集中のものも含む)を返す。
+        """
+
+        return [self._games[game_id] for game_id in self._by_user.get(user_id, ())]
+
+    def active_game_of(self, user_id: int) -> "WerewolfGame | None":
+        """
+        ユーザーが参加している、まだ終了していないゲームを返す。
+        """
+
+        for game_id in self._by_user.get(user_id, ()):
+            if self._states[game_id] != "ended":
+                return self._games[game_id]
+        return None
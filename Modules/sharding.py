@@ -0,0 +1,468 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections.abc import Sequence
+from typing import Any, Final
+
+import discord
+
+from Modules.logger import make_logger
+
+# 0の場合はシャーディングしない。ワーカーを複数にした場合はワーカー数が使われる
+SHARD_COUNT: Final = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_WORKERS: Final = int(os.getenv("SHARD_WORKERS", "1"))
+# 以下はコーディネーターがワーカープロセスに渡す
+SHARD_IDS: Final = os.getenv("SHARD_IDS")
+WORKER_ID: Final = os.getenv("WORKER_ID")
+
+COORDINATOR_HOST: Final = os.getenv("COORDINATOR_HOST", "127.0.0.1")
+COORDINATOR_PORT: Final = int(os.getenv("COORDINATOR_PORT", "8765"))
+# コーディネーターの返信を待つ上限(秒)。参加の確認はゲームの受信箱の中で待つため、長く止めない
+COORDINATOR_TIMEOUT: Final = float(os.getenv("COORDINATOR_TIMEOUT", "2.0"))
+RESTART_DELAY: Final = 1.0
+MAX_RESTART_DELAY: Final = 60.0
+# この秒数以上動いていたワーカーが落ちた場合は、再起動の待ち時間を戻す
+STABLE_UPTIME: Final = 30.0
+
+logger = make_logger("Sharding")
+
+
+class CoordinatorError(Exception):
+    """
+    コーディネーターが要求を処理できず、失敗を返信した。
+    """
+
+
+def shard_id_of(guild_id: int, shard_count: int) -> int:
+    """
+    ギルドを担当するシャードの番号。Discordのゲートウェイと同じ式で求める。
+    """
+
+    return (guild_id >> 22) % shard_count
+
+
+def partition(shard_count: int, workers: int) -> list[list[int]]:
+    """
+    シャードをワーカーに順番に割り振る。
+
+    Returns
+    -------
+    list[list[int]]
+        ワーカーごとの担当シャード番号のリスト
+    """
+
+    return [list(range(w, shard_count, workers)) for w in range(workers)]
+
+
+def worker_shard_ids() -> list[int] | None:
+    """
+    このプロセスが担当するシャード番号。ワーカーでない場合はNone。
+    """
+
+    if not SHARD_IDS:
+        return None
+    return [int(shard_id) for shard_id in SHARD_IDS.split(",")]
+
+
+def owns_guild(client: discord.Client, guild_id: int | None) -> bool:
+    """
+    このクライアントがギルドを担当しているかどうか。シャーディングしていない場合は常にTrue。
+    """
+
+    shard_count = client.shard_count
+    shard_ids = getattr(client, "shard_ids", None)
+    if guild_id is None or not shard_count or shard_ids is None:
+        return True
+    return shard_id_of(guild_id, shard_count) in shard_ids
+
+
+class Coordinator:
+    """
+    ワーカープロセスを起動・監視し、プロセスをまたいだ問い合わせに答えるクラス。
+    各ワーカーにはシャードを割り振り、異常終了したワーカーは待ち時間を伸ばしながら再起動する。
+
+    どのユーザーがどのゲームに参加しているかを持ち、別のシャードで進行中のゲームへの
+    二重参加を防ぐ。ワーカーが落ちた場合は、そのワーカーのゲームをすべて解放する。
+
+    Parameters
+    ----------
+    command : Sequence[str]
+        ワーカーとして起動するコマンド
+    workers : int
+        ワーカープロセスの数
+    shard_count : int
+        シャードの総数。0の場合はワーカー数と同じにする。
+    host : str
+        待ち受けるアドレス
+    port : int
+        待ち受けるポート
+    """
+
+    def __init__(
+        self,
+        command: Sequence[str],
+        workers: int = SHARD_WORKERS,
+        shard_count: int = SHARD_COUNT,
+        host: str = COORDINATOR_HOST,
+        port: int = COORDINATOR_PORT,
+    ):
+        self.command = list(command)
+        self.workers = workers
+        self.shard_count = shard_count or workers
+        self.host = host
+        self.port = port
+
+        self.restarts: dict[int, int] = {w: 0 for w in range(workers)}
+
+        # ユーザーID -> 参加しているゲームID(順序付き集合)
+        self._users: dict[int, dict[int, None]] = {}
+        # ゲームID -> (ワーカーID, 参加しているユーザーID)
+        self._games: dict[int, tuple[int, set[int]]] = {}
+        self._processes: dict[int, asyncio.subprocess.Process] = {}
+        self._stopping = False
+
+    # ユーザーとゲームの対応
+
+    def _add(self, worker_id: int, user_id: int, game_id: int) -> None:
+        self._users.setdefault(user_id, {})[game_id] = None
+        self._games.setdefault(game_id, (worker_id, set()))[1].add(user_id)
+
+    def _release(self, user_id: int, game_id: int) -> None:
+        game_ids = self._users.get(user_id)
+        if game_ids is not None:
+            game_ids.pop(game_id, None)
+            if not game_ids:
+                del self._users[user_id]
+
+        entry = self._games.get(game_id)
+        if entry is not None:
+            entry[1].discard(user_id)
+
+    def _release_game(self, game_id: int) -> None:
+        entry = self._games.pop(game_id, None)
+        if entry is None:
+            return
+        for user_id in entry[1]:
+            self._release(user_id, game_id)
+
+    def _release_worker(self, worker_id: int) -> None:
+        game_ids = [gid for gid, (w, _) in self._games.items() if w == worker_id]
+        for game_id in game_ids:
+            self._release_game(game_id)
+        if game_ids:
+            logger.info(f"Released {len(game_ids)} games of worker {worker_id}")
+
+    def game_of(self, user_id: int, exclude: int | None = None) -> int | None:
+        """
+        ユーザーが参加しているゲームのIDを返す。参加していない場合はNone。
+        """
+
+        for game_id in self._users.get(user_id, ()):
+            if game_id != exclude:
+                return game_id
+        return None
+
+    @property
+    def game_count(self) -> int:
+        return len(self._games)
+
+    # 各操作。op名に対応する_op_<名前>が呼ばれ、戻り値が返信になる
+
+    def _op_claim(self, worker_id: int, user_id: int, game_id: int) -> dict[str, Any]:
+        # 確認と登録を1回で行うので、別のワーカーと競合しない
+        other = self.game_of(user_id, exclude=game_id)
+        if other is None:
+            self._add(worker_id, user_id, game_id)
+        return {"game_id": other}
+
+    def _op_add(self, worker_id: int, user_id: int, game_id: int) -> None:
+        self._add(worker_id, user_id, game_id)
+
+    def _op_release(self, worker_id: int, user_id: int, game_id: int) -> None:
+        self._release(user_id, game_id)
+
+    def _op_release_game(self, worker_id: int, game_id: int) -> None:
+        self._release_game(game_id)
+
+    def _op_game_of(self, worker_id: int, user_id: int) -> dict[str, Any]:
+        return {"game_id": self.game_of(user_id)}
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        worker_id = -1
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                request_id = message.pop("id", None)
+                op = message.pop("op", None)
+
+                if op == "hello":
+                    worker_id = message["worker"]
+                    continue
+
+                # 要求の誤りで接続を切るとワーカーが問い合わせできなくなるため、失敗を返信する
+                handler = getattr(self, f"_op_{op}", None)
+                if handler is None:
+                    reply: dict[str, Any] = {"ok": False, "error": f"unknown op {op}"}
+                else:
+                    try:
+                        reply = {"ok": True, **(handler(worker_id, **message) or {})}
+                    except Exception as e:
+                        logger.warning(
+                            f"Failed to handle {op} from worker {worker_id}",
+                            exc_info=True,
+                        )
+                        reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+                # IDのないメッセージは通知として扱い、返信しない
+                if request_id is not None:
+                    writer.write(
+                        json.dumps({"id": request_id, **reply}).encode() + b"\n"
+                    )
+        except (ConnectionError, json.JSONDecodeError):
+            logger.warning(f"Connection from worker {worker_id} broken", exc_info=True)
+        finally:
+            writer.close()
+
+    # ワーカーの監視
+
+    def _worker_env(self, worker_id: int, shard_ids: list[int]) -> dict[str, str]:
+        return {
+            **os.environ,
+            "SHARD_COUNT": str(self.shard_count),
+            "SHARD_IDS": ",".join(map(str, shard_ids)),
+            "WORKER_ID": str(worker_id),
+            "COORDINATOR_HOST": self.host,
+            "COORDINATOR_PORT": str(self.port),
+        }
+
+    async def _supervise(self, worker_id: int, shard_ids: list[int]) -> None:
+        delay = RESTART_DELAY
+        while not self._stopping:
+            started = time.monotonic()
+            process = await asyncio.create_subprocess_exec(
+                *self.command, env=self._worker_env(worker_id, shard_ids)
+            )
+            self._processes[worker_id] = process
+            logger.info(
+                f"Started worker {worker_id} (pid {process.pid}) for shards {shard_ids}"
+            )
+
+            code = await process.wait()
+            del self._processes[worker_id]
+            self._release_worker(worker_id)
+
+            if code == 0 or self._stopping:
+                logger.info(f"Worker {worker_id} exited")
+                return
+
+            if time.monotonic() - started >= STABLE_UPTIME:
+                delay = RESTART_DELAY
+            logger.warning(
+                f"Worker {worker_id} exited with {code}, restarting in {delay:.0f}s"
+            )
+            self.restarts[worker_id] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+
+    def stop(self) -> None:
+        """
+        すべてのワーカーを終了させる。
+        """
+
+        self._stopping = True
+        for process in self._processes.values():
+            process.terminate()
+
+    async def run(self) -> None:
+        """
+        待ち受けを開始してワーカーを起動し、すべてのワーカーが終了するまで監視する。
+        """
+
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        # ポートに0を指定した場合は、割り当てられたポートをワーカーに渡す
+        self.port = server.sockets[0].getsockname()[1]
+        logger.info(
+            f"Coordinator listening on {self.host}:{self.port}"
+            f" ({self.workers} workers, {self.shard_count} shards)"
+        )
+
+        try:
+            async with server:
+                await asyncio.gather(
+                    *(
+                        self._supervise(worker_id, shard_ids)
+                        for worker_id, shard_ids in enumerate(
+                            partition(self.shard_count, self.workers)
+                        )
+                    )
+                )
+        finally:
+            self.stop()
+
+
+class CoordinatorClient:
+    """
+    ワーカーからコーディネーターに問い合わせるクラス。
+    接続していない場合(シャーディングしない場合)は、何もせず「参加していない」として答える。
+    """
+
+    def __init__(self) -> None:
+        self.worker_id: int | None = None
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._ids = itertools.count()
+        self._pending: dict[int, asyncio.Future] = {}
+        self._read_task: asyncio.Task | None = None
+        self._closing = False
+
+    @property
+    def is_connected(self) -> bool:
+        return self._writer is not None
+
+    async def connect(
+        self,
+        worker_id: int,
+        host: str = COORDINATOR_HOST,
+        port: int = COORDINATOR_PORT,
+    ) -> None:
+        """
+        コーディネーターに接続する。
+
+        Parameters
+        ----------
+        worker_id : int
+            このワーカーのID
+        host : str
+            コーディネーターのアドレス
+        port : int
+            コーディネーターのポート
+        """
+
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+        self.worker_id = worker_id
+        self._send({"op": "hello", "worker": worker_id})
+        self._read_task = asyncio.create_task(self._read_loop())
+        logger.info(f"Worker {worker_id} connected to coordinator {host}:{port}")
+
+    async def _read_loop(self) -> None:
+        assert self._reader is not None
+        try:
+            while line := await self._reader.readline():
+                reply = json.loads(line)
+                future = self._pending.pop(reply.pop("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        finally:
+            if not self._closing:
+                logger.warning("Disconnected from coordinator")
+            self._writer = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("coordinator disconnected"))
+            self._pending.clear()
+
+    def _send(self, message: dict[str, Any]) -> None:
+        assert self._writer is not None
+        self._writer.write(json.dumps(message).encode() + b"\n")
+
+    async def request(self, op: str, **data: Any) -> dict[str, Any]:
+        """
+        コーディネーターに操作を送り、返信を待つ。
+
+        Raises
+        ------
+        ConnectionError
+            コーディネーターとの接続が切れた場合
+        asyncio.TimeoutError
+            COORDINATOR_TIMEOUT秒以内に返信がなかった場合
+        CoordinatorError
+            コーディネーターが要求を処理できなかった場合
+        """
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._send({"op": op, "id": request_id, **data})
+        try:
+            reply = await asyncio.wait_for(future, COORDINATOR_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._pending.pop(request_id, None)
+            logger.warning(
+                f"Coordinator did not reply to {op} in {COORDINATOR_TIMEOUT}s"
+            )
+            raise
+
+        if not reply.pop("ok", True):
+            logger.warning(f"Coordinator failed to handle {op}: {reply.get('error')}")
+            raise CoordinatorError(reply.get("error"))
+        return reply
+
+    def _notify(self, op: str, **data: Any) -> None:
+        if self.is_connected:
+            self._send({"op": op, **data})
+
+    async def claim(self, user_id: int, game_id: int) -> int | None:
+        """
+        他のゲームに参加していなければ、ユーザーをゲームに登録する。
+
+        Returns
+        -------
+        int | None
+            すでに参加している他のゲームのID。登録できた場合はNone。
+        """
+
+        if not self.is_connected:
+            return None
+        try:
+            reply = await self.request("claim", user_id=user_id, game_id=game_id)
+        except (ConnectionError, asyncio.TimeoutError, CoordinatorError):
+            # コーディネーターが落ちているか応答しない間は、このプロセス内の確認だけで済ませる
+            return None
+        return reply["game_id"]
+
+    def add(self, user_id: int, game_id: int) -> None:
+        """
+        確認せずにユーザーをゲームに登録する。募集者の登録などに使う。
+        """
+
+        self._notify("add", user_id=user_id, game_id=game_id)
+
+    def release(self, user_id: int, game_id: int) -> None:
+        """
+        ユーザーのゲームへの登録を解除する。
+        """
+
+        self._notify("release", user_id=user_id, game_id=game_id)
+
+    def release_game(self, game_id: int) -> None:
+        """
+        ゲームに登録されているユーザーをすべて解除する。
+        """
+
+        self._notify("release_game", game_id=game_id)
+
+    async def game_of(self, user_id: int) -> int | None:
+        """
+        ユーザーが参加しているゲームのIDを問い合わせる。
+        """
+
+        if not self.is_connected:
+            return None
+        try:
+            reply = await self.request("game_of", user_id=user_id)
+        except (ConnectionError, asyncio.TimeoutError, CoordinatorError):
+            return None
+        return reply["game_id"]
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._closing = True
+            self._writer.close()
+            await self._writer.wait_closed()
+
+
+coordinator_client = CoordinatorClient()
@@ -0,0 +1,103 @@
+import os
+import time
+
+from Modules.logger import make_logger
+from Modules.metrics import metrics
+
+logger = make_logger("Startup")
+
+
+def process_started_at() -> float:
+    """
+    プロセスが起動した時刻をtime.perf_counter()の基準で返す。
+    インタープリターの起動とモジュールの読み込みの時間を含めるために使う。
+    Linux以外では、このモジュールを読み込んだ時刻を返す。
+    """
+
+    now = time.perf_counter()
+    try:
+        with open("/proc/self/stat") as f:
+            # コマンド名に空白が含まれる場合があるため、閉じ括弧の後から数える
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        elapsed = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf(
+            "SC_CLK_TCK"
+        )
+    except (OSError, IndexError, ValueError, AttributeError):
+        return now
+    return now - max(0.0, elapsed)
+
+
+_imported_at = process_started_at()
+
+
+class StartupTimer:
+    """
+    起動してから準備ができるまでの時間を、段階ごとに記録するクラス。
+    mark()を呼ぶと、前回のmark()からの時間がその段階の時間になる。
+
+    Parameters
+    ----------
+    started_at : float | None
+        計測の起点(time.perf_counter()の値)。Noneの場合はプロセスの起動時刻。
+    """
+
+    def __init__(self, started_at: float | None = None):
+        self.started_at = started_at if started_at is not None else _imported_at
+        self._last = self.started_at
+        self.steps: dict[str, float] = {}
+        self.finished = False
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started_at
+
+    def mark(self, step: str) -> float:
+        """
+        段階の終わりを記録する。
+
+        Parameters
+        ----------
+        step : str
+            段階の名前
+
+        Returns
+        -------
+        float
+            その段階にかかった秒数
+        """
+
+        now = time.perf_counter()
+        elapsed = self.steps[step] = now - self._last
+        self._last = now
+        return elapsed
+
+    def report(self) -> str:
+        """
+        内訳を表にした文字列。
+        """
+
+        total = self.total or 1.0
+        width = max((len(step) for step in self.steps), default=0)
+        lines = [f"Ready in {self.total:.2f}s"]
+        for step, elapsed in self.steps.items():
+            lines.append(f"  {step:<{width}}  {elapsed:7.3f}s  {elapsed / total:6.1%}")
+        return "\n".join(lines)
+
+    def finish(self) -> None:
+        """
+        計測を終え、内訳をログに出す。
+        """
+
+        self.finished = True
+        logger.info(self.report())
+
+
+startup_timer = StartupTimer()
+
+metrics.gauge(
+    "bot_startup_seconds",
+    "Time spent in each startup step until the bot was ready",
+    ("step",),
+    collect=lambda: {(step,): elapsed for step, elapsed in startup_timer.steps.items()},
+)
@@ -0,0 +1,154 @@
+import asyncio
+import math
+import os
+from collections.abc import Callable
+from typing import Any, Final
+
+from Modules.logger import make_logger
+
+TIMER_TICK: Final = float(os.getenv("TIMER_TICK", "1.0"))
+TIMER_SLOTS: Final = 512
+
+logger = make_logger("TimerWheel")
+
+
+def _noop(*args: Any) -> None:
+    pass
+
+
+class TimerHandle:
+    """
+    TimerWheelに登録したタイマー。cancel()で取り消せる。
+
+    Attributes
+    ----------
+    fired : bool
+        コールバックが呼ばれたかどうか
+    cancelled : bool
+        取り消されたかどうか
+    """
+
+    __slots__ = ("wheel", "tick", "callback", "args", "fired", "cancelled")
+
+    def __init__(
+        self,
+        wheel: "TimerWheel",
+        tick: int,
+        callback: Callable[..., Any],
+        args: tuple[Any, ...],
+    ):
+        self.wheel = wheel
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.fired = False
+        self.cancelled = False
+
+    @property
+    def active(self) -> bool:
+        return not self.fired and not self.cancelled
+
+    def cancel(self) -> None:
+        if self.active:
+            self.cancelled = True
+            self.wheel._active -= 1
+            # 期限の目盛りまで目盛りに残るため、コールバックの参照先(Viewなど)を先に手放す
+            self.callback = _noop
+            self.args = ()
+
+
+class TimerWheel:
+    """
+    プロセス全体で共有するタイマー。
+    タイマーごとにタスクを作らず、1つのタスクが一定間隔で目盛りを進め、
+    その目盛りに登録されたタイマーだけを確認する。登録と取り消しはO(1)。
+
+    目盛りの数より先のタイマーは同じ場所に入り、期限の目盛りに来るまで残り続ける。
+    タイマーがなくなるとタスクは止まり、次の登録で再び動き出す。
+
+    Parameters
+    ----------
+    tick : float
+        目盛りの間隔(秒)。タイマーの精度になる。
+    slots : int
+        目盛りの数
+    """
+
+    def __init__(self, tick: float = TIMER_TICK, slots: int = TIMER_SLOTS):
+        self.tick = tick
+        self._slots: list[list[TimerHandle]] = [[] for _ in range(slots)]
+        self._origin = 0.0
+        self._current = 0
+        self._active = 0
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return self._active
+
+    def schedule(
+        self, delay: float, callback: Callable[..., Any], *args: Any
+    ) -> TimerHandle:
+        """
+        delay秒後にcallback(*args)を呼ぶ。実際に呼ばれるのは最大でtick秒遅れる。
+
+        Parameters
+        ----------
+        delay : float
+            呼び出すまでの秒数
+        callback : Callable[..., Any]
+            イベントループ上で呼ばれる関数
+
+        Returns
+        -------
+        TimerHandle
+            取り消しに使うハンドル
+        """
+
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            # 止まっている間は目盛りの基準を今に合わせ直す
+            self._origin = loop.time()
+            self._current = 0
+            self._task = asyncio.create_task(self._run())
+
+        deadline = loop.time() + delay
+        tick = max(self._current + 1, math.ceil((deadline - self._origin) / self.tick))
+        handle = TimerHandle(self, tick, callback, args)
+        self._slots[tick % len(self._slots)].append(handle)
+        self._active += 1
+        return handle
+
+    def _advance(self) -> None:
+        index = self._current % len(self._slots)
+        remaining = []
+        for handle in self._slots[index]:
+            if handle.cancelled:
+                continue
+            if handle.tick > self._current:
+                remaining.append(handle)
+                continue
+
+            handle.fired = True
+            self._active -= 1
+            try:
+                handle.callback(*handle.args)
+            except Exception:
+                logger.error("Timer callback failed", exc_info=True)
+        self._slots[index] = remaining
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._active > 0:
+                self._current += 1
+                delay = self._origin + self._current * self.tick - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._advance()
+        finally:
+            # 残っているのは取り消されたタイマーだけ
+            for slot in self._slots:
+                slot.clear()
+
+
+timer_wheel = TimerWheel()
@@ -0,0 +1,353 @@
+import asyncio
+import contextlib
+import json
+import os
+import time
+from contextvars import ContextVar, Token
+from typing import Any, Final
+
+from Modules.logger import make_logger
+
+# トレースを書き出すディレクトリ。空の場合は記録しない
+TRACE_DIR: Final = os.getenv("TRACE_DIR", "")
+# この秒数より短く終わったゲームのトレースは書き出さない。遅いゲームだけを残すのに使う
+TRACE_MIN_DURATION: Final = float(os.getenv("TRACE_MIN_DURATION", "0"))
+# 1ゲームで記録するイベントの上限
+TRACE_MAX_EVENTS: Final = int(os.getenv("TRACE_MAX_EVENTS", "20000"))
+
+# 全体の進行を表示する行の名前
+GAME_LANE: Final = "game"
+
+logger = make_logger("Tracing")
+
+# perf_counterの値をUNIX時刻に直すための差。複数のゲームのトレースを並べても時刻が揃う
+_EPOCH_OFFSET: Final = time.time() - time.perf_counter()
+
+_NULL_SPAN: Final = contextlib.nullcontext()
+
+
+def _timestamp(perf: float) -> int:
+    """
+    perf_counterの値を、Chromeのトレース形式の時刻(マイクロ秒)にする。
+    """
+
+    return int((perf + _EPOCH_OFFSET) * 1_000_000)
+
+
+class _Active:
+    """
+    実行中のスパン。コンテキスト変数に入れ、中で行われたREST呼び出しをこのスパンのゲームに記録する。
+    """
+
+    __slots__ = ("trace", "tid", "turn")
+
+    def __init__(self, trace: "GameTrace", tid: int, turn: int | None):
+        self.trace = trace
+        self.tid = tid
+        self.turn = turn
+
+
+_active: ContextVar[_Active | None] = ContextVar("trace_active", default=None)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "tid", "args", "start", "_token")
+
+    def __init__(self, trace: "GameTrace", name: str, tid: int, args: dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.tid = tid
+        self.args = args
+        self.start = 0.0
+        self._token: Token[_Active | None] | None = None
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        self._token = _active.set(_Active(self.trace, self.tid, self.args.get("turn")))
+        self.trace._open.add(self)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._token is not None:
+            _active.reset(self._token)
+        self.trace._close(self, time.perf_counter())
+
+
+class GameTrace:
+    """
+    1つのゲームのスパンを記録し、Chromeのトレース形式(JSON)で書き出すクラス。
+    chrome://tracingやPerfetto(ui.perfetto.dev)で開くと、ゲームの時間がどこで使われたかを
+    フェーズ・プレイヤーの選択待ち・RESTの呼び出しごとに時間軸で見られる。
+
+    - ゲーム全体とフェーズは"game"の行に、選択待ちはプレイヤーごとの行に並ぶ
+    - RESTの呼び出しは同時に行われるため、重なって表示できる非同期イベントにする
+    - すべてのイベントにゲームIDとターン数を付ける
+
+    TRACE_DIRが空の場合は何も記録せず、span()は何もしないコンテキストマネージャーを返す。
+
+    Parameters
+    ----------
+    game_id : int
+        ゲームのID
+    directory : str
+        書き出すディレクトリ。空の場合は記録しない。
+    max_events : int
+        記録するイベントの上限。超えた分は数だけを残す。
+    """
+
+    def __init__(
+        self,
+        game_id: int,
+        directory: str = TRACE_DIR,
+        max_events: int = TRACE_MAX_EVENTS,
+    ):
+        self.game_id = game_id
+        # トレースを開くビューアーはJavaScriptの数値で読むため、大きなIDは丸められる。
+        # pidには下位の31ビットを使い、IDは文字列で付ける
+        self.pid = game_id & 0x7FFFFFFF
+        self.directory = directory
+        self.max_events = max_events
+        self.enabled = bool(directory)
+        self.dropped = 0
+
+        self.events: list[dict[str, Any]] = []
+        self._open: set[_Span] = set()
+        self._lanes: dict[str, int] = {}
+        self._async_ids = 0
+        self._started: float | None = None
+
+    def _lane(self, name: str) -> int:
+        tid = self._lanes.get(name)
+        if tid is None:
+            tid = self._lanes[name] = len(self._lanes) + 1
+        return tid
+
+    def _add(self, event: dict[str, Any]) -> None:
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        self.events.append(event)
+
+    def span(
+        self, name: str, lane: str | None = None, **args: Any
+    ) -> contextlib.AbstractContextManager[Any]:
+        """
+        withで囲んだ間をスパンとして記録する。
+
+        Parameters
+        ----------
+        name : str
+            スパンの名前
+        lane : str | None
+            表示する行の名前。Noneの場合は外側のスパンと同じ行に並べる。
+        **args : Any
+            スパンに付ける情報。turnを省略した場合は外側のスパンのターン数を使う。
+        """
+
+        if not self.enabled:
+            return _NULL_SPAN
+
+        parent = _active.get()
+        if parent is not None and parent.trace is not self:
+            parent = None
+        if lane is not None:
+            tid = self._lane(lane)
+        elif parent is not None:
+            tid = parent.tid
+        else:
+            tid = self._lane(GAME_LANE)
+        if "turn" not in args and parent is not None:
+            args["turn"] = parent.turn
+        if self._started is None:
+            self._started = time.perf_counter()
+
+        return _Span(self, name, tid, args)
+
+    def _close(self, span: _Span, end: float) -> None:
+        if span not in self._open:
+            # 書き出した後に終わったスパン
+            return
+        self._open.discard(span)
+        self._add(
+            {
+                "name": span.name,
+                "ph": "X",
+                "ts": _timestamp(span.start),
+                "dur": int((end - span.start) * 1_000_000),
+                "pid": self.pid,
+                "tid": span.tid,
+                "args": {"game_id": str(self.game_id), **span.args},
+            }
+        )
+
+    def record_request(
+        self,
+        method: str,
+        route: str,
+        status: int | str,
+        start: float,
+        end: float,
+        tid: int,
+        turn: int | None,
+    ) -> None:
+        """
+        RESTの呼び出しを非同期イベントとして記録する。
+
+        Parameters
+        ----------
+        method : str
+            HTTPメソッド
+        route : str
+            メトリクスと同じルート名
+        status : int | str
+            ステータスコード。失敗した場合は"error"。
+        start : float
+            開始時刻(time.perf_counter)
+        end : float
+            終了時刻(time.perf_counter)
+        tid : int
+            呼び出したスパンの行
+        turn : int | None
+            呼び出したスパンのターン数
+        """
+
+        if not self.enabled:
+            return
+        # 開始と終了の組で記録し、片方だけが残らないようにする
+        if len(self.events) + 2 > self.max_events:
+            self.dropped += 2
+            return
+
+        self._async_ids += 1
+        common = {
+            "name": f"{method} {route}",
+            "cat": "rest",
+            "id": self._async_ids,
+            "pid": self.pid,
+            "tid": tid,
+        }
+        self._add(
+            {
+                **common,
+                "ph": "b",
+                "ts": _timestamp(start),
+                "args": {
+                    "game_id": str(self.game_id),
+                    "turn": turn,
+                    "status": status,
+                },
+            }
+        )
+        self._add({**common, "ph": "e", "ts": _timestamp(end)})
+
+    def _metadata(self) -> list[dict[str, Any]]:
+        events: list[dict[str, Any]] = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": self.pid,
+                "args": {"name": f"Werewolf game {self.game_id}"},
+            }
+        ]
+        for name, tid in self._lanes.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+            )
+            events.append(
+                {
+                    "name": "thread_sort_index",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": tid,
+                    "args": {"sort_index": tid},
+                }
+            )
+        return events
+
+    def export(self) -> None:
+        """
+        記録したイベントをファイルに書き出し、以降の記録をやめる。
+        終わっていないスパン(ゲームの削除を呼んだフェーズなど)は、この時刻で終わったものとして書き出す。
+        書き込みはスレッドで行い、完了を待たない。
+        """
+
+        if not self.enabled:
+            return
+        self.enabled = False
+
+        now = time.perf_counter()
+        for span in list(self._open):
+            self._close(span, now)
+
+        if self._started is None or now - self._started < TRACE_MIN_DURATION:
+            self.events = []
+            return
+
+        data = {
+            "traceEvents": self._metadata() + self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "game_id": str(self.game_id),
+                "dropped_events": self.dropped,
+            },
+        }
+        self.events = []
+        path = os.path.join(
+            self.directory,
+            f"game-{self.game_id}-{int(self._started + _EPOCH_OFFSET)}.json",
+        )
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(path, data)
+            return
+        future = loop.run_in_executor(None, self._write, path, data)
+        future.add_done_callback(self._on_written)
+
+    def _write(self, path: str, data: dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        logger.info(f"Wrote trace of game {self.game_id} to {path}")
+
+    def _on_written(self, future: "asyncio.Future[None]") -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(
+                f"Failed to write trace of game {self.game_id}",
+                exc_info=future.exception(),
+            )
+
+
+def span(
+    name: str, lane: str | None = None, **args: Any
+) -> contextlib.AbstractContextManager[Any]:
+    """
+    実行中のゲームのスパンを記録する。ゲームのスパンの外や、記録しない場合は何もしない。
+    引数はGameTrace.spanと同じ。
+    """
+
+    active = _active.get()
+    if active is None:
+        return _NULL_SPAN
+    return active.trace.span(name, lane, **args)
+
+
+def record_request(
+    method: str, route: str, status: int | str, start: float, end: float
+) -> None:
+    """
+    RESTの呼び出しを、呼び出したゲームのトレースに記録する。ゲームの外の呼び出しは記録しない。
+    """
+
+    active = _active.get()
+    if active is not None:
+        active.trace.record_request(
+            method, route, status, start, end, active.tid, active.turn
+        )
@@ -1,51 +1,212 @@
+import asyncio
 import csv
 import os
+import sys
+from collections.abc import Iterable, Mapping
+from types import MappingProxyType
+from typing import Final
 
 from Modules.logger import make_logger
 
+TRANSLATION_FILE: Final = "Resources/Translate.csv"
+RELOAD_INTERVAL: Final = float(os.getenv("TRANSLATION_RELOAD_INTERVAL", "30"))
+# 起動時に読み込んでおく言語(カンマ区切り)
+TRANSLATION_LANGS: Final = tuple(
+    lang for lang in os.getenv("TRANSLATION_LANGS", "ja").split(",") if lang
+)
+
 logger = make_logger("Translator")
 
 
-class Translator:
-    def __init__(self, lang: str = "ja"):
-        self.lang = lang
-        self.file_path = "Resources/Translate.csv"
-        self.translations: dict[str, dict[str, str]] = {}
-        self._load()
+class TranslationCatalog:
+    """
+    プロセス全体で共有する翻訳データ。
+    言語ごとに平坦な辞書を持ち、その言語が初めて要求されたときに読み込む。
+    読み込んだ辞書は変更せず、再読み込み時は辞書ごと差し替える。
+
+    Attributes
+    ----------
+    version : int
+        再読み込みのたびに増える番号。翻訳から作ったキャッシュの無効化に使う。
+
+    Parameters
+    ----------
+    file_path : str
+        翻訳データのCSVファイルのパス
+    """
+
+    def __init__(self, file_path: str = TRANSLATION_FILE):
+        self.file_path = file_path
+        self._tables: dict[str, dict[str, str]] = {}
+        self._mtime: float | None = None
+        self.version = 0
+        self._watch_task: asyncio.Task | None = None
+
+    def _stat(self) -> float | None:
+        try:
+            return os.stat(self.file_path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _read(
+        self, langs: Iterable[str]
+    ) -> tuple[float | None, dict[str, dict[str, str]]]:
+        """
+        CSVから指定した言語の列だけを読み込む。
+
+        Returns
+        -------
+        tuple[float | None, dict[str, dict[str, str]]]
+            読み込んだファイルの更新時刻と、言語ごとの翻訳辞書
+        """
 
-    def _load(self):
-        if not os.path.exists(self.file_path):
+        mtime = self._stat()
+        langs = set(langs)
+        tables: dict[str, dict[str, str]] = {lang: {} for lang in langs}
+
+        if mtime is None:
             logger.warning(f"Translation file not found: {self.file_path}")
-            return
+            return mtime, tables
 
         with open(self.file_path, mode="r", encoding="utf-8-sig") as csvfile:
             reader = csv.reader(csvfile)
 
-            header_found = False
+            columns: list[tuple[int, dict[str, str]]] | None = None
 
             for row in reader:
                 if not row or row[0].startswith("#"):
                     continue
 
-                if not header_found:
-                    langs = row[1:]
-                    self.translations = {lang: {} for lang in langs}
-                    header_found = True
+                if columns is None:
+                    columns = [
+                        (i, tables[lang])
+                        for i, lang in enumerate(row)
+                        if i != 0 and lang in langs
+                    ]
                 else:
-                    for i, text in enumerate(row):
-                        if i != 0:
-                            lang = langs[i - 1]
-                            self.translations[lang][row[0]] = text
+                    key = sys.intern(row[0])
+                    for i, table in columns:
+                        if i < len(row):
+                            table[key] = sys.intern(row[i])
+
+        logger.info(f"Loaded {sorted(langs)} translations from {self.file_path}")
+        return mtime, tables
+
+    def _table(self, lang: str) -> dict[str, str]:
+        table = self._tables.get(lang)
+        if table is None:
+            # 初めて使う言語はその場で読み込む
+            mtime, tables = self._read([lang])
+            table = tables[lang]
+            self._tables = {**self._tables, lang: table}
+            if self._mtime is None:
+                self._mtime = mtime
+        return table
+
+    def table(self, lang: str) -> Mapping[str, str]:
+        """
+        言語の翻訳辞書を読み取り専用で返す。
+        """
+
+        return MappingProxyType(self._table(lang))
+
+    def lookup(self, lang: str, text: str) -> str:
+        """
+        翻訳を取得する。見つからない場合はそのまま返す。
+
+        Parameters
+        ----------
+        lang : str
+            言語
+        text : str
+            翻訳のキー
+        """
+
+        return self._table(lang).get(text, text)
+
+    async def preload(self, *langs: str) -> None:
+        """
+        イベントループを止めずに言語を読み込む。
+        """
 
-            logger.info(f"Loaded translations data from {self.file_path}")
+        missing = [lang for lang in langs if lang not in self._tables]
+        if missing:
+            mtime, tables = await asyncio.to_thread(self._read, missing)
+            self._tables = {**self._tables, **tables}
+            if self._mtime is None:
+                self._mtime = mtime
+
+    async def reload_if_changed(self) -> bool:
+        """
+        CSVの更新時刻が変わっていれば、読み込み済みの言語をすべて読み直す。
+        ファイルの読み込みは別スレッドで行う。
+
+        Returns
+        -------
+        bool
+            再読み込みした場合はTrue
+        """
+
+        mtime = await asyncio.to_thread(self._stat)
+        if mtime is None or mtime == self._mtime:
+            return False
+
+        mtime, tables = await asyncio.to_thread(self._read, list(self._tables))
+        # 読み込みの間に初めて使われた言語は、その時点のファイルから読んでいるため残す
+        self._tables = {**self._tables, **tables}
+        self._mtime = mtime
+        self.version += 1
+        return True
+
+    async def watch(self, interval: float = RELOAD_INTERVAL) -> None:
+        """
+        一定間隔でCSVの更新を確認し、変更があれば再読み込みする。
+        """
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload_if_changed()
+            except Exception:
+                logger.error("Failed to reload translations", exc_info=True)
+
+    def start_watching(self, interval: float = RELOAD_INTERVAL) -> None:
+        """
+        再読み込みの監視タスクを開始する。すでに動いている場合は何もしない。
+        """
+
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self.watch(interval))
+
+
+translation_catalog = TranslationCatalog()
+
+
+class Translator:
+    """
+    共有の翻訳データに対する言語ごとのビュー。
+    データを持たないため、ゲームごとに作っても軽い。
+
+    Parameters
+    ----------
+    lang : str
+        使用する言語
+    catalog : TranslationCatalog | None
+        参照する翻訳データ。Noneの場合はプロセス共有のものを使う。
+    """
+
+    __slots__ = ("lang", "catalog")
+
+    def __init__(self, lang: str = "ja", catalog: TranslationCatalog | None = None):
+        self.lang = lang
+        self.catalog = catalog or translation_catalog
 
     def change_lang(self, lang: str):
         self.lang = lang
         logger.info(f"Changed language to {lang}")
 
     def getstring(self, text: str, lang: str | None = None) -> str:
-        lang = lang or self.lang
-        return self.translations.get(lang, {}).get(text, text)
+        return self.catalog.lookup(lang or self.lang, text)
 
 
 if __name__ == "__main__":
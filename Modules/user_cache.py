@@ -0,0 +1,192 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Final
+
+import discord
+
+from Modules.logger import make_logger
+from Modules.metrics import user_cache_lookups, user_cache_rest_calls
+
+USER_CACHE_SIZE: Final = int(os.getenv("USER_CACHE_SIZE", "2048"))
+USER_CACHE_TTL: Final = float(os.getenv("USER_CACHE_TTL", "3600"))
+QUERY_MEMBERS_LIMIT: Final = 100
+
+logger = make_logger("UserCache")
+
+
+class UserCache:
+    """
+    プロセス全体で共有するユーザー・メンバーのキャッシュ。
+    有効期限付きのLRUで、古いものから破棄する。
+    取得の結果とRESTの回数は、/metricsのuser_cache_lookups_totalとuser_cache_rest_calls_totalに出る。
+
+    Parameters
+    ----------
+    maxsize : int
+        保持するユーザー数の上限
+    ttl : float
+        キャッシュの有効期限(秒)
+
+    Attributes
+    ----------
+    hits : int
+        キャッシュから取得できた回数
+    misses : int
+        キャッシュになかった回数
+    rest_calls : int
+        ユーザー取得のために行ったRESTリクエストの回数
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.rest_calls = 0
+
+        self._entries: OrderedDict[int, tuple[float, discord.User | discord.Member]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, user: discord.User | discord.Member) -> None:
+        """
+        ユーザーをキャッシュに追加する。
+
+        Parameters
+        ----------
+        user : discord.User | discord.Member
+            追加するユーザー
+        """
+
+        self._entries[user.id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user.id)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, user_id: int) -> discord.User | discord.Member | None:
+        """
+        キャッシュからユーザーを取得する。期限切れの場合はNoneを返す。
+
+        Parameters
+        ----------
+        user_id : int
+            ユーザーのID
+        """
+
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            user_cache_lookups.inc("miss")
+            return None
+
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            user_cache_lookups.inc("miss")
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        user_cache_lookups.inc("hit")
+        return user
+
+    async def resolve(
+        self,
+        client: discord.Client,
+        user_ids: list[int],
+        guild: discord.Guild | None = None,
+    ) -> dict[int, discord.User | discord.Member]:
+        """
+        複数のユーザーをまとめて取得する。
+        キャッシュにないユーザーはギルドメンバーの一括問い合わせで解決し、
+        それでも見つからないユーザーだけを個別に取得する。
+
+        Parameters
+        ----------
+        client : discord.Client
+            Discordクライアント
+        user_ids : list[int]
+            取得するユーザーのIDのリスト
+        guild : discord.Guild | None
+            一括問い合わせに使うギルド
+
+        Returns
+        -------
+        dict[int, discord.User | discord.Member]
+            ユーザーIDとユーザーの対応
+        """
+
+        users: dict[int, discord.User | discord.Member] = {}
+        missing: list[int] = []
+
+        for user_id in user_ids:
+            user = self.get(user_id)
+            if user is not None:
+                users[user_id] = user
+            else:
+                missing.append(user_id)
+
+        if missing and guild is not None:
+            for i in range(0, len(missing), QUERY_MEMBERS_LIMIT):
+                chunk = missing[i : i + QUERY_MEMBERS_LIMIT]
+                try:
+                    members = await guild.query_members(
+                        user_ids=chunk, limit=QUERY_MEMBERS_LIMIT
+                    )
+                except (asyncio.TimeoutError, discord.ClientException) as e:
+                    logger.warning(f"Failed to query members: {e}")
+                    continue
+
+                for member in members:
+                    self.put(member)
+                    users[member.id] = member
+
+            missing = [user_id for user_id in missing if user_id not in users]
+
+        if missing:
+            self.rest_calls += len(missing)
+            user_cache_rest_calls.inc(amount=len(missing))
+            fetched = await asyncio.gather(
+                *(client.fetch_user(user_id) for user_id in missing)
+            )
+            for user in fetched:
+                self.put(user)
+                users[user.id] = user
+
+        logger.debug(
+            f"Resolved {len(user_ids)} users "
+            f"(hits={self.hits}, misses={self.misses}, rest_calls={self.rest_calls})"
+        )
+        return users
+
+    async def fetch(
+        self, client: discord.Client, user_id: int
+    ) -> discord.User | discord.Member:
+        """
+        ユーザーを1人取得する。キャッシュになければRESTで取得する。
+
+        Parameters
+        ----------
+        client : discord.Client
+            Discordクライアント
+        user_id : int
+            ユーザーのID
+        """
+
+        user = self.get(user_id)
+        if user is None:
+            self.rest_calls += 1
+            user_cache_rest_calls.inc()
+            user = await client.fetch_user(user_id)
+            self.put(user)
+        return user
+
+
+user_cache = UserCache()
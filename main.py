@@ -1,5 +1,8 @@
+import asyncio
 import os
+import sys
 import uuid
+from collections.abc import Callable
 from typing import Final
 
 import discord
@@ -7,54 +10,100 @@ from discord import app_commands
 from dotenv import load_dotenv
 
 import Modules.global_value as g
+from Game.Werewolf.balance import MAX_PLAYERS, MIN_PLAYERS, balance_table
+from Game.Werewolf.checkpoint import resume_games
 from Game.Werewolf.game import WerewolfGame
-from Game.Werewolf.Roles.Neutral import Fox, Teruteru
-from Game.Werewolf.Roles.Villager import (
-    Bakery,
-    BlackCat,
-    Hunter,
-    Madmate,
-    Medium,
-    Nekomata,
-    Seer,
-)
-from Game.Werewolf.Roles.Werewolf import Werewolf
+from Game.Werewolf.reaper import reaper
+from Game.Werewolf.role import ROLE_MODULES, Role
+from Modules.admission import admission
+from Modules.checkpoint import checkpoint_store
+from Modules.command_sync import sync_if_changed
+from Modules.inbox import INBOX_FULL_MSG, InboxClosed, InboxFull
 from Modules.logger import make_logger
-from Modules.translator import Translator
+from Modules.metrics import (
+    METRICS_PORT,
+    MetricsServer,
+    http_trace_config,
+    metrics,
+    track_interaction,
+)
+from Modules.registry import GAME_STATES
+from Modules.sharding import (
+    SHARD_COUNT,
+    SHARD_WORKERS,
+    WORKER_ID,
+    Coordinator,
+    coordinator_client,
+    worker_shard_ids,
+)
+from Modules.startup import startup_timer
+from Modules.translator import TRANSLATION_LANGS, Translator, translation_catalog
+from Modules.user_cache import user_cache
 from Modules.Views.JoinView import JoinView
 
-client = discord.Client(intents=discord.Intents.default())
+if SHARD_COUNT > 0:
+    # ワーカーとして起動された場合は、割り振られたシャードだけに接続する
+    client: discord.Client = discord.AutoShardedClient(
+        intents=discord.Intents.default(),
+        shard_count=SHARD_COUNT,
+        shard_ids=worker_shard_ids(),
+        http_trace=http_trace_config(),
+    )
+else:
+    client = discord.Client(
+        intents=discord.Intents.default(), http_trace=http_trace_config()
+    )
 tree = app_commands.CommandTree(client)
 
 logger = make_logger("System")
 t = Translator("ja")
 
 GAME_NOT_EXIST_MSG: Final = "ゲームが存在しません"
+BALANCE_NOT_FOUND_MSG: Final = "この人数に対応した役職構成がありません"
+LOBBY_LIMIT_MSG: Final = "このサーバーで同時に募集できるゲームの数に達しています"
 
 ERROR_TEMPLATE: Final = "エラーが発生しました\n"
 
+metrics.gauge(
+    "werewolf_games",
+    "Games in this process by state",
+    ("state",),
+    collect=lambda: {(state,): g.werewolf_games.count(state) for state in GAME_STATES},
+)
+
 
 @client.event
 async def on_ready():
-    await tree.sync()
-    logger.info("Successed to Log in")
+    # 再接続のたびにも呼ばれるため、起動時の処理は1度だけ行う
+    if startup_timer.finished:
+        logger.info("Reconnected")
+        return
+    startup_timer.mark("gateway")
+
+    # 最初のゲームでCSVの読み込みがイベントループを止めないよう、先に読み込む
+    await translation_catalog.preload(*TRANSLATION_LANGS)
+    translation_catalog.start_watching()
+    startup_timer.mark("translations")
+    await balance_table.load_async()
+    startup_timer.mark("balance_table")
 
+    # シャーディング時はコマンドの同期を1つのワーカーだけで行う
+    if WORKER_ID is None or int(WORKER_ID) == 0:
+        await sync_if_changed(tree)
+    startup_timer.mark("command_sync")
 
-# 役職のインスタンスを作成するリスト
-role_classes = [
-    Seer.Seer(),
-    Medium.Medium(),
-    Hunter.Hunter(),
-    Bakery.Bakery(),
-    Nekomata.Nekomata(),
-    Werewolf.Werewolf(),
-    Madmate.Madmate(),
-    BlackCat.BlackCat(),
-    Teruteru.Teruteru(),
-    Fox.Fox(),
-]
+    # 再起動前に進行中だったゲームを再開する
+    checkpoint_store.open()
+    await resume_games(client)
+    startup_timer.mark("resume_games")
+
+    reaper.start()
+    logger.info("Successed to Log in")
+    startup_timer.finish()
 
-roles = {role.name: role for role in role_classes}
+
+# 設定できる役職の名前。村人は残りの人数から決まるため含めない
+ROLE_NAMES: Final = [name for name in ROLE_MODULES if name != "Villager"]
 
 
 @tree.command(name="werewolf", description="人狼ゲームをプレイします")
@@ -63,8 +112,10 @@ roles = {role.name: role for role in role_classes}
     limit=[discord.app_commands.Choice(name=str(i), value=i) for i in range(3, 16)]
 )
 @discord.app_commands.guild_only()
+@track_interaction("werewolf")
 async def werewolf(interaction: discord.Interaction, limit: int = 10):
     logger.info(f"{interaction.user.id} created a game.")
+    user_cache.put(interaction.user)
 
     if not isinstance(interaction.channel, discord.TextChannel):
         await interaction.response.send_message(
@@ -72,9 +123,14 @@ async def werewolf(interaction: discord.Interaction, limit: int = 10):
         )
         return
 
-    try:
-        id = int(uuid.uuid4().int)
+    id = int(uuid.uuid4().int)
+    if not admission.open_lobby(id, interaction.channel.guild.id):
+        await interaction.response.send_message(
+            f"{LOBBY_LIMIT_MSG}({admission.max_guild_lobbies}件)", ephemeral=True
+        )
+        return
 
+    try:
         view = JoinView(id=id, timeout=None)
         await interaction.response.send_message(view=view)
         message = await interaction.original_response()
@@ -89,25 +145,47 @@ async def werewolf(interaction: discord.Interaction, limit: int = 10):
             joinview=view,
             logger=make_logger("Game", id),
             translator=Translator("ja"),
-            roles={roles["Werewolf"]: 1},
+            roles={Role.by_name("Werewolf"): 1},
         )
-        g.werewolf_games[id] = game
+        g.werewolf_games.add(game)
+        coordinator_client.add(interaction.user.id, id)
         await game.update_recruiting_embed()
     except Exception as e:
         logger.error("An error occurred", exc_info=True)
+        if id not in g.werewolf_games:
+            admission.release(id)
         await interaction.response.send_message(ERROR_TEMPLATE + str(e))
 
 
-@tree.command(name="role", description="人狼ゲームの役職を設定します")
+async def submit(game: WerewolfGame, handler: Callable[[], str]) -> str:
+    """
+    ゲームの受信箱で役職の変更を行い、返信する内容を返す。
+    受信箱に入れられなかった場合は、その旨の返信を返す。
+    """
+
+    try:
+        return await game.inbox.call(handler)
+    except InboxFull:
+        return INBOX_FULL_MSG
+    except InboxClosed:
+        return GAME_NOT_EXIST_MSG
+
+
+role_group = app_commands.Group(
+    name="role", description="人狼ゲームの役職を設定します", guild_only=True
+)
+
+
+@role_group.command(name="set", description="役職の人数を設定します")
 @app_commands.describe(role="役職名", number="人数")
 @discord.app_commands.choices(
     role=[
-        discord.app_commands.Choice(name=t.getstring(r.name), value=r.name)
-        for r in roles.values()
+        discord.app_commands.Choice(name=t.getstring(name), value=name)
+        for name in ROLE_NAMES
     ],
     number=[discord.app_commands.Choice(name=str(i), value=i) for i in range(0, 15)],
 )
-@discord.app_commands.guild_only()
+@track_interaction("role_set")
 async def set_role(interaction: discord.Interaction, role: str, number: int):
     logger.info(f"{interaction.user.id} set {role} to {number}.")
 
@@ -120,36 +198,123 @@ async def set_role(interaction: discord.Interaction, role: str, number: int):
         return
 
     try:
-        # ゲームの中で募集中かつあなたのゲームでこのチャンネル内であるゲームを取得
-        recruiting_games = [
-            game for game in g.werewolf_games.values() if not game.is_started
-        ]
-        your_games = [
-            game for game in recruiting_games if game.host_id == interaction.user.id
-        ]
-        setting_game = next(
-            (game for game in your_games if game.channel.id == interaction.channel.id),
-            None,
+        # このチャンネルであなたが募集中のゲームを取得
+        setting_game = g.werewolf_games.find_recruiting(
+            interaction.channel.id, interaction.user.id
         )
 
         if setting_game is None:
             await interaction.response.send_message(GAME_NOT_EXIST_MSG, ephemeral=True)
             return
-        else:
-            setting_game.roles[roles[role]] = number
-            await interaction.response.send_message(
-                f"{role}を{number}人に設定しました", ephemeral=True
-            )
 
-            await setting_game.update_recruiting_embed()
+        def set_count() -> str:
+            if setting_game.is_started:
+                return GAME_NOT_EXIST_MSG
+            setting_game.roles[Role.by_name(role)] = number
+            setting_game.touch()
+            return f"{role}を{number}人に設定しました"
+
+        reply = await submit(setting_game, set_count)
+        await interaction.response.send_message(reply, ephemeral=True)
+        await setting_game.update_recruiting_embed()
     except Exception as e:
         logger.error("An error occurred", exc_info=True)
         await interaction.response.send_message(ERROR_TEMPLATE + str(e))
 
 
-load_dotenv()
-TOKEN = os.getenv("DISCORD_TOKEN")
-if TOKEN is None:
-    raise RuntimeError("DISCORD_TOKEN is not found.")
+@role_group.command(
+    name="autobalance", description="参加人数に合わせて役職を自動で設定します"
+)
+@track_interaction("role_autobalance")
+async def autobalance_role(interaction: discord.Interaction):
+    logger.info(f"{interaction.user.id} requested autobalance.")
+
+    if interaction.channel is None or not isinstance(
+        interaction.channel, discord.TextChannel
+    ):
+        await interaction.response.send_message(
+            "このコマンドはテキストチャンネルでのみ使用できます。", ephemeral=True
+        )
+        return
+
+    try:
+        setting_game = g.werewolf_games.find_recruiting(
+            interaction.channel.id, interaction.user.id
+        )
+
+        if setting_game is None:
+            await interaction.response.send_message(GAME_NOT_EXIST_MSG, ephemeral=True)
+            return
+
+        def balance() -> str:
+            if setting_game.is_started:
+                return GAME_NOT_EXIST_MSG
+
+            # 参加人数を数えてから構成を決めるまでの間に、参加や退出が入らない
+            players = len(setting_game.participant_ids) + 1
+            composition = balance_table.pick(players)
+            if composition is None:
+                return f"{BALANCE_NOT_FOUND_MSG}({MIN_PLAYERS}~{MAX_PLAYERS}人)"
+
+            # 構成に含まれない役職は0人にする
+            setting_game.roles = {
+                Role.by_name(name): count for name, count in composition.items()
+            }
+            setting_game.touch()
+            return f"{players}人用の役職構成を設定しました"
+
+        reply = await submit(setting_game, balance)
+        await interaction.response.send_message(reply, ephemeral=True)
+        await setting_game.update_recruiting_embed()
+    except Exception as e:
+        logger.error("An error occurred", exc_info=True)
+        await interaction.response.send_message(ERROR_TEMPLATE + str(e))
+
+
+tree.add_command(role_group)
+
+
+async def start_worker(token: str) -> None:
+    """
+    ボットを起動する。コーディネーターから起動された場合は、先にコーディネーターに接続する。
+    """
+
+    startup_timer.mark("imports")
+
+    worker_id = int(WORKER_ID) if WORKER_ID is not None else 0
+    if WORKER_ID is not None:
+        await coordinator_client.connect(worker_id)
+        startup_timer.mark("coordinator")
+
+    # ワーカーごとにポートをずらし、同じホストで複数起動できるようにする
+    await MetricsServer(METRICS_PORT + worker_id, is_ready=client.is_ready).start()
+    startup_timer.mark("metrics_server")
+
+    async with client:
+        # client.start()と同じ処理を、ログインとゲートウェイへの接続に分けて計測する
+        await client.login(token)
+        startup_timer.mark("login")
+        await client.connect()
+
+
+def run() -> None:
+    load_dotenv()
+    token = os.getenv("DISCORD_TOKEN")
+    if token is None:
+        raise RuntimeError("DISCORD_TOKEN is not found.")
+
+    try:
+        if SHARD_WORKERS > 1 and WORKER_ID is None:
+            # このプロセスはコーディネーターになり、ワーカーとして自分自身を起動する
+            asyncio.run(Coordinator([sys.executable, os.path.abspath(__file__)]).run())
+        else:
+            # client.runと同じくdiscordのロガーにだけ付ける。ルートに付けると、
+            # make_loggerのロガーのレコードがイベントループ上でもう一度出力される
+            discord.utils.setup_logging(root=False)
+            asyncio.run(start_worker(token))
+    except KeyboardInterrupt:
+        pass
+
 
-client.run(TOKEN)
+if __name__ == "__main__":
+    run()